@@ -1,11 +1,75 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Machine, Maintenance, Claim, Directory
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, HttpResponseRedirect
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+from .models import User, Machine, Maintenance, Claim, Directory, RequestProfile
 from .forms import MachineForm, MaintenanceForm, ClaimForm
+from . import directory_cache
 from import_export import resources, fields, widgets
 from import_export.admin import ImportExportModelAdmin
 
 
+class DirectoryWidget(widgets.ForeignKeyWidget):
+    """
+    Элемент справочника по названию через кэш справочника (без запроса на каждую ячейку).
+    """
+    def __init__(self, entity_name, **kwargs):
+        self.entity_name = entity_name
+        super().__init__(Directory, 'name', **kwargs)
+
+    def clean(self, value, row=None, **kwargs):
+        if not value:
+            return None
+        obj = directory_cache.lookup(self.entity_name, str(value).strip())
+        if obj is None:
+            raise ValueError(f'В справочнике «{self.entity_name}» нет значения «{value}»')
+        return obj
+
+
+class BulkImportAdmin(ImportExportModelAdmin):
+    """
+    Импорт файла в админке через BulkImporter (bulk_import.py), как
+    в import_silant: справочник и машины сверяются пачками, запись идёт
+    bulk_create и пакетным UPDATE в одной транзакции, без построчного
+    сохранения и сигналов. Шага предпросмотра нет: при ошибке в любой
+    строке ничего не записывается, а ошибки показываются сообщением.
+    """
+    def import_action(self, request, **kwargs):
+        if not self.has_import_permission(request):
+            raise PermissionDenied
+        form = self.create_import_form(request)
+        if request.method != 'POST' or not form.is_valid():
+            return super().import_action(request, **kwargs)
+        # bulk_import сам берёт ресурсы из этого модуля
+        from .bulk_import import BulkImporter, BulkImportError
+
+        input_format = self.get_import_formats()[int(form.cleaned_data['format'])]()
+        if not input_format.is_binary():
+            input_format.encoding = self.from_encoding
+        try:
+            dataset = input_format.create_dataset(b''.join(form.cleaned_data['import_file'].chunks()))
+        except Exception as e:
+            messages.error(request, f'Не удалось прочитать файл: {e}')
+            return HttpResponseRedirect(request.path)
+        try:
+            summary = BulkImporter(self.resource_class).run(dataset)
+        except BulkImportError as e:
+            lines = [(f'Строка {line}: {message}',) for line, message in e.errors[:20]]
+            messages.error(request, format_html(
+                'Файл не импортирован, ошибок: {}<br>{}', len(e.errors), format_html_join('', '{}<br>', lines)))
+            return HttpResponseRedirect(request.path)
+        messages.success(request, (
+            f'Импортировано строк: {summary["rows"]} (создано {summary["created"]}, '
+            f'обновлено {summary["updated"]}, без изменений {summary["unchanged"]}) '
+            f'за {summary["seconds"]:.1f} с'
+        ))
+        opts = self.model._meta
+        return HttpResponseRedirect(reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist'))
+
+
 # --- Фирменные заголовки админки ---
 admin.site.site_header = "Мой Силант — Администрирование"
 admin.site.site_title = "Мой Силант"
@@ -28,6 +92,7 @@ admin.site.register(User, UserAdmin)
 class DirectoryResource(resources.ModelResource):
     class Meta:
         model = Directory
+        exclude = ['updated_at']
 
 @admin.register(Directory)
 class DirectoryAdmin(ImportExportModelAdmin):
@@ -45,12 +110,12 @@ class MachineResource(resources.ModelResource):
     model = fields.Field(
         attribute='model',
         column_name='Модель техники',
-        widget=widgets.ForeignKeyWidget(Directory, 'name')
+        widget=DirectoryWidget('Модель техники')
     )
     engine_model = fields.Field(
         attribute='engine_model',
         column_name='Модель двигателя',
-        widget=widgets.ForeignKeyWidget(Directory, 'name')
+        widget=DirectoryWidget('Модель двигателя')
     )
     engine_serial = fields.Field(
         attribute='engine_serial',
@@ -59,7 +124,7 @@ class MachineResource(resources.ModelResource):
     transmission_model = fields.Field(
         attribute='transmission_model',
         column_name='Модель трансмиссии (производитель, артикул)',
-        widget=widgets.ForeignKeyWidget(Directory, 'name')
+        widget=DirectoryWidget('Модель трансмиссии')
     )
     transmission_serial = fields.Field(
         attribute='transmission_serial',
@@ -68,7 +133,7 @@ class MachineResource(resources.ModelResource):
     drive_axle_model = fields.Field(
         attribute='drive_axle_model',
         column_name='Модель ведущего моста',
-        widget=widgets.ForeignKeyWidget(Directory, 'name')
+        widget=DirectoryWidget('Модель ведущего моста')
     )
     drive_axle_serial = fields.Field(
         attribute='drive_axle_serial',
@@ -77,7 +142,7 @@ class MachineResource(resources.ModelResource):
     steer_axle_model = fields.Field(
         attribute='steer_axle_model',
         column_name='Модель управляемого моста',
-        widget=widgets.ForeignKeyWidget(Directory, 'name')
+        widget=DirectoryWidget('Модель управляемого моста')
     )
     steer_axle_serial = fields.Field(
         attribute='steer_axle_serial',
@@ -110,9 +175,10 @@ class MachineResource(resources.ModelResource):
     class Meta:
         model = Machine
         import_id_fields = ['serial_number']
+        exclude = ['updated_at', *Machine.STATS_FIELDS]
 
 @admin.register(Machine)
-class MachineAdmin(ImportExportModelAdmin):
+class MachineAdmin(BulkImportAdmin):
     form = MachineForm
     resource_class = MachineResource
     list_display = (
@@ -152,7 +218,7 @@ class MaintenanceResource(resources.ModelResource):
     maintenance_type = fields.Field(
         attribute='maintenance_type',
         column_name='Вид ТО',
-        widget=widgets.ForeignKeyWidget(Directory, 'name')
+        widget=DirectoryWidget('Вид ТО')
     )
     date = fields.Field(
         attribute='date',
@@ -173,14 +239,15 @@ class MaintenanceResource(resources.ModelResource):
     service_company = fields.Field(
         attribute='service_company',
         column_name='Организация, проводившая ТО',
-        widget=widgets.ForeignKeyWidget(Directory, 'name')
+        widget=DirectoryWidget('Сервисная компания')
     )
     class Meta:
         model = Maintenance
         import_id_fields = ['machine', 'maintenance_type', 'date']
+        exclude = ['updated_at']
 
 @admin.register(Maintenance)
-class MaintenanceAdmin(ImportExportModelAdmin):
+class MaintenanceAdmin(BulkImportAdmin):
     form = MaintenanceForm
     resource_class = MaintenanceResource
     list_display = (
@@ -217,7 +284,7 @@ class ClaimResource(resources.ModelResource):
     failed_unit = fields.Field(
         attribute='failed_unit',
         column_name='Узел отказа',
-        widget=widgets.ForeignKeyWidget(Directory, 'name')
+        widget=DirectoryWidget('Узел отказа')
     )
     failure_description = fields.Field(
         attribute='failure_description',
@@ -226,7 +293,7 @@ class ClaimResource(resources.ModelResource):
     recovery_method = fields.Field(
         attribute='recovery_method',
         column_name='Способ восстановления',
-        widget=widgets.ForeignKeyWidget(Directory, 'name')
+        widget=DirectoryWidget('Способ восстановления')
     )
     used_parts = fields.Field(
         attribute='used_parts',
@@ -243,9 +310,10 @@ class ClaimResource(resources.ModelResource):
     class Meta:
         model = Claim
         import_id_fields = ['machine', 'failure_date', 'failed_unit']
+        exclude = ['updated_at']
 
 @admin.register(Claim)
-class ClaimAdmin(ImportExportModelAdmin):
+class ClaimAdmin(BulkImportAdmin):
     form = ClaimForm
     resource_class = ClaimResource
     list_display = (
@@ -264,4 +332,48 @@ class ClaimAdmin(ImportExportModelAdmin):
                 'recovery_date', 'downtime', 'service_company'
             )
         }),
-    )
\ No newline at end of file
+    )
+
+# --- Профили запросов (profiling.py) ---
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        'created_at', 'method', 'path', 'view_name', 'status',
+        'duration', 'queries', 'query_seconds', 'user', 'download'
+    )
+    list_filter = ('view_name', 'method')
+    search_fields = ('path', 'view_name')
+    fields = (
+        'created_at', 'user', 'method', 'path', 'view_name', 'status',
+        'duration', 'queries', 'query_seconds', 'download', 'summary_text'
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view),
+                 name='core_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(bytes(profile.data), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.prof"'
+        return response
+
+    @admin.display(description='Файл')
+    def download(self, obj):
+        url = reverse('admin:core_requestprofile_download', args=[obj.pk])
+        return format_html('<a href="{}">profile-{}.prof</a>', url, obj.pk)
+
+    @admin.display(description='Сводка')
+    def summary_text(self, obj):
+        return format_html('<pre>{}</pre>', obj.summary)
@@ -0,0 +1,232 @@
+"""
+Аналитика надёжности парка по сводной таблице ReliabilitySummary.
+
+Разрезы: узел отказа, способ восстановления, сервисная компания (число
+рекламаций и простой), модель техники (машины с отказами, рекламации,
+простой и MTBF) и служебные строки машин, из которых собираются строки
+моделей. Отчёты читают только сводку, без обращения к рекламациям.
+
+MTBF модели — средняя наработка на отказ: сумма по машинам модели наработки
+на момент последнего отказа, делённая на число отказов.
+
+Сводка обновляется сигналами при каждой записи рекламации: строки узла,
+способа восстановления и сервисной компании — приращениями, строка машины —
+пересчётом по её рекламациям (индекс по machine), а строка модели —
+разницей старой и новой строки машины. Массовые операции и ночной запуск
+python manage.py rebuild_analytics пересчитывают сводку целиком.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from rest_framework import permissions
+
+from . import directory_cache
+from .models import Machine, Claim, ReliabilitySummary
+
+# Разрезы, которые считаются по полям самой рекламации
+CLAIM_DIMENSIONS = ('failed_unit', 'recovery_method', 'service_company')
+# Ключ строки «не указано»
+NOT_SPECIFIED = 0
+
+# Отчёт -> разрез сводки
+REPORTS = {
+    'failed_units': 'failed_unit',
+    'recovery_methods': 'recovery_method',
+    'models': 'model',
+    'service_companies': 'service_company',
+}
+
+
+def claim_values(claim):
+    values = {dimension: getattr(claim, f'{dimension}_id') or NOT_SPECIFIED for dimension in CLAIM_DIMENSIONS}
+    values['machine'] = claim.machine_id
+    values['downtime'] = claim.downtime or 0
+    values['operating_time'] = claim.operating_time or 0
+    return values
+
+
+def stored_claim_values(pk):
+    """
+    Значения рекламации в БД до сохранения (для pre_save).
+    """
+    row = Claim.objects.filter(pk=pk).values(
+        'machine_id', 'downtime', 'operating_time', *[f'{dimension}_id' for dimension in CLAIM_DIMENSIONS]).first()
+    if row is None:
+        return None
+    values = {dimension: row[f'{dimension}_id'] or NOT_SPECIFIED for dimension in CLAIM_DIMENSIONS}
+    values['machine'] = row['machine_id']
+    values['downtime'] = row['downtime'] or 0
+    values['operating_time'] = row['operating_time'] or 0
+    return values
+
+
+def add(dimension, key, **delta):
+    """
+    Прибавляет delta к строке сводки (атомарно, через F), создавая её при необходимости.
+    """
+    if not any(delta.values()):
+        return
+    updated = ReliabilitySummary.objects.filter(dimension=dimension, key=key).update(
+        **{name: F(name) + value for name, value in delta.items()})
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            ReliabilitySummary.objects.create(dimension=dimension, key=key, **delta)
+    except IntegrityError:
+        # Строку только что создала параллельная транзакция
+        add(dimension, key, **delta)
+
+
+def claim_changed(old, new):
+    """
+    Переносит вклад рекламации из значений old в new (None — рекламации нет).
+    """
+    claims_changed([(old, new)])
+
+
+def claims_changed(changes):
+    """
+    claim_changed для пачки пар (old, new): приращения суммируются по строкам
+    сводки, поэтому на каждую строку приходится один UPDATE.
+    """
+    deltas, machines = {}, set()
+    for old, new in changes:
+        if old == new:
+            # Правка описания, запчастей и т. п. на сводку не влияет
+            continue
+        for values, sign in ((old, -1), (new, 1)):
+            if not values:
+                continue
+            for dimension in CLAIM_DIMENSIONS:
+                delta = deltas.setdefault((dimension, values[dimension]), {'claims': 0, 'downtime': 0})
+                delta['claims'] += sign
+                delta['downtime'] += sign * values['downtime']
+            machines.add(values['machine'])
+    for (dimension, key), delta in deltas.items():
+        add(dimension, key, **delta)
+    refresh_machines(machines)
+
+
+def refresh_machines(machine_ids):
+    """
+    Пересчитывает строки машин по их рекламациям и переносит разницу в строки моделей.
+    """
+    for machine_id in machine_ids:
+        with transaction.atomic():
+            row = ReliabilitySummary.objects.select_for_update().filter(
+                dimension='machine', key=machine_id).first()
+            stats = Claim.objects.filter(machine_id=machine_id).aggregate(
+                claims=Count('pk'), downtime=Sum('downtime'), operating_time=Max('operating_time'))
+            model_id = Machine.objects.filter(pk=machine_id).values_list('model_id', flat=True).first()
+            new = {
+                'claims': stats['claims'],
+                'downtime': stats['downtime'] or 0,
+                'operating_time': stats['operating_time'] or 0,
+            }
+            parent = model_id or NOT_SPECIFIED
+            deltas = {}
+            if row:
+                deltas[row.parent] = {'claims': -row.claims, 'downtime': -row.downtime,
+                                      'operating_time': -row.operating_time, 'machines': -1}
+            if new['claims']:
+                delta = deltas.setdefault(parent, {'claims': 0, 'downtime': 0, 'operating_time': 0, 'machines': 0})
+                for name, value in new.items():
+                    delta[name] += value
+                delta['machines'] += 1
+                ReliabilitySummary.objects.update_or_create(
+                    dimension='machine', key=machine_id, defaults={**new, 'parent': parent})
+            elif row:
+                row.delete()
+            for key, delta in deltas.items():
+                add('model', key, **delta)
+
+
+def machines_changed(pks):
+    """
+    Машины записаны без сигналов (импорт): пересчитываются те из них,
+    у кого в сводке числится другая модель.
+    """
+    parents = dict(ReliabilitySummary.objects.filter(dimension='machine', key__in=pks).values_list('key', 'parent'))
+    if not parents:
+        return
+    models = Machine.objects.filter(pk__in=list(parents)).values_list('pk', 'model_id')
+    refresh_machines([pk for pk, model_id in models if (model_id or NOT_SPECIFIED) != parents[pk]])
+
+
+def directory_deleted(pk):
+    """
+    Ссылки на удалённый элемент справочника обнуляются без сигналов:
+    его строки сводки переходят в «не указано».
+    """
+    for row in ReliabilitySummary.objects.filter(key=pk).exclude(dimension='machine'):
+        add(row.dimension, NOT_SPECIFIED, claims=row.claims, downtime=row.downtime,
+            operating_time=row.operating_time, machines=row.machines)
+        row.delete()
+    ReliabilitySummary.objects.filter(dimension='machine', parent=pk).update(parent=NOT_SPECIFIED)
+
+
+def rebuild(claim_model=Claim, summary_model=ReliabilitySummary):
+    """
+    Пересчитывает сводку целиком несколькими GROUP BY; возвращает число строк.
+    """
+    rows = []
+    for dimension in CLAIM_DIMENSIONS:
+        grouped = claim_model.objects.order_by().values(dimension).annotate(
+            claims=Count('pk'), total_downtime=Sum('downtime'))
+        for row in grouped:
+            rows.append(summary_model(
+                dimension=dimension, key=row[dimension] or NOT_SPECIFIED,
+                claims=row['claims'], downtime=row['total_downtime'] or 0,
+            ))
+    models = {}
+    grouped = claim_model.objects.order_by().values('machine', 'machine__model').annotate(
+        claims=Count('pk'), total_downtime=Sum('downtime'), last_operating_time=Max('operating_time'))
+    for row in grouped:
+        parent = row['machine__model'] or NOT_SPECIFIED
+        machine = summary_model(
+            dimension='machine', key=row['machine'], parent=parent, claims=row['claims'],
+            downtime=row['total_downtime'] or 0, operating_time=row['last_operating_time'] or 0,
+        )
+        rows.append(machine)
+        model = models.setdefault(parent, summary_model(dimension='model', key=parent))
+        model.claims += machine.claims
+        model.downtime += machine.downtime
+        model.operating_time += machine.operating_time
+        model.machines += 1
+    rows.extend(models.values())
+    with transaction.atomic():
+        summary_model.objects.all().delete()
+        summary_model.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def report(dimension):
+    """
+    Строки отчёта по разрезу: от большего числа рекламаций к меньшему.
+    """
+    rows = list(ReliabilitySummary.objects.filter(dimension=dimension, claims__gt=0).order_by('-claims', 'key'))
+    total = sum(row.claims for row in rows)
+    result = []
+    for row in rows:
+        item = directory_cache.get(row.key) if row.key else None
+        line = {
+            'id': row.key or None,
+            'name': item.name if item else 'Не указано',
+            'claims': row.claims,
+            'share': round(row.claims * 100 / total, 1),
+            'mean_downtime': round(row.downtime / row.claims, 1),
+        }
+        if dimension == 'model':
+            line['machines'] = row.machines
+            line['mtbf'] = round(row.operating_time / row.claims, 1)
+        result.append(line)
+    return result
+
+
+def reports():
+    return {name: report(dimension) for name, dimension in REPORTS.items()}
+
+
+class IsManager(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role == 'manager'
@@ -0,0 +1,119 @@
+"""
+Схема OpenAPI (Swagger) REST API как готовый файл.
+
+drf-yasg строит схему, обходя все вьюсеты, фильтры и сериализаторы, —
+это сотни миллисекунд процессора. Поэтому схема строится один раз:
+командой `python manage.py build_api_schema` при выкладке (файлы
+openapi.json и openapi.yaml в API_SCHEMA_DIR) или, если файлов нет,
+при первом обращении к /swagger.json, а не при загрузке URLconf.
+Дальше процесс отдаёт её из памяти с ETag (повторная загрузка — 304).
+Страница /swagger/ схему не строит: Swagger UI загружает /swagger.json.
+
+При DEBUG файлы не читаются и схема строится в каждом процессе заново,
+чтобы после правок кода не показывалась схема прошлой выкладки.
+В схеме нет host и schemes — Swagger UI берёт их из адреса страницы.
+"""
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpRequest
+from django.utils.http import quote_etag
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.renderers import SwaggerUIRenderer
+from rest_framework.request import Request
+
+INFO = openapi.Info(
+    title="Silant API",
+    default_version='v1',
+    description="API для сервиса Мой Силант",
+)
+
+# Формат: (кодек drf-yasg, Content-Type)
+FORMATS = {
+    'json': (OpenAPICodecJson, 'application/json; charset=utf-8'),
+    'yaml': (OpenAPICodecYaml, 'application/yaml; charset=utf-8'),
+}
+
+lock = threading.Lock()
+# {формат: (содержимое, ETag)}; заполняется при первом обращении
+documents = {}
+
+
+def generate():
+    """
+    Схема всех маршрутов API (openapi.Swagger), как её видит гость.
+    """
+    request = HttpRequest()
+    request.method = 'GET'
+    request.user = AnonymousUser()
+    return OpenAPISchemaGenerator(INFO, url='').get_schema(Request(request), public=True)
+
+
+def encode(schema):
+    return {name: codec([]).encode(schema) for name, (codec, _) in FORMATS.items()}
+
+
+def schema_path(name, directory=None):
+    return os.path.join(directory or settings.API_SCHEMA_DIR, f'openapi.{name}')
+
+
+def build(directory=None):
+    """
+    Строит схему и записывает её во всех форматах; возвращает пути файлов.
+    """
+    paths = []
+    for name, content in encode(generate()).items():
+        path = schema_path(name, directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(content)
+        os.replace(temporary, path)
+        paths.append(path)
+    with lock:
+        documents.clear()
+    return paths
+
+
+def load():
+    """
+    {формат: содержимое} из API_SCHEMA_DIR или, если файлов нет (или DEBUG), построенные заново.
+    """
+    if not settings.DEBUG:
+        try:
+            result = {}
+            for name in FORMATS:
+                with open(schema_path(name), 'rb') as f:
+                    result[name] = f.read()
+            return result
+        except OSError:
+            pass
+    return encode(generate())
+
+
+def document(name):
+    """
+    (содержимое, ETag) схемы в формате name.
+    """
+    with lock:
+        # Под блокировкой: одновременные первые запросы строят схему один раз
+        if not documents:
+            documents.update({
+                fmt: (content, quote_etag(hashlib.sha256(content).hexdigest()[:32]))
+                for fmt, content in load().items()
+            })
+        return documents[name]
+
+
+def render_ui(request):
+    """
+    HTML страницы Swagger UI. Схема для заголовка не строится: странице
+    нужны только название и версия API, а саму схему загружает браузер.
+    """
+    stub = openapi.Swagger(info=INFO, _prefix='/', paths=openapi.Paths(paths={}))
+    return SwaggerUIRenderer().render(stub, 'text/html', {'request': request})
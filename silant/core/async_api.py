@@ -0,0 +1,163 @@
+"""
+Асинхронное (ASGI) чтение списков и карточек REST API.
+
+DRF 3.16 не поддерживает асинхронные представления, поэтому маршруты
+списка и карточки машин, ТО и рекламаций оборачиваются в async_read():
+- карточка читается асинхронным ORM (afirst) и сериализуется сериализатором
+  вьюсета (с ?expand= и ?fields=);
+- список (курсор, размер страницы, сортировка, поиск, ?expand= и ?fields=)
+  отдаётся из кэша ответов и отпечатка ETag (response_cache, conditional),
+  включая ответ 304, а при промахе или выключенном кэше отпечаток
+  и страница читаются асинхронным ORM и собираются RowBuilder, как в
+  FastListMixin.
+Остальное — запись, фильтры django-filter (их проверка обращается к БД),
+фильтры и поиск в карточке, browsable API, ?format=, ошибки и гости —
+выполняет обычный вьюсет через sync_to_async, поэтому ответы совпадают
+с WSGI байт в байт.
+
+Под WSGI обёртки тоже работают: Django выполняет их через async_to_sync.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.urls import URLPattern
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from . import conditional, directory_cache, metrics, response_cache
+
+# Параметры карточки, которые не требуют фильтров вьюсета
+DETAIL_PARAMS = {'expand', 'fields'}
+# Параметры списка, которые не обращаются к БД до чтения страницы
+LIST_PARAMS = {'cursor', 'page_size', 'ordering', 'search', 'expand', 'fields'}
+
+
+async def prepare(view, request, args, kwargs):
+    """
+    Экземпляр вьюсета для запроса, как в APIView.dispatch; None — запрос
+    отдаётся синхронному вьюсету (гость без входа, browsable API, нет прав).
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return None
+    # Синхронный вьюсет, если до него дойдёт, возьмёт уже загруженного пользователя
+    request.user = user
+    self = view.cls(**view.initkwargs)
+    self.action_map = view.actions
+    for method, action in view.actions.items():
+        setattr(self, method, getattr(self, action))
+    self.args, self.kwargs, self.format_kwarg = args, kwargs, None
+    self.headers = self.default_response_headers
+    self.request = self.initialize_request(request, *args, **kwargs)
+    self.request.user = user
+    try:
+        renderer, media_type = self.perform_content_negotiation(self.request)
+        if not isinstance(renderer, JSONRenderer):
+            return None
+        self.request.accepted_renderer, self.request.accepted_media_type = renderer, media_type
+        self.check_permissions(self.request)
+    except APIException:
+        return None
+    return self
+
+
+async def read_list(view, request, args, kwargs):
+    if set(request.GET) - LIST_PARAMS or not getattr(settings, 'FAST_LIST_SERIALIZATION', True):
+        return None
+    self = await prepare(view, request, args, kwargs)
+    if self is None:
+        return None
+    name = type(self).__name__
+    timeout = response_cache.timeout()
+    try:
+        # Раскрытые связи справочника RowBuilder берёт из снимка
+        await directory_cache.asnapshot()
+        etag = None
+        if timeout:
+            # Те же ключи, что у ConditionalListMixin и CachedListMixin
+            etag_key = conditional.etag_key(self.request, name)
+            etag = await cache.aget(etag_key)
+            metrics.record_cache('etag', hits=etag is not None, misses=etag is None)
+        if etag is None:
+            etag = await self.alist_fingerprint()
+            if timeout:
+                await cache.aset(etag_key, etag, timeout)
+        data = None
+        if get_conditional_response(request, etag=etag) is None:
+            if timeout:
+                data_key = response_cache.response_key(self.request, name)
+                data = await cache.aget(data_key)
+                metrics.record_cache('response', hits=data is not None, misses=data is None)
+            if data is None:
+                data = await self.alist_data()
+                if timeout:
+                    await cache.aset(data_key, data, timeout)
+    except (APIException, DjangoValidationError, TypeError, ValueError):
+        # 400/404 с телом DRF вернёт синхронный вьюсет
+        return None
+    return conditional.respond(request, etag,
+                               lambda: self.finalize_response(self.request, Response(data)))
+
+
+async def read_detail(view, request, args, kwargs):
+    if set(request.GET) - DETAIL_PARAMS:
+        return None
+    self = await prepare(view, request, args, kwargs)
+    if self is None:
+        return None
+    lookup = self.lookup_url_kwarg or self.lookup_field
+    try:
+        queryset = self.filter_queryset(self.get_queryset())
+        # Раскрытые связи справочника сериализатор берёт из снимка
+        await directory_cache.asnapshot()
+        instance = await queryset.filter(**{self.lookup_field: kwargs[lookup]}).afirst()
+        if instance is None:
+            return None
+        self.check_object_permissions(self.request, instance)
+        data = self.get_serializer(instance).data
+    except (APIException, DjangoValidationError, TypeError, ValueError):
+        # 400/403/404 с телом DRF вернёт синхронный вьюсет
+        return None
+    return self.finalize_response(self.request, Response(data))
+
+
+READERS = {'list': read_list, 'retrieve': read_detail}
+
+
+def async_read_view(view):
+    """
+    Асинхронная обёртка маршрута вьюсета: GET списка или карточки по возможности
+    без потока, остальное — синхронным вьюсетом.
+    """
+    sync_view = sync_to_async(view)
+    reader = READERS[view.actions['get']]
+
+    @csrf_exempt
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method == 'GET' and 'format' not in kwargs:
+            response = await reader(view, request, args, kwargs)
+            if response is not None:
+                return response
+        return await sync_view(request, *args, **kwargs)
+    return wrapper
+
+
+def async_read(patterns, basenames):
+    """
+    Маршруты роутера с асинхронным чтением списков и карточек вьюсетов basenames.
+    """
+    names = {f'{basename}-{suffix}' for basename in basenames for suffix in ('list', 'detail')}
+    result = []
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern) and pattern.name in names:
+            pattern = URLPattern(pattern.pattern, async_read_view(pattern.callback),
+                                 pattern.default_args, pattern.name)
+        result.append(pattern)
+    return result
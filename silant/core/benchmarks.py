@@ -0,0 +1,439 @@
+import asyncio
+import math
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, transaction
+from django.test import AsyncRequestFactory, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from . import directory_cache, reliability
+from .admin import MachineResource, MaintenanceResource, ClaimResource
+from .exporting import export_response
+from .fast_serialization import FastJSONRenderer, RowBuilder
+from .models import User, Machine, Maintenance, Claim, Directory
+from .serializers import MachineSerializer
+
+
+def percentile(values, fraction):
+    """
+    Перцентиль по методу ближайшего ранга (fraction от 0 до 1).
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(timings):
+    """
+    Сводка по замерам времени в секундах: p50/p95/среднее в миллисекундах.
+    """
+    return {
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+    }
+
+
+def measure(func, iterations, warmup=1):
+    """
+    Выполняет func warmup + iterations раз; возвращает сводку по времени
+    и результат последнего вызова.
+    """
+    result = None
+    for _ in range(warmup):
+        result = func()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return summarize(timings), result
+
+
+def count_queries(func):
+    with CaptureQueriesContext(connection) as context:
+        func()
+    return len(context.captured_queries)
+
+
+def peak_memory(func):
+    """
+    Пиковый объём памяти Python (КБ), выделенной за время вызова func.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def endpoint_urls(user):
+    """
+    Список (название, url, нужна ли авторизация) для всех страниц и эндпоинтов.
+    """
+    machine = Machine.objects.order_by('-shipment_date', '-id').first()
+    maintenance = Maintenance.objects.order_by('-date', '-id').first()
+    claim = Claim.objects.order_by('-failure_date', '-id').first()
+    directory = Directory.objects.order_by('id').first()
+    serial = machine.serial_number if machine else 'missing'
+
+    urls = [
+        ('public_search_page', f'/?serial_number={serial}', False),
+        ('api_public_machine_search', f'/api/public_machine_search/?serial_number={serial}', False),
+    ]
+    if user:
+        urls += [('dashboard_info', '/dashboard/?tab=info', True)]
+        if machine:
+            urls += [
+                ('dashboard_to', f'/dashboard/?tab=to&machine_id={machine.pk}', True),
+                ('dashboard_claims', f'/dashboard/?tab=claims&machine_id={machine.pk}', True),
+            ]
+        for name, obj in (('machines', machine), ('maintenances', maintenance),
+                          ('claims', claim), ('directories', directory)):
+            urls.append((f'api_{name}_list', f'/api/{name}/', True))
+            if obj:
+                urls.append((f'api_{name}_detail', f'/api/{name}/{obj.pk}/', True))
+    return urls
+
+
+def bench_endpoints(iterations=20, username=None, **options):
+    """
+    Замеры всех страниц и эндпоинтов через тестовый клиент Django.
+
+    Основные цифры снимаются с выключенными кэшем ответов и кэшем строк
+    таблиц — это стоимость отрисовки после записи данных или для нового
+    пользователя. Те же запросы из прогретого кэша — в ключе warm.
+    """
+    if username:
+        user = User.objects.get(username=username)
+    else:
+        user = User.objects.filter(role='manager').order_by('id').first()
+    anonymous, client = Client(), Client()
+    if user:
+        client.force_login(user)
+
+    results = {}
+    hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+    for name, url, authenticated in endpoint_urls(user):
+        def request(client=client if authenticated else anonymous, url=url):
+            return client.get(url)
+
+        with override_settings(ALLOWED_HOSTS=hosts, RESPONSE_CACHE_TIMEOUT=0, ROW_CACHE_TIMEOUT=0):
+            timing, response = measure(request, iterations)
+            results[name] = {
+                'url': url,
+                'status': response.status_code,
+                'bytes': len(response.content),
+                **timing,
+                'queries': count_queries(request),
+                'peak_memory_kb': peak_memory(request),
+            }
+        # Замер идёт в одном процессе, поэтому кэш включается и под locmem
+        with override_settings(ALLOWED_HOSTS=hosts, RESPONSE_CACHE_TIMEOUT=300, ROW_CACHE_TIMEOUT=300):
+            # Прогревочный вызов measure заполняет кэш, замер — только попадания
+            timing, _ = measure(request, iterations)
+            results[name]['warm'] = {**timing, 'queries': count_queries(request)}
+    return {'user': user.username if user else None, 'results': results}
+
+
+def bench_export(iterations=20, **options):
+    """
+    Время и пик памяти потоковой выгрузки CSV/XLSX на четверти, половине
+    и всём объёме таблицы: пик памяти не должен расти вместе с числом строк.
+    """
+    results = {}
+    for name, model, resource in (('machines', Machine, MachineResource),
+                                  ('maintenances', Maintenance, MaintenanceResource),
+                                  ('claims', Claim, ClaimResource)):
+        total = model.objects.count()
+        for file_format in ('csv', 'xlsx'):
+            runs = []
+            for rows in sorted({max(1, total // 4), max(1, total // 2), max(1, total)}):
+                def export(rows=rows, file_format=file_format):
+                    response = export_response(model.objects.order_by('pk')[:rows], resource, file_format, name)
+                    return sum(len(chunk) for chunk in response.streaming_content)
+
+                timing, size = measure(export, max(1, iterations // 10))
+                runs.append({'rows': min(rows, total), 'bytes': size, **timing, 'peak_memory_kb': peak_memory(export)})
+            results[f'{name}_{file_format}'] = runs
+    return {'results': results}
+
+
+SERIALIZATION_SIZES = (1000, 10000, 100000)
+
+
+def bench_serialization(iterations=20, **options):
+    """
+    Штатный ModelSerializer + JSONRenderer против RowBuilder + FastJSONRenderer
+    на 1k, 10k и 100k машин (сколько есть в БД), включая чтение из БД.
+    """
+    total = Machine.objects.count()
+    results = []
+    for size in sorted({min(size, total) for size in SERIALIZATION_SIZES}):
+        queryset = Machine.objects.order_by('-shipment_date', '-id')[:size]
+
+        def stock():
+            return JSONRenderer().render(MachineSerializer(queryset, many=True).data)
+
+        def fast():
+            builder = RowBuilder(MachineSerializer())
+            return FastJSONRenderer().render([builder.row(values) for values in builder.values(queryset)])
+
+        runs = max(1, iterations // 10)
+        stock_timing, stock_body = measure(stock, runs)
+        fast_timing, fast_body = measure(fast, runs)
+        results.append({
+            'rows': size,
+            'bytes': len(fast_body),
+            'identical': stock_body == fast_body,
+            'stock': stock_timing,
+            'fast': fast_timing,
+            'speedup': round(stock_timing['p50_ms'] / fast_timing['p50_ms'], 2) if fast_timing['p50_ms'] else None,
+        })
+    return {'results': results}
+
+
+def bench_reliability(iterations=20, **options):
+    """
+    Отчёт о надёжности: векторный расчёт по столбцам NumPy против цикла
+    по объектам ORM, на всех рекламациях и ТО в БД (без кэша).
+    """
+    if reliability.np is None:
+        return {'error': 'NumPy не установлен'}
+    runs = max(1, iterations // 10)
+    python_timing, python_result = measure(lambda: reliability.compute('python'), runs)
+    numpy_timing, numpy_result = measure(lambda: reliability.compute('numpy'), runs)
+    return {
+        'claims': Claim.objects.count(),
+        'maintenances': Maintenance.objects.count(),
+        'identical': python_result == numpy_result,
+        'python': python_timing,
+        'numpy': numpy_timing,
+        'speedup': round(python_timing['p50_ms'] / numpy_timing['p50_ms'], 2) if numpy_timing['p50_ms'] else None,
+    }
+
+
+BULK_WRITE_SIZES = (10, 100, 500)
+
+
+def maintenance_items(count):
+    """
+    count записей ТО для POST по машинам из БД (по кругу).
+    """
+    machines = list(Machine.objects.order_by('pk').values_list('pk', flat=True)[:count])
+    maintenance_type = next(iter(directory_cache.entries('Вид ТО')), None)
+    service_company = next(iter(directory_cache.entries('Сервисная компания')), None)
+    return [{
+        'machine': machines[index % len(machines)],
+        'maintenance_type': maintenance_type.pk if maintenance_type else None,
+        'date': '2025-06-01',
+        'operating_time': 1000 + index,
+        'order_number': f'#BENCH-{index}',
+        'order_date': '2025-05-30',
+        'service_company': service_company.pk if service_company else None,
+    } for index in range(count)]
+
+
+def rolled_back(func):
+    """
+    func в транзакции, которая откатывается: замер записи не меняет БД.
+    """
+    def run():
+        with transaction.atomic():
+            result = func()
+            transaction.set_rollback(True)
+        return result
+    return run
+
+
+def bench_bulk_write(iterations=20, **options):
+    """
+    Создание N записей ТО: N запросов POST /api/maintenances/ против одного
+    POST /api/maintenances/bulk/ (от имени менеджера, с откатом после замера).
+    """
+    user = User.objects.filter(role='manager').order_by('id').first()
+    if user is None or not Machine.objects.exists():
+        return {'error': 'Нужны менеджер и хотя бы одна машина'}
+    client = Client()
+    client.force_login(user)
+    results = []
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for size in BULK_WRITE_SIZES:
+            items = maintenance_items(size)
+
+            @rolled_back
+            def single():
+                return [client.post('/api/maintenances/', item, content_type='application/json').status_code
+                        for item in items]
+
+            @rolled_back
+            def bulk():
+                return [client.post('/api/maintenances/bulk/', items, content_type='application/json').status_code]
+
+            runs = max(1, iterations // 10)
+            single_timing, single_statuses = measure(single, runs)
+            bulk_timing, bulk_statuses = measure(bulk, runs)
+            results.append({
+                'records': size,
+                'statuses': {'single': sorted(set(single_statuses)), 'bulk': bulk_statuses},
+                'single': {**single_timing, 'records_per_second': round(size / single_timing['p50_ms'] * 1000, 1),
+                           'queries': count_queries(single)},
+                'bulk': {**bulk_timing, 'records_per_second': round(size / bulk_timing['p50_ms'] * 1000, 1),
+                         'queries': count_queries(bulk)},
+                'speedup': round(single_timing['p50_ms'] / bulk_timing['p50_ms'], 2) if bulk_timing['p50_ms'] else None,
+            })
+    return {'user': user.username, 'results': results}
+
+
+# Эндпоинты, которые под ASGI обслуживают асинхронные представления
+CONCURRENCY_ENDPOINTS = (
+    'public_search_page', 'api_public_machine_search',
+    'api_machines_list', 'api_machines_detail',
+    'api_maintenances_list', 'api_maintenances_detail',
+    'api_claims_list', 'api_claims_detail',
+)
+
+
+def concurrency_summary(timings, statuses, elapsed):
+    return {
+        'requests': len(timings),
+        'throughput_rps': round(len(timings) / elapsed, 1) if elapsed else None,
+        **summarize(timings),
+        'statuses': dict(sorted(Counter(str(status) for status in statuses).items())),
+    }
+
+
+def request_factories(factory_class, session):
+    """
+    Фабрики запросов {нужна ли авторизация: фабрика}; авторизованной
+    передаётся сессионная кука.
+    """
+    factories = {False: factory_class(), True: factory_class()}
+    if session:
+        factories[True].cookies[settings.SESSION_COOKIE_NAME] = session
+    return factories
+
+
+def run_wsgi(requests, session, concurrency, workers):
+    """
+    concurrency клиентов подряд шлют свои запросы в WSGIHandler; обрабатывают
+    не больше workers одновременно, как потоки/процессы WSGI-сервера.
+    Задержка считается с ожиданием свободного обработчика.
+    """
+    handler, factories = WSGIHandler(), request_factories(RequestFactory, session)
+    slots = threading.Semaphore(workers)
+    timings, statuses = [], []
+
+    def call(path, authenticated):
+        environ = factories[authenticated].get(path).environ
+        started = time.perf_counter()
+        with slots:
+            response = handler(environ, lambda status, headers, exc_info=None: statuses.append(int(status[:3])))
+            for _ in response:
+                pass
+            response.close()
+        timings.append(time.perf_counter() - started)
+
+    def client(index):
+        for path, authenticated in requests[index::concurrency]:
+            call(path, authenticated)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    return concurrency_summary(timings, statuses, time.perf_counter() - started)
+
+
+def run_asgi(requests, session, concurrency, workers):
+    """
+    Те же клиенты против ASGIHandler: workers событийных циклов (по потоку
+    на цикл, как процессы uvicorn), клиенты поровну распределены по циклам.
+    """
+    handler, factories = ASGIHandler(), request_factories(AsyncRequestFactory, session)
+    timings, statuses = [], []
+
+    async def call(path, authenticated):
+        scope = factories[authenticated].get(path).scope
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # Клиент не отключается до конца ответа
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        started = time.perf_counter()
+        await handler(scope, receive, send)
+        timings.append(time.perf_counter() - started)
+
+    async def client(index):
+        for path, authenticated in requests[index::concurrency]:
+            await call(path, authenticated)
+
+    def loop(worker):
+        async def clients():
+            await asyncio.gather(*(client(index) for index in range(worker, concurrency, workers)))
+        asyncio.run(clients())
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(loop, range(workers)))
+    return concurrency_summary(timings, statuses, time.perf_counter() - started)
+
+
+def bench_concurrency(iterations=20, username=None, concurrency=32, workers=4, **options):
+    """
+    Нагрузочный замер публичного поиска и чтения REST API: одинаковый поток
+    запросов через WSGIHandler и ASGIHandler при одном числе обработчиков
+    (пропускная способность, p50/p95 задержки, коды ответов).
+    """
+    if username:
+        user = User.objects.get(username=username)
+    else:
+        user = User.objects.filter(role='manager').order_by('id').first()
+    session = None
+    if user:
+        client = Client()
+        client.force_login(user)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+    urls = [(name, url, authenticated) for name, url, authenticated in endpoint_urls(user)
+            if name in CONCURRENCY_ENDPOINTS]
+    requests = [(url, authenticated) for name, url, authenticated in urls] * max(
+        1, math.ceil(max(iterations, concurrency) * 4 / len(urls)))
+
+    results = {'user': user.username if user else None, 'workers': workers, 'concurrency': concurrency,
+               'urls': {name: url for name, url, _ in urls}}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        # Прогрев кэшей ответов и справочника
+        run_wsgi(requests[:len(urls)], session, 1, 1)
+        results['wsgi'] = run_wsgi(requests, session, concurrency, workers)
+        results['asgi'] = run_asgi(requests, session, concurrency, workers)
+    wsgi, asgi = results['wsgi']['throughput_rps'], results['asgi']['throughput_rps']
+    results['speedup'] = round(asgi / wsgi, 2) if wsgi and asgi else None
+    return results
+
+
+SUITES = {
+    'endpoints': bench_endpoints,
+    'export': bench_export,
+    'serialization': bench_serialization,
+    'reliability': bench_reliability,
+    'concurrency': bench_concurrency,
+    'bulk_write': bench_bulk_write,
+}
@@ -0,0 +1,186 @@
+"""
+Пакетная запись ТО и рекламаций через API: POST /api/maintenances/bulk/
+(и /api/claims/bulk/) со списком записей создаёт их все, PATCH того же
+адреса со списком {"id": ..., изменяемые поля} частично изменяет записи.
+
+Права — как у форм dashboard: ТО пишут менеджер, сервисная компания
+и клиент, рекламации — менеджер и сервисная компания; сервисная компания
+и клиент пишут только по своим машинам, а организация, проводившая ТО
+(рекламацию), подставляется по пользователю, как в MaintenanceForm и ClaimForm.
+
+Каждая запись проверяется сериализатором вьюсета, но связи не ищутся
+по одной на запись: машины читаются одним запросом, элементы справочника
+берутся из кэша справочника (PreloadedPrimaryKeyRelatedField), изменяемые
+записи — одним SELECT ... FOR UPDATE. Если хотя бы одна запись не прошла
+проверку, ничего не пишется, а ответ 400 содержит ошибки по позициям
+списка ({} у верных записей). Иначе записи создаются одним bulk_create
+(изменяются одним executemany) в одной транзакции.
+
+Массовая запись не посылает сигналов, поэтому индекс поиска, сводные поля
+машин, сводка аналитики и кэш ответов обновляются здесь явно.
+"""
+from django.db import transaction
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+from . import analytics, directory_cache, machine_stats, response_cache, search
+from .bulk_import import update_rows
+from .models import Machine, Claim, Directory
+
+# Наибольшее число записей в одном запросе
+BULK_WRITE_LIMIT = 1000
+
+
+def writable_machines(user):
+    """
+    Машины, по которым пользователь может вести ТО и рекламации.
+    """
+    if user.role == 'client':
+        return Machine.objects.filter(client_user=user)
+    if user.role == 'service':
+        return Machine.objects.filter(service_user=user)
+    return Machine.objects.all()
+
+
+def forced_service_company(user):
+    """
+    Организация, которую формы подставляют вместо выбранной пользователем (или None).
+    """
+    if user.role == 'service':
+        return directory_cache.lookup('Сервисная компания', user.get_full_name() or user.username)
+    if user.role == 'client':
+        return directory_cache.lookup('Сервисная компания', 'самостоятельно')
+    return None
+
+
+def item_ids(items, name):
+    ids = set()
+    for item in items:
+        value = item.get(name) if isinstance(item, dict) else None
+        if isinstance(value, bool):
+            continue
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+def preload(serializer, items, user):
+    """
+    {поле: {id: объект}} для связей записей items: справочник из кэша,
+    машины — одним запросом в пределах доступных пользователю.
+    """
+    preloaded = {}
+    for name, field in serializer.fields.items():
+        if field.read_only or not isinstance(field, PrimaryKeyRelatedField):
+            continue
+        model_field = serializer.Meta.model._meta.get_field(name)
+        if model_field.related_model is Directory:
+            entity_name = model_field.get_limit_choices_to()['entity_name']
+            preloaded[name] = {item.pk: item for item in directory_cache.entries(entity_name)}
+        elif model_field.related_model is Machine:
+            preloaded[name] = writable_machines(user).in_bulk(item_ids(items, name))
+    return preloaded
+
+
+def after_write(model, objects, previous_machines=(), previous_claims=None):
+    """
+    То, что для одиночной записи делают сигналы. previous_machines — машины
+    записей до изменения, previous_claims — {id: claim_values() до изменения}.
+    """
+    search.index(model, [obj.pk for obj in objects])
+    machine_stats.refresh({obj.machine_id for obj in objects} | set(previous_machines))
+    if model is Claim:
+        previous_claims = previous_claims or {}
+        analytics.claims_changed([(previous_claims.get(obj.pk), analytics.claim_values(obj)) for obj in objects])
+    response_cache.bump_generation()
+    transaction.on_commit(response_cache.bump_generation)
+
+
+class BulkWriteMixin:
+    """
+    Действия bulk (POST — создать, PATCH — частично изменить) для вьюсета
+    ТО или рекламаций; bulk_write_roles — роли, которым они доступны.
+    """
+    bulk_write_roles = ()
+
+    def bulk_items(self, request):
+        if getattr(request.user, 'role', None) not in self.bulk_write_roles:
+            raise PermissionDenied('У вас нет прав для этого действия.')
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'error': 'Передайте непустой список записей'})
+        if len(items) > BULK_WRITE_LIMIT:
+            raise ValidationError({'error': f'Не более {BULK_WRITE_LIMIT} записей за запрос'})
+        return items
+
+    def validate_items(self, items, instances=None):
+        """
+        Проверенные сериализаторы записей items (с instances — частичное изменение);
+        ValidationError со списком ошибок по позициям, если хоть одна запись неверна.
+        """
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        context['preloaded'] = preload(serializer_class(context=context), items, self.request.user)
+        forced = forced_service_company(self.request.user)
+        serializers, errors = [], []
+        for index, item in enumerate(items):
+            instance = instances[index] if instances else None
+            serializer = serializer_class(instance, data=item, partial=instance is not None, context=context)
+            if serializer.is_valid():
+                if forced is not None:
+                    serializer.validated_data['service_company'] = forced
+                errors.append({})
+            else:
+                errors.append(serializer.errors)
+            serializers.append(serializer)
+        if any(errors):
+            raise ValidationError(errors)
+        return serializers
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request, *args, **kwargs):
+        items = self.bulk_items(request)
+        model = self.get_queryset().model
+        serializers = self.validate_items(items)
+        objects = [model(**serializer.validated_data) for serializer in serializers]
+        with transaction.atomic():
+            model.objects.bulk_create(objects)
+            after_write(model, objects)
+        return Response(self.get_serializer(objects, many=True).data, status=status.HTTP_201_CREATED)
+
+    @bulk_create.mapping.patch
+    def bulk_partial_update(self, request, *args, **kwargs):
+        items = self.bulk_items(request)
+        ids = [next(iter(item_ids([item], 'id')), None) for item in items]
+        model = self.get_queryset().model
+        with transaction.atomic():
+            # Записи заблокированы до конца транзакции: проверка и запись видят одно и то же
+            current = self.get_queryset().select_for_update(of=('self',)).in_bulk({pk for pk in ids if pk})
+            errors, seen = [], set()
+            for pk in ids:
+                if pk not in current:
+                    errors.append({'id': ['Запись не найдена.']})
+                elif pk in seen:
+                    errors.append({'id': ['Запись повторяется в списке.']})
+                else:
+                    errors.append({})
+                seen.add(pk)
+            if any(errors):
+                raise ValidationError(errors)
+            instances = [current[pk] for pk in ids]
+            previous_machines = {obj.machine_id for obj in instances}
+            previous_claims = {obj.pk: analytics.claim_values(obj) for obj in instances} if model is Claim else None
+            serializers = self.validate_items(items, instances)
+            fields = set()
+            for instance, serializer in zip(instances, serializers):
+                for name, value in serializer.validated_data.items():
+                    setattr(instance, name, value)
+                    fields.add(model._meta.get_field(name).attname)
+            update_rows(model, instances, sorted(fields))
+            after_write(model, instances, previous_machines, previous_claims)
+        return Response(self.get_serializer(instances, many=True).data)
@@ -0,0 +1,164 @@
+"""
+Условные GET-запросы (ETag) для списков API и dashboard.
+
+Отпечаток выборки — число строк и наибольший updated_at, которые считаются
+одним агрегирующим запросом по той же выборке, что и ответ (роль, фильтры,
+поиск). В ETag входят также путь с параметрами, роль и id пользователя,
+поэтому разные представления и разные области видимости не совпадают.
+Если отпечаток совпал с If-None-Match, ответ 304 отдаётся без чтения
+строк и сериализации.
+
+Отпечаток кэшируется рядом с ответами (response_cache): ключ содержит номер
+поколения данных, поэтому при неизменных данных проверка не стоит запросов.
+
+Last-Modified не отдаётся: удаление строки меняет число строк, но не
+updated_at, а запись в ту же секунду, что и прошлый ответ, не меняет
+метку с точностью до секунды, поэтому If-Modified-Since давал бы
+устаревший 304.
+"""
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from . import metrics, response_cache
+from .models import Machine, Maintenance, Claim, Directory
+
+
+def aggregate(queryset, related=()):
+    """
+    (число строк, наибольший updated_at) выборки; для связей related
+    учитывается и их updated_at (например, раскрытая машина в списке ТО).
+    """
+    return summary(queryset.order_by().aggregate(**aggregates(related)))
+
+
+async def aaggregate(queryset, related=()):
+    return summary(await queryset.order_by().aaggregate(**aggregates(related)))
+
+
+def aggregates(related):
+    values = {'count': Count('pk'), 'updated_at': Max('updated_at')}
+    for name in related:
+        values[f'{name}_updated_at'] = Max(f'{name}__updated_at')
+    return values
+
+
+def summary(row):
+    stamps = [value for key, value in row.items() if key != 'count' and value is not None]
+    return row['count'], max(stamps) if stamps else None
+
+
+def fingerprint(request, parts, extra=()):
+    """
+    ETag по агрегатам parts.
+    """
+    user = request.user
+    key = repr((request.get_full_path(), user.role, user.pk, parts, extra))
+    return quote_etag(hashlib.sha256(key.encode('utf-8')).hexdigest()[:32])
+
+
+def etag_key(request, namespace, *extra):
+    """
+    Ключ кэша ETag рядом с ответами (его же читает async_api).
+    """
+    return response_cache.response_key(request, f'{namespace}:if-none-match', *extra)
+
+
+def cached_fingerprint(request, namespace, compute, *extra):
+    """
+    fingerprint из кэша ответов; compute() вызывается, только если его там нет.
+    """
+    if not response_cache.timeout():
+        return compute()
+    key = etag_key(request, namespace, *extra)
+    value = cache.get(key)
+    metrics.record_cache('etag', hits=value is not None, misses=value is None)
+    if value is None:
+        value = compute()
+        cache.set(key, value, response_cache.timeout())
+    return value
+
+
+def respond(request, etag, get_response):
+    """
+    304, если отпечаток не изменился, иначе ответ get_response() с ETag.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = get_response()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+    return response
+
+
+class ConditionalListMixin:
+    """
+    ETag для list() вьюсета. Раскрытые связи (?expand=) тоже
+    входят в отпечаток: справочник целиком, связанные объекты — по updated_at.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        etag = cached_fingerprint(request, type(self).__name__, self.list_fingerprint)
+        return respond(request, etag, lambda: super(ConditionalListMixin, self).list(
+            request, *args, **kwargs))
+
+    def list_fingerprint(self):
+        return fingerprint(self.request, [aggregate(*part) for part in self.fingerprint_parts()])
+
+    async def alist_fingerprint(self):
+        return fingerprint(self.request, [await aaggregate(*part) for part in self.fingerprint_parts()])
+
+    def fingerprint_parts(self):
+        """
+        [(выборка, раскрытые связи)], агрегаты которых входят в отпечаток.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        expand = self.get_expand() if hasattr(self, 'get_expand') else ()
+        related = [name for name in expand
+                   if name in getattr(self.get_serializer_class().Meta, 'expand_related', ())]
+        parts = [(queryset, related)]
+        if expand:
+            parts.append((Directory.objects.all(), ()))
+        return parts
+
+
+def dashboard_parts(user):
+    if user.role == 'manager':
+        machines = Machine.objects.all()
+    elif user.role == 'client':
+        machines = Machine.objects.filter(client_user=user)
+    elif user.role == 'service':
+        machines = Machine.objects.filter(service_user=user)
+    else:
+        machines = Machine.objects.none()
+    return [
+        aggregate(machines),
+        aggregate(Maintenance.objects.filter(machine__in=machines)),
+        aggregate(Claim.objects.filter(machine__in=machines)),
+        aggregate(Directory.objects.all()),
+    ]
+
+
+def conditional_dashboard(view_func):
+    """
+    ETag для dashboard: машины пользователя, их ТО и рекламации
+    и справочник. В ETag входит и сессия — страница содержит CSRF-токен.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+        session_key = request.session.session_key
+        etag = cached_fingerprint(
+            request, view_func.__name__,
+            lambda: fingerprint(request, dashboard_parts(request.user), extra=(session_key,)),
+            session_key,
+        )
+        return respond(request, etag, lambda: view_func(request, *args, **kwargs))
+    return _wrapped_view
@@ -0,0 +1,147 @@
+"""
+Кэш справочника Directory в памяти процесса.
+
+Справочник небольшой и меняется редко, а читается на каждой форме, в каждом
+__str__ и при импорте. Весь справочник загружается одним запросом и хранится
+в виде снимка: по entity_name (списки и карты name -> id) и по id.
+
+Снимок помечен версией. Сохранение или удаление элемента справочника (сигналы
+post_save/post_delete) сбрасывает снимок и увеличивает версию в общем кэше
+Django, а остальные процессы сверяют версию не чаще раза в
+DIRECTORY_CACHE_CHECK_INTERVAL секунд. Кэш locmem у каждого процесса свой
+(SHARED_CACHE выключен), поэтому тогда версия берётся из самой таблицы:
+число элементов и последний updated_at.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+VERSION_KEY = 'silant:directory:version'
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+class Snapshot:
+    def __init__(self, items, version):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.by_id = {}
+        self.by_entity = defaultdict(list)
+        self.ids_by_name = defaultdict(dict)
+        for item in items:
+            self.by_id[item.pk] = item
+            self.by_entity[item.entity_name].append(item)
+            self.ids_by_name[item.entity_name].setdefault(item.name, item.pk)
+
+
+def shared_version():
+    if not getattr(settings, 'SHARED_CACHE', True):
+        return database_version()
+    return cache.get_or_set(VERSION_KEY, 0, timeout=None)
+
+
+def database_version():
+    """
+    Версия справочника по самой таблице: меняется при любой записи и удалении,
+    в том числе сделанных другим процессом.
+    """
+    from .models import Directory
+    state = Directory.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    updated = state['updated'].timestamp() if state['updated'] else 0
+    return f"db-{state['count']}-{updated}"
+
+
+def fresh(current):
+    interval = getattr(settings, 'DIRECTORY_CACHE_CHECK_INTERVAL', 5)
+    return current is not None and time.monotonic() - current.checked_at < interval
+
+
+def snapshot():
+    """
+    Актуальный снимок справочника; при необходимости перечитывает его из БД.
+    """
+    global _snapshot
+    current = _snapshot
+    if fresh(current):
+        return current
+    with _lock:
+        current = _snapshot
+        version = shared_version()
+        if current is not None and current.version == version:
+            current.checked_at = time.monotonic()
+            return current
+        from .models import Directory
+        current = _snapshot = Snapshot(Directory.objects.order_by('id'), version)
+        return current
+
+
+def invalidate():
+    """
+    Сбрасывает снимок в этом процессе и сообщает остальным через версию в общем кэше.
+    """
+    global _snapshot
+    with _lock:
+        _snapshot = None
+        cache.add(VERSION_KEY, 0, timeout=None)
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            # Ключ успел вытесниться между add и incr
+            cache.set(VERSION_KEY, 1, timeout=None)
+
+
+def version():
+    return snapshot().version
+
+
+async def asnapshot():
+    """
+    snapshot() для асинхронных представлений: в поток (к БД) уходит,
+    только если снимок пора сверить с общим кэшем.
+    """
+    current = _snapshot
+    if fresh(current):
+        return current
+    return await sync_to_async(snapshot)()
+
+
+async def aversion():
+    return (await asnapshot()).version
+
+
+def get(pk):
+    """
+    Элемент справочника по id или None.
+    """
+    if pk is None:
+        return None
+    return snapshot().by_id.get(pk)
+
+
+def entries(entity_name):
+    """
+    Элементы одного справочника в порядке id (как в прежних выборках форм).
+    """
+    return snapshot().by_entity.get(entity_name, [])
+
+
+def lookup(entity_name, name):
+    """
+    Элемент справочника entity_name с названием name или None.
+    """
+    current = snapshot()
+    pk = current.ids_by_name.get(entity_name, {}).get(name)
+    return current.by_id.get(pk)
+
+
+def name_to_id(entity_name):
+    """
+    Карта «название -> id» для одного справочника.
+    """
+    return snapshot().ids_by_name.get(entity_name, {})
@@ -0,0 +1,121 @@
+"""
+Потоковая выгрузка машин, ТО и рекламаций в CSV и XLSX.
+
+Колонки и их заголовки берутся из ресурсов импорта/экспорта админки, а строки
+читаются через values_list().iterator(): в памяти одновременно находится
+только одна пачка строк, названия справочника подставляются из кэша
+справочника, а заводской номер машины читается тем же запросом через JOIN.
+
+CSV отдаётся по мере чтения строк. XLSX — zip-архив, который нельзя отдавать
+по частям до завершения; он собирается openpyxl в режиме write_only
+во временный файл на диске и затем отдаётся блоками.
+"""
+import csv
+import datetime
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from import_export.widgets import ForeignKeyWidget
+from openpyxl import Workbook
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import directory_cache
+from .admin import DirectoryWidget
+
+EXPORT_CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def export_columns(resource_class):
+    """
+    [(заголовок, путь для values_list, справочник ли)] в порядке экспорта ресурса.
+    """
+    resource = resource_class()
+    model = resource._meta.model
+    columns = []
+    for field in resource.get_export_fields():
+        widget = field.widget
+        if isinstance(widget, DirectoryWidget):
+            columns.append((field.column_name, model._meta.get_field(field.attribute).attname, True))
+        elif isinstance(widget, ForeignKeyWidget) and widget.field != 'pk':
+            columns.append((field.column_name, f'{field.attribute}__{widget.field}', False))
+        else:
+            columns.append((field.column_name, field.attribute, False))
+    return columns
+
+
+def iter_rows(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Строки выгрузки: списки значений в порядке columns.
+    """
+    directory = [index for index, (_, _, is_directory) in enumerate(columns) if is_directory]
+    rows = queryset.values_list(*[path for _, path, _ in columns]).iterator(chunk_size=chunk_size)
+    for row in rows:
+        row = list(row)
+        for index in directory:
+            item = directory_cache.get(row[index])
+            row[index] = item.name if item else None
+        yield row
+
+
+class Echo:
+    """
+    Псевдофайл для csv.writer: возвращает строку вместо записи.
+    """
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset, columns, filename):
+    def content():
+        writer = csv.writer(Echo())
+        # BOM, чтобы Excel открыл файл в UTF-8
+        yield '\ufeff' + writer.writerow([title for title, _, _ in columns])
+        for row in iter_rows(queryset, columns):
+            yield writer.writerow(['' if value is None else value for value in row])
+
+    response = StreamingHttpResponse(content(), content_type=FORMATS['csv'])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def stream_xlsx(queryset, columns, filename):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=filename[:31])
+    sheet.append([title for title, _, _ in columns])
+    for row in iter_rows(queryset, columns):
+        sheet.append(row)
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename=f'{filename}.xlsx', content_type=FORMATS['xlsx'])
+
+
+def export_response(queryset, resource_class, file_format, filename):
+    columns = export_columns(resource_class)
+    if file_format == 'xlsx':
+        return stream_xlsx(queryset, columns, filename)
+    return stream_csv(queryset, columns, filename)
+
+
+class ExportMixin:
+    """
+    Действие export вьюсета: GET /api/<ресурс>/export/?file_format=csv|xlsx.
+    Выгружаются те же записи, что и в списке (роль пользователя, фильтры,
+    поиск и сортировка), но без постраничного вывода.
+    """
+    export_resource = None
+
+    @action(detail=False, methods=['get'])
+    def export(self, request, *args, **kwargs):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in FORMATS:
+            return Response({'error': f'Формат выгрузки: {", ".join(FORMATS)}'}, status=400)
+        queryset = self.filter_queryset(self.get_queryset())
+        filename = f'{self.basename}-{datetime.date.today():%Y-%m-%d}'
+        return export_response(queryset, self.export_resource, file_format, filename)
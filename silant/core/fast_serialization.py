@@ -0,0 +1,165 @@
+"""
+Быстрый путь сериализации списков REST API.
+
+Для list() строки ответа собираются не из объектов моделей через
+ModelSerializer, а из словарей .values(): соответствие «поле ответа ->
+столбец и преобразование» вычисляется один раз по полям сериализатора,
+поэтому ответ совпадает со штатным байт в байт (тот же порядок полей,
+те же форматы дат, раскрытие ?expand= и сокращение ?fields=).
+
+FastJSONRenderer кодирует ответ через orjson, если он установлен,
+и даёт тот же результат, что JSONRenderer; без orjson работает штатный.
+"""
+from operator import itemgetter
+
+from django.conf import settings
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from . import metrics
+from .models import Directory
+from .serializers import MACHINE_FIELDS, directory_representation
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Поля, значения которых из БД уже совпадают с представлением DRF
+IDENTITY_FIELDS = (
+    serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson. Даты и прочие нестандартные типы отдаются
+    штатному JSONEncoder DRF, поэтому вывод не отличается от JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            with metrics.serialization():
+                return super().render(data, accepted_media_type, renderer_context)
+        with metrics.serialization():
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        # Как в JSONRenderer: U+2028 и U+2029 экранируются для встраивания в <script>
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+def isoformat(value):
+    return value.isoformat()
+
+
+def converted(key, convert):
+    def get(row):
+        value = row[key]
+        return None if value is None else convert(value)
+    return get
+
+
+class RowBuilder:
+    """
+    Сборщик строк ответа для сериализатора serializer (уже с учётом ?fields=)
+    и раскрываемых связей expand.
+    """
+
+    def __init__(self, serializer, expand=()):
+        model = serializer.Meta.model
+        # id нужен курсору пагинации, даже если его нет в ?fields=
+        self.paths = [model._meta.pk.attname]
+        self.spec = []
+        for name, field in serializer.fields.items():
+            model_field = model._meta.get_field(field.source)
+            attname = model_field.attname
+            if name in expand and model_field.related_model is Directory:
+                self.paths.append(attname)
+                self.spec.append((name, converted(attname, directory_representation)))
+            elif name in expand:
+                self.paths += [f'{name}__{path}' for path in MACHINE_FIELDS]
+                self.spec.append((name, self.related_getter(name)))
+            else:
+                self.paths.append(attname)
+                self.spec.append((name, self.getter(field, attname)))
+        self.paths = list(dict.fromkeys(self.paths))
+
+    def getter(self, field, attname):
+        if isinstance(field, IDENTITY_FIELDS):
+            return itemgetter(attname)
+        if (type(field) is serializers.DateField
+                and str(getattr(field, 'format', api_settings.DATE_FORMAT)).lower() == ISO_8601):
+            return converted(attname, isoformat)
+        return converted(attname, field.to_representation)
+
+    def related_getter(self, name):
+        id_key, serial_key, model_key = (f'{name}__{path}' for path in MACHINE_FIELDS)
+
+        def get(row):
+            if row[id_key] is None:
+                return None
+            return {
+                'id': row[id_key],
+                'serial_number': row[serial_key],
+                'model': directory_representation(row[model_key]),
+            }
+        return get
+
+    def values(self, queryset, extra=()):
+        return queryset.values(*self.paths, *extra)
+
+    def row(self, values):
+        return {name: get(values) for name, get in self.spec}
+
+
+class FastListMixin:
+    """
+    list() вьюсета через RowBuilder вместо ModelSerializer.
+    Отключается настройкой FAST_LIST_SERIALIZATION = False.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'FAST_LIST_SERIALIZATION', True):
+            return super().list(request, *args, **kwargs)
+        builder, rows = self.list_rows()
+        page = self.paginate_queryset(rows)
+        return self.list_response(builder, rows if page is None else page, page is not None)
+
+    async def alist_data(self):
+        """
+        Данные ответа list() через асинхронный ORM (async_api.py).
+        """
+        builder, rows = self.list_rows()
+        page = None
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(rows, self.request, view=self)
+        if page is None:
+            rows = [values async for values in rows]
+        return self.list_response(builder, rows if page is None else page, page is not None).data
+
+    def list_rows(self):
+        """
+        (RowBuilder, выборка .values() строк списка) — без обращения к БД.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        expand = self.get_expand() if hasattr(self, 'get_expand') else ()
+        builder = RowBuilder(self.get_serializer(), expand)
+        # Поля сортировки нужны курсору пагинации
+        ordering = [term.lstrip('-') for term in queryset.query.order_by if isinstance(term, str)]
+        extra = [queryset.model._meta.get_field(name).attname for name in ordering if name != 'pk']
+        # Полные объекты не создаются, поэтому .only() и select_related не нужны
+        return builder, builder.values(queryset, extra)
+
+    def list_response(self, builder, rows, paginated):
+        with metrics.serialization():
+            data = [builder.row(values) for values in rows]
+        if paginated:
+            return self.get_paginated_response(data)
+        return Response(data)
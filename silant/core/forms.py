@@ -1,18 +1,72 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from . import directory_cache
 from .models import Machine, Maintenance, Claim, Directory, User
 
+
+class DirectoryChoiceIterator(forms.models.ModelChoiceIterator):
+    """
+    Варианты выбора из кэша справочника вместо запроса к БД.
+    """
+    def entries(self):
+        return directory_cache.entries(self.field.entity_name)
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.entries():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.entries()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.entries())
+
+
+class DirectoryChoiceField(forms.ModelChoiceField):
+    """
+    Выбор элемента одного справочника; entity_name берётся из limit_choices_to
+    поля модели. Варианты и проверка значения идут через кэш справочника.
+    """
+    iterator = DirectoryChoiceIterator
+
+    def __init__(self, queryset, *, limit_choices_to=None, **kwargs):
+        self.entity_name = (limit_choices_to or {}).get('entity_name')
+        super().__init__(queryset, limit_choices_to=limit_choices_to, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, Directory):
+            value = value.pk
+        try:
+            obj = directory_cache.get(int(value))
+        except (TypeError, ValueError):
+            obj = None
+        if obj is None or obj.entity_name != self.entity_name:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
+
+
 class MachineForm(forms.ModelForm):
     class Meta:
         model = Machine
         fields = '__all__'
+        field_classes = {
+            'model': DirectoryChoiceField,
+            'engine_model': DirectoryChoiceField,
+            'transmission_model': DirectoryChoiceField,
+            'drive_axle_model': DirectoryChoiceField,
+            'steer_axle_model': DirectoryChoiceField,
+        }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['model'].queryset = Directory.objects.filter(entity_name="Модель техники")
-        self.fields['engine_model'].queryset = Directory.objects.filter(entity_name="Модель двигателя")
-        self.fields['transmission_model'].queryset = Directory.objects.filter(entity_name="Модель трансмиссии")
-        self.fields['drive_axle_model'].queryset = Directory.objects.filter(entity_name="Модель ведущего моста")
-        self.fields['steer_axle_model'].queryset = Directory.objects.filter(entity_name="Модель управляемого моста")
         self.fields['client_user'].queryset = User.objects.filter(role='client')
         self.fields['service_user'].queryset = User.objects.filter(role='service')
 
@@ -23,23 +77,25 @@ class MaintenanceForm(forms.ModelForm):
         widgets = {
             'machine': forms.HiddenInput(),
         }
+        field_classes = {
+            'maintenance_type': DirectoryChoiceField,
+            'service_company': DirectoryChoiceField,
+        }
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
-        self.fields['maintenance_type'].queryset = Directory.objects.filter(entity_name="Вид ТО")
-        self.fields['service_company'].queryset = Directory.objects.filter(entity_name="Сервисная компания")
         self._force_service_company = None
 
         if user and user.role == 'service':
             org_name = user.get_full_name() or user.username
-            directory_obj = Directory.objects.filter(entity_name="Сервисная компания", name=org_name).first()
+            directory_obj = directory_cache.lookup("Сервисная компания", org_name)
             if directory_obj:
                 self.fields['service_company'].initial = directory_obj
                 self.fields['service_company'].disabled = True
                 self._force_service_company = directory_obj
         elif user and user.role == 'client':
-            directory_obj = Directory.objects.filter(entity_name="Сервисная компания", name="самостоятельно").first()
+            directory_obj = directory_cache.lookup("Сервисная компания", "самостоятельно")
             if directory_obj:
                 self.fields['service_company'].initial = directory_obj
                 self.fields['service_company'].disabled = True
@@ -55,18 +111,20 @@ class ClaimForm(forms.ModelForm):
     class Meta:
         model = Claim
         fields = '__all__'
+        field_classes = {
+            'failed_unit': DirectoryChoiceField,
+            'recovery_method': DirectoryChoiceField,
+            'service_company': DirectoryChoiceField,
+        }
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
-        self.fields['failed_unit'].queryset = Directory.objects.filter(entity_name="Узел отказа")
-        self.fields['recovery_method'].queryset = Directory.objects.filter(entity_name="Способ восстановления")
-        self.fields['service_company'].queryset = Directory.objects.filter(entity_name="Сервисная компания")
 
         # 1. Если сервисная организация — автоподставить по пользователю
         if user and user.role == 'service':
             org_name = user.get_full_name() or user.username
-            directory_obj = Directory.objects.filter(entity_name="Сервисная компания", name=org_name).first()
+            directory_obj = directory_cache.lookup("Сервисная компания", org_name)
             if directory_obj:
                 self.fields['service_company'].initial = directory_obj
                 self.fields['service_company'].disabled = True
@@ -80,8 +138,8 @@ class ClaimForm(forms.ModelForm):
 
             elif 'machine' in self.data and self.data['machine']:
                 try:
-                    machine = Machine.objects.get(pk=self.data['machine'])
-                except Machine.DoesNotExist:
+                    machine = Machine.objects.select_related('service_user').get(pk=self.data['machine'])
+                except (Machine.DoesNotExist, ValueError):
                     machine = None
 
             elif getattr(self.instance, 'machine', None):
@@ -89,7 +147,7 @@ class ClaimForm(forms.ModelForm):
 
             if machine and getattr(machine, 'service_user', None):
                 org_name = machine.service_user.get_full_name() or machine.service_user.username
-                directory_obj = Directory.objects.filter(entity_name="Сервисная компания", name=org_name).first()
+                directory_obj = directory_cache.lookup("Сервисная компания", org_name)
                 if directory_obj:
                     self.fields['service_company'].initial = directory_obj
                     self.fields['service_company'].disabled = True
@@ -0,0 +1,115 @@
+"""
+Сводные поля машины по её ТО и рекламациям: дата последнего ТО, текущая
+наработка (наибольшая из указанных в ТО и рекламациях), число рекламаций,
+суммарный простой, даты последнего отказа и последнего восстановления.
+
+Поля хранятся в самой таблице машин, поэтому список машин выводит
+и сортирует их без подзапросов к ТО и рекламациям. Пересчитываются
+сигналами (signals.py) при каждой записи и удалении ТО или рекламации,
+в той же транзакции и под блокировкой строки машины; импорт и наполнение
+БД вызывают refresh() сами. Полный пересчёт:
+python manage.py recompute_machine_stats.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import Machine, Maintenance, Claim
+
+STATS_FIELDS = Machine.STATS_FIELDS
+RECOMPUTE_BATCH_SIZE = 1000
+
+
+def empty():
+    return {
+        'last_maintenance_date': None, 'operating_time': 0, 'claims_count': 0, 'total_downtime': 0,
+        'last_failure_date': None, 'last_recovery_date': None,
+    }
+
+
+def collect(machine_ids, maintenance_model=Maintenance, claim_model=Claim):
+    """
+    {id машины: значения сводных полей} для machine_ids — два GROUP BY.
+    """
+    stats = defaultdict(empty)
+    maintenances = maintenance_model.objects.order_by().filter(machine__in=machine_ids).values('machine').annotate(
+        last_date=Max('date'), last_operating_time=Max('operating_time'))
+    for row in maintenances:
+        values = stats[row['machine']]
+        values['last_maintenance_date'] = row['last_date']
+        values['operating_time'] = row['last_operating_time'] or 0
+    claims = claim_model.objects.order_by().filter(machine__in=machine_ids).values('machine').annotate(
+        count=Count('pk'), downtime_sum=Sum('downtime'), last_operating_time=Max('operating_time'),
+        last_failure=Max('failure_date'), last_recovery=Max('recovery_date'))
+    for row in claims:
+        values = stats[row['machine']]
+        values['operating_time'] = max(values['operating_time'], row['last_operating_time'] or 0)
+        values['claims_count'] = row['count']
+        values['total_downtime'] = row['downtime_sum'] or 0
+        values['last_failure_date'] = row['last_failure']
+        values['last_recovery_date'] = row['last_recovery']
+    return stats
+
+
+def write(machine_model, changed):
+    """
+    Один UPDATE на машину через executemany; updated_at тоже обновляется,
+    чтобы изменение попало в ленту синхронизации.
+    """
+    if not changed:
+        return
+    opts, quote = machine_model._meta, connection.ops.quote_name
+    fields = [opts.get_field(name) for name in STATS_FIELDS]
+    updated_at = opts.get_field('updated_at')
+    sql = 'UPDATE {} SET {}, {} = %s WHERE {} = %s'.format(
+        quote(opts.db_table),
+        ', '.join(f'{quote(field.column)} = %s' for field in fields),
+        quote(updated_at.column),
+        quote(opts.pk.column),
+    )
+    now = updated_at.get_db_prep_save(timezone.now(), connection)
+    params = [
+        [field.get_db_prep_save(values[field.name], connection) for field in fields] + [now, pk]
+        for pk, values in changed
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def refresh(machine_ids, machine_model=Machine, maintenance_model=Maintenance, claim_model=Claim):
+    """
+    Пересчитывает сводные поля машин machine_ids; возвращает число изменённых машин.
+    """
+    ids = sorted({pk for pk in machine_ids if pk is not None})
+    if not ids:
+        return 0
+    with transaction.atomic():
+        # Блокировка строк машин: параллельная запись ТО или рекламации той же
+        # машины дождётся фиксации и посчитает сводку уже с этой записью
+        current = {
+            row['pk']: row
+            for row in machine_model.objects.select_for_update().filter(pk__in=ids).values('pk', *STATS_FIELDS)
+        }
+        stats = collect(list(current), maintenance_model, claim_model)
+        changed = [
+            (pk, stats[pk]) for pk, row in current.items()
+            if any(row[name] != stats[pk][name] for name in STATS_FIELDS)
+        ]
+        write(machine_model, changed)
+    return len(changed)
+
+
+def recompute(machine_model=Machine, maintenance_model=Maintenance, claim_model=Claim,
+              batch_size=RECOMPUTE_BATCH_SIZE, stdout=None):
+    """
+    Пересчитывает сводные поля всех машин пачками; возвращает (машин, изменено).
+    """
+    pks = list(machine_model.objects.order_by('pk').values_list('pk', flat=True))
+    changed = 0
+    for start in range(0, len(pks), batch_size):
+        changed += refresh(pks[start:start + batch_size], machine_model, maintenance_model, claim_model)
+        if stdout:
+            stdout.write(f'  машин: {min(start + batch_size, len(pks))}/{len(pks)}')
+    return len(pks), changed
@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.benchmarks import SUITES
+from core.models import Machine, Maintenance, Claim, Directory
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет страницы и REST API «Мой Силант» (p50/p95, число SQL-запросов, пик памяти) '
+        'и выводит результат в JSON для сравнения между запусками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Замеров на каждый эндпоинт.')
+        parser.add_argument('--username', help='Пользователь, от имени которого выполняются запросы '
+                                               '(по умолчанию первый менеджер).')
+        parser.add_argument('--suite', action='append', choices=sorted(SUITES),
+                            help='Набор замеров (можно указать несколько раз), по умолчанию endpoints.')
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Одновременных клиентов в наборе concurrency.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Обработчиков WSGI/ASGI в наборе concurrency.')
+        parser.add_argument('--output', help='Записать JSON в файл вместо вывода на экран.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должно быть больше нуля')
+        if options['concurrency'] < 1 or options['workers'] < 1:
+            raise CommandError('--concurrency и --workers должны быть больше нуля')
+
+        report = {
+            'database': connection.vendor,
+            'rows': {
+                'machines': Machine.objects.count(),
+                'maintenances': Maintenance.objects.count(),
+                'claims': Claim.objects.count(),
+                'directories': Directory.objects.count(),
+            },
+            'iterations': options['iterations'],
+        }
+        for suite in options['suite'] or ['endpoints']:
+            report[suite] = SUITES[suite](**options)
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f'Результат записан в {options["output"]}'))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import api_schema
+
+
+class Command(BaseCommand):
+    help = ('Строит схему OpenAPI (Swagger) REST API и записывает её в openapi.json '
+            'и openapi.yaml; запускается при каждой выкладке.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Каталог для файлов схемы (по умолчанию API_SCHEMA_DIR).')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        paths = api_schema.build(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Схема записана: {", ".join(paths)} за {time.perf_counter() - started:.1f} с'
+        ))
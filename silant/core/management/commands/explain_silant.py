@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import User, Machine, Maintenance, Claim, Directory
+from core.seeding import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы выполнения (EXPLAIN) основных выборок по ролям '
+        'без составных индексов и с ними. Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--machines', type=int, default=0,
+            help='Сгенерировать временно N машин (с ТО и рекламациями) перед анализом.',
+        )
+        parser.add_argument('--maintenances-per-machine', type=int, default=5)
+        parser.add_argument('--claims-per-machine', type=int, default=2)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['machines']:
+                self.stdout.write(f'Генерация {options["machines"]} машин...')
+                seed(
+                    options['machines'],
+                    maintenances_per_machine=options['maintenances_per_machine'],
+                    claims_per_machine=options['claims_per_machine'],
+                )
+            self.analyze()
+
+            queries = self.hot_queries()
+            after = {name: self.explain(queryset, 'after') for name, queryset in queries}
+            self.drop_indexes()
+            before = {name: self.explain(queryset, 'before') for name, queryset in queries}
+
+            for name, _ in queries:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {name}'))
+                self.stdout.write(self.style.WARNING('-- без индексов:'))
+                self.stdout.write(before[name])
+                self.stdout.write(self.style.SUCCESS('-- с индексами:'))
+                self.stdout.write(after[name])
+
+            transaction.set_rollback(True)
+
+    def hot_queries(self):
+        """
+        Выборки, которые выполняют dashboard и REST API для разных ролей.
+        """
+        client = User.objects.filter(role='client').first()
+        service = User.objects.filter(role='service').first()
+        machine = Machine.objects.order_by('-shipment_date').first()
+        machine_id = machine.pk if machine else 0
+        return [
+            ('Машины менеджера',
+             Machine.objects.order_by('-shipment_date', '-id')[:50]),
+            ('Машины клиента',
+             Machine.objects.filter(client_user_id=client.pk if client else 0)
+             .order_by('-shipment_date', '-id')[:50]),
+            ('Машины сервисной организации',
+             Machine.objects.filter(service_user_id=service.pk if service else 0)
+             .order_by('-shipment_date', '-id')[:50]),
+            ('ТО машины',
+             Maintenance.objects.filter(machine_id=machine_id).order_by('-date', '-id')[:50]),
+            ('Рекламации машины',
+             Claim.objects.filter(machine_id=machine_id).order_by('-failure_date', '-id')[:50]),
+            ('Справочник по названию',
+             Directory.objects.filter(entity_name='Модель техники').order_by('name')),
+        ]
+
+    def explain(self, queryset, phase):
+        # Метка фазы делает текст запроса уникальным: иначе sqlite3 возьмёт
+        # из кэша подготовленный до удаления индексов план.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql} /* {phase} */', params)
+            return '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+
+    def analyze(self):
+        # Статистика нужна планировщику, иначе он выбирает индексы наугад
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for model in (Machine, Maintenance, Claim, Directory):
+                for index in model._meta.indexes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
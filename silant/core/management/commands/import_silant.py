@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk_import import RESOURCES, BulkImportError, import_file
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт машин, ТО или рекламаций из CSV/XLSX в формате импорта админки.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .csv, .xls или .xlsx.')
+        parser.add_argument('--model', choices=sorted(RESOURCES), required=True, help='Что импортируется.')
+        parser.add_argument('--create-missing', action='store_true',
+                            help='Создавать недостающие элементы справочника вместо ошибки.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки записи.')
+        parser.add_argument('--dry-run', action='store_true', help='Проверить и откатить изменения.')
+        parser.add_argument('--json', action='store_true', help='Вывести сводку в JSON.')
+
+    def handle(self, *args, **options):
+        try:
+            summary = import_file(
+                options['path'], options['model'],
+                create_missing=options['create_missing'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                stdout=None if options['json'] else self.stdout,
+            )
+        except (BulkImportError, ValueError, OSError) as e:
+            raise CommandError(str(e))
+        if options['json']:
+            self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2))
+            return
+        rate = summary['rows'] / summary['seconds'] if summary['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверено" if options["dry_run"] else "Импортировано"} строк: {summary["rows"]} '
+            f'(создано {summary["created"]}, обновлено {summary["updated"]}, '
+            f'без изменений {summary["unchanged"]}, '
+            f'новых элементов справочника {summary["directory_created"]}) '
+            f'за {summary["seconds"]:.1f} с, {rate:.0f} строк/с'
+        ))
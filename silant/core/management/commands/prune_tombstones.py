@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import sync
+from core.models import DeletedRecord
+
+
+class Command(BaseCommand):
+    help = 'Удаление надгробий старше срока хранения (SYNC_TOMBSTONE_RETENTION_DAYS).'
+
+    def handle(self, *args, **options):
+        deleted, _ = DeletedRecord.objects.filter(deleted_at__lt=timezone.now() - sync.retention()).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено надгробий: {deleted}'))
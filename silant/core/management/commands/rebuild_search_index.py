@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import response_cache, search
+from core.models import Machine, Maintenance, Claim
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс машин, ТО и рекламаций.'
+
+    def handle(self, *args, **options):
+        if search.backend() is None:
+            raise CommandError('Полнотекстовый индекс поддерживается только на SQLite и PostgreSQL.')
+        started = time.perf_counter()
+        counts = search.rebuild([Machine, Maintenance, Claim], stdout=self.stdout)
+        # Закэшированные списки с ?search= собраны по прежнему индексу
+        response_cache.bump_generation()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано машин: {counts["machine"]}, ТО: {counts["maintenance"]}, '
+            f'рекламаций: {counts["claim"]} за {elapsed:.1f} с'
+        ))
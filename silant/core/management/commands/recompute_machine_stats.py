@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import machine_stats, response_cache
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает сводные поля машин (последнее ТО, наработка, рекламации, простой) '
+            'по ТО и рекламациям.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=machine_stats.RECOMPUTE_BATCH_SIZE,
+                            help='Машин в одной транзакции.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        machines, changed = machine_stats.recompute(batch_size=options['batch_size'], stdout=self.stdout)
+        if changed:
+            response_cache.bump_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Машин: {machines}, изменено: {changed} за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.seeding import seed
+
+
+class Command(BaseCommand):
+    help = 'Заполняет БД синтетическими справочниками, пользователями, машинами, ТО и рекламациями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--machines', type=int, default=1000, help='Количество машин.')
+        parser.add_argument('--maintenances-per-machine', type=int, default=5, help='ТО на одну машину.')
+        parser.add_argument('--claims-per-machine', type=int, default=2, help='Рекламаций на одну машину.')
+        parser.add_argument('--clients', type=int, default=50, help='Количество клиентов.')
+        parser.add_argument('--services', type=int, default=10, help='Количество сервисных организаций.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки bulk_create.')
+        parser.add_argument('--prefix', default='seed', help='Префикс логинов и заводских номеров.')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора случайных чисел.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = seed(
+            options['machines'],
+            maintenances_per_machine=options['maintenances_per_machine'],
+            claims_per_machine=options['claims_per_machine'],
+            clients=options['clients'],
+            services=options['services'],
+            batch_size=options['batch_size'],
+            prefix=options['prefix'],
+            random_seed=options['seed'],
+            stdout=self.stdout if options['verbosity'] > 1 else None,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано машин: {created["machines"]}, ТО: {created["maintenances"]}, '
+            f'рекламаций: {created["claims"]} за {elapsed:.1f} с'
+        ))
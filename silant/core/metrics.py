@@ -0,0 +1,386 @@
+"""
+Метрики запросов по представлениям в текстовом формате Prometheus
+и заголовок Server-Timing.
+
+MetricsMiddleware засекает для каждого запроса время обработки, число
+и время SQL-запросов (обёртка execute, которую signals.py ставит на каждое
+новое соединение с БД), время отрисовки шаблонов (бэкенд DjangoTemplates
+этого модуля) и сериализации ответов API (serialization() в сериализаторах
+и FastJSONRenderer), размер ответа и попадания в кэши (record_cache() в кэше
+ответов, отпечатках ETag, публичном поиске и отчёте о надёжности).
+SQL, выполненный во время отрисовки или сериализации (ленивые связи),
+учитывается только во времени SQL, поэтому составляющие не пересекаются.
+Значения копятся в объекте текущего запроса (contextvar, поэтому видны
+и из потоков sync_to_async) и по окончании запроса добавляются к сводке
+процесса по имени представления (resolver_match.view_name) и методу:
+счётчики и гистограмма времени в памяти под одной блокировкой.
+На запрос — несколько вызовов perf_counter, поэтому метрики можно
+не выключать.
+
+Если задан METRICS_DIR, процесс не чаще раза в METRICS_FLUSH_INTERVAL
+секунд записывает свою сводку в файл <pid>.json этого каталога,
+а GET /metrics/ складывает сводки всех процессов (воркеров gunicorn/uvicorn).
+Доступ — персонал (is_staff) или заголовок Authorization: Bearer <METRICS_TOKEN>.
+
+Те же счётчики запроса отдаются в заголовке ответа Server-Timing (db, tpl,
+ser, app — остальное время, total; миллисекунды), который показывает
+вкладка Network инструментов разработчика браузера. Отключается
+настройкой SERVER_TIMING = False.
+"""
+import copy
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+# Границы корзин гистограммы времени запроса (сек)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+current = ContextVar('silant_metrics_request', default=None)
+
+
+class RequestStats:
+    """
+    Счётчики одного запроса.
+    """
+    __slots__ = ('queries', 'query_seconds', 'template_seconds', 'serialize_seconds', 'cache', 'timing')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.template_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.cache = {}
+        # Засекаемая сейчас составляющая: вложенные замеры не считаются дважды
+        self.timing = None
+
+
+def record_cache(name, hits=0, misses=0):
+    """
+    Попадания и промахи кэша name в текущем запросе.
+    """
+    stats = current.get()
+    if stats is not None:
+        counts = stats.cache.setdefault(name, [0, 0])
+        counts[0] += hits
+        counts[1] += misses
+
+
+@contextmanager
+def timed(name):
+    """
+    Добавляет к счётчику name_seconds текущего запроса время блока
+    за вычетом SQL-запросов внутри него.
+    """
+    stats = current.get()
+    if stats is None or stats.timing is not None:
+        yield
+        return
+    stats.timing = name
+    started, query_seconds = time.perf_counter(), stats.query_seconds
+    try:
+        yield
+    finally:
+        stats.timing = None
+        elapsed = time.perf_counter() - started - (stats.query_seconds - query_seconds)
+        setattr(stats, f'{name}_seconds', getattr(stats, f'{name}_seconds') + elapsed)
+
+
+def serialization():
+    return timed('serialize')
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - started
+
+
+def install(connection):
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+# ---- Шаблоны ----
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    Штатный бэкенд шаблонов, который засекает время отрисовки (для TEMPLATES).
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+# ---- Сводка процесса ----
+
+def empty_row():
+    return {
+        'requests': 0, 'seconds': 0.0, 'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+        'statuses': {}, 'queries': 0, 'query_seconds': 0.0, 'template_seconds': 0.0,
+        'serialize_seconds': 0.0, 'response_bytes': 0, 'cache': {},
+    }
+
+
+def merge_row(total, row):
+    for name in ('requests', 'seconds', 'queries', 'query_seconds', 'template_seconds', 'serialize_seconds',
+                 'response_bytes'):
+        # Сводки воркеров прежней версии могут не содержать новых полей
+        total[name] += row.get(name, 0)
+    total['buckets'] = [a + b for a, b in zip(total['buckets'], row['buckets'])]
+    for status, count in row['statuses'].items():
+        total['statuses'][status] = total['statuses'].get(status, 0) + count
+    for name, (hits, misses) in row['cache'].items():
+        counts = total['cache'].setdefault(name, [0, 0])
+        counts[0] += hits
+        counts[1] += misses
+
+
+class Registry:
+    """
+    Сводка процесса: {(представление, метод): счётчики}.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.flushed = time.monotonic()
+
+    def add(self, view, method, status, seconds, size, stats):
+        with self.lock:
+            row = self.rows.get((view, method))
+            if row is None:
+                row = self.rows[view, method] = empty_row()
+            row['requests'] += 1
+            row['seconds'] += seconds
+            row['buckets'][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            row['statuses'][status] = row['statuses'].get(status, 0) + 1
+            row['queries'] += stats.queries
+            row['query_seconds'] += stats.query_seconds
+            row['template_seconds'] += stats.template_seconds
+            row['serialize_seconds'] += stats.serialize_seconds
+            row['response_bytes'] += size
+            for name, (hits, misses) in stats.cache.items():
+                counts = row['cache'].setdefault(name, [0, 0])
+                counts[0] += hits
+                counts[1] += misses
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                {'view': view, 'method': method, **copy.deepcopy(row)}
+                for (view, method), row in self.rows.items()
+            ]
+
+    def clear(self):
+        with self.lock:
+            self.rows = {}
+
+    def flush(self, force=False):
+        """
+        Записывает сводку в METRICS_DIR/<pid>.json (не чаще METRICS_FLUSH_INTERVAL).
+        """
+        directory = getattr(settings, 'METRICS_DIR', '')
+        if not directory:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self.flushed < getattr(settings, 'METRICS_FLUSH_INTERVAL', 10):
+                return
+            self.flushed = now
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(temporary, path)
+        except OSError:
+            # Метрики не должны ломать запросы; сводка запишется в следующий раз
+            pass
+
+
+registry = Registry()
+
+
+def collect():
+    """
+    Сводка этого процесса, сложенная со сводками других процессов из METRICS_DIR.
+    """
+    totals = {}
+    snapshots = [registry.snapshot()]
+    directory = getattr(settings, 'METRICS_DIR', '')
+    if directory and os.path.isdir(directory):
+        own = f'{os.getpid()}.json'
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.json') or name == own:
+                continue
+            try:
+                with open(os.path.join(directory, name), encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # Файл другого процесса мог быть недописан или удалён
+                continue
+    for snapshot in snapshots:
+        for row in snapshot:
+            merge_row(totals.setdefault((row['view'], row['method']), empty_row()), row)
+    return totals
+
+
+# ---- Формат Prometheus ----
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**values):
+    return '{' + ','.join(f'{name}="{label_value(value)}"' for name, value in values.items()) + '}'
+
+
+def number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+METRICS = (
+    ('silant_requests_total', 'counter', 'Запросы по представлению, методу и коду ответа.'),
+    ('silant_request_duration_seconds', 'histogram', 'Время обработки запроса.'),
+    ('silant_db_queries_total', 'counter', 'SQL-запросы.'),
+    ('silant_db_query_seconds_total', 'counter', 'Время выполнения SQL-запросов.'),
+    ('silant_template_render_seconds_total', 'counter', 'Время отрисовки шаблонов (без SQL из шаблонов).'),
+    ('silant_serialize_seconds_total', 'counter', 'Время сериализации ответов API (без SQL).'),
+    ('silant_response_bytes_total', 'counter', 'Размер ответов (без потоковых).'),
+    ('silant_cache_requests_total', 'counter', 'Обращения к кэшам: result="hit" или "miss".'),
+)
+
+
+def render(totals=None):
+    """
+    Сводка в текстовом формате Prometheus 0.0.4.
+    """
+    totals = collect() if totals is None else totals
+    lines = {name: [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}'] for name, kind, help_text in METRICS}
+    for (view, method), row in sorted(totals.items()):
+        key = {'view': view, 'method': method}
+        for status, count in sorted(row['statuses'].items()):
+            lines['silant_requests_total'].append(f'silant_requests_total{labels(**key, status=status)} {count}')
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), row['buckets']):
+            cumulative += count
+            lines['silant_request_duration_seconds'].append(
+                f'silant_request_duration_seconds_bucket{labels(**key, le=bound)} {cumulative}')
+        lines['silant_request_duration_seconds'] += [
+            f'silant_request_duration_seconds_sum{labels(**key)} {number(row["seconds"])}',
+            f'silant_request_duration_seconds_count{labels(**key)} {row["requests"]}',
+        ]
+        for name, field in (('silant_db_queries_total', 'queries'),
+                            ('silant_db_query_seconds_total', 'query_seconds'),
+                            ('silant_template_render_seconds_total', 'template_seconds'),
+                            ('silant_serialize_seconds_total', 'serialize_seconds'),
+                            ('silant_response_bytes_total', 'response_bytes')):
+            lines[name].append(f'{name}{labels(**key)} {number(row[field])}')
+        for cache_name, (hits, misses) in sorted(row['cache'].items()):
+            for result, count in (('hit', hits), ('miss', misses)):
+                lines['silant_cache_requests_total'].append(
+                    f'silant_cache_requests_total{labels(**key, cache=cache_name, result=result)} {count}')
+    return '\n'.join(line for name, _, _ in METRICS for line in lines[name]) + '\n'
+
+
+def allowed(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization') == f'Bearer {token}':
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+# ---- Middleware ----
+
+def server_timing(stats, seconds):
+    """
+    Значение заголовка Server-Timing: составляющие времени запроса в мс
+    (описания латиницей — значение заголовка должно быть в ASCII).
+    """
+    parts = (
+        ('db', stats.query_seconds, f'SQL x{stats.queries}'),
+        ('tpl', stats.template_seconds, 'templates'),
+        ('ser', stats.serialize_seconds, 'serialization'),
+    )
+    other = seconds - sum(value for _, value, _ in parts)
+    entries = [f'{name};dur={value * 1000:.1f};desc="{desc}"' for name, value, desc in parts]
+    entries += [f'app;dur={max(other, 0) * 1000:.1f};desc="other"', f'total;dur={seconds * 1000:.1f}']
+    return ', '.join(entries)
+
+
+class MetricsMiddleware:
+    """
+    Засекает запрос и добавляет его к сводке процесса (работает и под ASGI).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, started = RequestStats(), time.perf_counter()
+        token = current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats, started = RequestStats(), time.perf_counter()
+        token = current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    def finish(self, request, response, stats, started):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        seconds = time.perf_counter() - started
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing(stats, seconds)
+        registry.add(view, request.method, str(response.status_code), seconds, size, stats)
+        registry.flush()
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_machine_service_company'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['machine', '-failure_date', '-id'], name='claim_machine_failure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='directory',
+            index=models.Index(fields=['entity_name', 'name'], name='directory_entity_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(fields=['client_user', '-shipment_date', '-id'], name='machine_client_shipment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(fields=['service_user', '-shipment_date', '-id'], name='machine_service_shipment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(fields=['-shipment_date', '-id'], name='machine_shipment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenance',
+            index=models.Index(fields=['machine', '-date', '-id'], name='maintenance_machine_date_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(choices=[('machine', 'Машина'), ('maintenance', 'ТО'), ('claim', 'Рекламация')], max_length=20, verbose_name='Таблица')),
+                ('object_id', models.IntegerField(verbose_name='id записи')),
+                ('machine_id', models.IntegerField(blank=True, null=True, verbose_name='id машины')),
+                ('client_user_id', models.IntegerField(blank=True, null=True, verbose_name='id клиента')),
+                ('service_user_id', models.IntegerField(blank=True, null=True, verbose_name='id сервисной организации')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='Удалено')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_name', 'deleted_at', 'id'], name='deleted_record_feed_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,101 @@
+import re
+
+from django.db import migrations
+
+from core.stemmer import stem
+
+# Таблица индекса и первичное наполнение зафиксированы здесь, а не берутся
+# из core.search: миграция должна давать тот же результат, как бы ни менялся
+# модуль поиска. Стеммер — часть формата индекса (им усекается и запрос),
+# поэтому импортируется.
+
+CREATE_SQL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS core_search USING fts5("
+        "body, tokenize='unicode61 remove_diacritics 2')",
+    ],
+    'postgresql': [
+        'CREATE TABLE IF NOT EXISTS core_search ('
+        'kind smallint NOT NULL, object_id integer NOT NULL, body tsvector NOT NULL, '
+        'PRIMARY KEY (kind, object_id))',
+        'CREATE INDEX IF NOT EXISTS core_search_body_idx ON core_search USING GIN (body)',
+    ],
+}
+DROP_SQL = 'DROP TABLE IF EXISTS core_search'
+
+INSERT_SQL = {
+    # rowid записи индекса — id записи * 4 + код модели
+    'sqlite': 'INSERT OR REPLACE INTO core_search (rowid, body) VALUES (%s, %s)',
+    'postgresql': "INSERT INTO core_search (kind, object_id, body) VALUES (%s, %s, to_tsvector('russian', %s)) "
+                  'ON CONFLICT (kind, object_id) DO UPDATE SET body = EXCLUDED.body',
+}
+
+# Модель: (код в индексе, поля документа; справочник — по названию)
+DOCUMENTS = {
+    'Machine': (1, [
+        'serial_number', 'model__name', 'engine_model__name', 'engine_serial', 'transmission_model__name',
+        'transmission_serial', 'drive_axle_model__name', 'drive_axle_serial', 'steer_axle_model__name',
+        'steer_axle_serial', 'contract', 'client', 'consignee', 'delivery_address', 'equipment',
+        'service_company',
+    ]),
+    'Maintenance': (2, ['machine__serial_number', 'maintenance_type__name', 'order_number', 'service_company__name']),
+    'Claim': (3, [
+        'machine__serial_number', 'failed_unit__name', 'failure_description', 'recovery_method__name',
+        'used_parts', 'service_company__name',
+    ]),
+}
+
+BATCH_SIZE = 1000
+
+TOKEN_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-яё]+')
+
+
+def stemmed(text):
+    return ' '.join(stem(token) if CYRILLIC_RE.fullmatch(token) else token
+                    for token in TOKEN_RE.findall(text.lower()))
+
+
+def rows(vendor, kind, batch):
+    for pk, *values in batch:
+        text = ' '.join(str(value) for value in values if value not in (None, ''))
+        if vendor == 'sqlite':
+            yield pk * 4 + kind, stemmed(text)
+        else:
+            yield kind, pk, text
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in CREATE_SQL[vendor]:
+            cursor.execute(sql)
+        for name, (kind, fields) in DOCUMENTS.items():
+            queryset = apps.get_model('core', name).objects.order_by('pk').values_list('pk', *fields)
+            batch = []
+            for row in queryset.iterator(chunk_size=BATCH_SIZE):
+                batch.append(row)
+                if len(batch) == BATCH_SIZE:
+                    cursor.executemany(INSERT_SQL[vendor], list(rows(vendor, kind, batch)))
+                    batch = []
+            if batch:
+                cursor.executemany(INSERT_SQL[vendor], list(rows(vendor, kind, batch)))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_deleted_record'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
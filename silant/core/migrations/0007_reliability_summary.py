@@ -0,0 +1,69 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:40
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+# Первичное наполнение сводки зафиксировано здесь, а не берётся из
+# core.analytics: миграция должна давать тот же результат, как бы ни менялся
+# модуль аналитики. Дальше сводку ведут сигналы и rebuild_analytics.
+CLAIM_DIMENSIONS = ('failed_unit', 'recovery_method', 'service_company')
+NOT_SPECIFIED = 0
+
+
+def build_summary(apps, schema_editor):
+    Claim = apps.get_model('core', 'Claim')
+    ReliabilitySummary = apps.get_model('core', 'ReliabilitySummary')
+    rows = []
+    for dimension in CLAIM_DIMENSIONS:
+        grouped = Claim.objects.order_by().values(dimension).annotate(
+            claims=Count('pk'), total_downtime=Sum('downtime'))
+        for row in grouped:
+            rows.append(ReliabilitySummary(
+                dimension=dimension, key=row[dimension] or NOT_SPECIFIED,
+                claims=row['claims'], downtime=row['total_downtime'] or 0,
+            ))
+    models_by_key = {}
+    grouped = Claim.objects.order_by().values('machine', 'machine__model').annotate(
+        claims=Count('pk'), total_downtime=Sum('downtime'), last_operating_time=Max('operating_time'))
+    for row in grouped:
+        parent = row['machine__model'] or NOT_SPECIFIED
+        machine = ReliabilitySummary(
+            dimension='machine', key=row['machine'], parent=parent, claims=row['claims'],
+            downtime=row['total_downtime'] or 0, operating_time=row['last_operating_time'] or 0,
+        )
+        rows.append(machine)
+        model = models_by_key.setdefault(parent, ReliabilitySummary(
+            dimension='model', key=parent, claims=0, downtime=0, operating_time=0, machines=0))
+        model.claims += machine.claims
+        model.downtime += machine.downtime
+        model.operating_time += machine.operating_time
+        model.machines += 1
+    rows.extend(models_by_key.values())
+    ReliabilitySummary.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReliabilitySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('failed_unit', 'Узел отказа'), ('recovery_method', 'Способ восстановления'), ('service_company', 'Сервисная компания'), ('model', 'Модель техники'), ('machine', 'Машина')], max_length=20, verbose_name='Разрез')),
+                ('key', models.IntegerField(verbose_name='Ключ')),
+                ('parent', models.IntegerField(default=0, verbose_name='Модель машины')),
+                ('claims', models.IntegerField(default=0, verbose_name='Рекламаций')),
+                ('downtime', models.BigIntegerField(default=0, verbose_name='Простой, дней')),
+                ('operating_time', models.BigIntegerField(default=0, verbose_name='Наработка, м/час')),
+                ('machines', models.IntegerField(default=0, verbose_name='Машин с отказами')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'key'), name='reliability_summary_key')],
+            },
+        ),
+        migrations.RunPython(build_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:49
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+# Первичный расчёт сводных полей зафиксирован здесь, а не берётся из
+# core.machine_stats: миграция должна давать тот же результат, как бы ни
+# менялись модуль и список полей модели. Новые поля уже заполнены
+# значениями по умолчанию, поэтому пишутся только машины с ТО или рекламациями.
+STATS_FIELDS = (
+    'last_maintenance_date', 'operating_time', 'claims_count', 'total_downtime',
+    'last_failure_date', 'last_recovery_date',
+)
+BATCH_SIZE = 1000
+
+
+def empty():
+    return {
+        'last_maintenance_date': None, 'operating_time': 0, 'claims_count': 0, 'total_downtime': 0,
+        'last_failure_date': None, 'last_recovery_date': None,
+    }
+
+
+def fill_stats(apps, schema_editor):
+    Machine = apps.get_model('core', 'Machine')
+    Maintenance = apps.get_model('core', 'Maintenance')
+    Claim = apps.get_model('core', 'Claim')
+    stats = defaultdict(empty)
+    maintenances = Maintenance.objects.order_by().values('machine').annotate(
+        last_date=Max('date'), last_operating_time=Max('operating_time'))
+    for row in maintenances:
+        values = stats[row['machine']]
+        values['last_maintenance_date'] = row['last_date']
+        values['operating_time'] = row['last_operating_time'] or 0
+    claims = Claim.objects.order_by().values('machine').annotate(
+        count=Count('pk'), downtime_sum=Sum('downtime'), last_operating_time=Max('operating_time'),
+        last_failure=Max('failure_date'), last_recovery=Max('recovery_date'))
+    for row in claims:
+        values = stats[row['machine']]
+        values['operating_time'] = max(values['operating_time'], row['last_operating_time'] or 0)
+        values['claims_count'] = row['count']
+        values['total_downtime'] = row['downtime_sum'] or 0
+        values['last_failure_date'] = row['last_failure']
+        values['last_recovery_date'] = row['last_recovery']
+
+    # Один UPDATE на машину через executemany; updated_at тоже обновляется,
+    # чтобы новые поля попали в ленту синхронизации
+    connection = schema_editor.connection
+    opts, quote = Machine._meta, connection.ops.quote_name
+    fields = [opts.get_field(name) for name in STATS_FIELDS]
+    updated_at = opts.get_field('updated_at')
+    sql = 'UPDATE {} SET {}, {} = %s WHERE {} = %s'.format(
+        quote(opts.db_table),
+        ', '.join(f'{quote(field.column)} = %s' for field in fields),
+        quote(updated_at.column),
+        quote(opts.pk.column),
+    )
+    now = updated_at.get_db_prep_save(timezone.now(), connection)
+    params = [
+        [field.get_db_prep_save(values[field.name], connection) for field in fields] + [now, pk]
+        for pk, values in sorted(stats.items())
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(params), BATCH_SIZE):
+            cursor.executemany(sql, params[start:start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_reliability_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='machine',
+            name='claims_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Рекламаций'),
+        ),
+        migrations.AddField(
+            model_name='machine',
+            name='last_failure_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Дата последнего отказа'),
+        ),
+        migrations.AddField(
+            model_name='machine',
+            name='last_maintenance_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Дата последнего ТО'),
+        ),
+        migrations.AddField(
+            model_name='machine',
+            name='last_recovery_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Дата последнего восстановления'),
+        ),
+        migrations.AddField(
+            model_name='machine',
+            name='operating_time',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Наработка, м/час'),
+        ),
+        migrations.AddField(
+            model_name='machine',
+            name='total_downtime',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Простой, дней'),
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
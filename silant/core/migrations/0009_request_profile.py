@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_machine_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Снят')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('path', models.CharField(max_length=500, verbose_name='Адрес')),
+                ('view_name', models.CharField(blank=True, max_length=200, verbose_name='Представление')),
+                ('status', models.PositiveSmallIntegerField(verbose_name='Код ответа')),
+                ('duration', models.FloatField(verbose_name='Время, сек')),
+                ('queries', models.IntegerField(default=0, verbose_name='SQL-запросов')),
+                ('query_seconds', models.FloatField(default=0, verbose_name='Время SQL, сек')),
+                ('summary', models.TextField(blank=True, verbose_name='Сводка')),
+                ('data', models.BinaryField(verbose_name='Профиль')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='request_profiles', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+    ]
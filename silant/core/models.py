@@ -1,11 +1,19 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+from . import directory_cache
 
 
 class Directory(models.Model):
     entity_name = models.CharField(max_length=100)
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Изменено')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['entity_name', 'name'], name='directory_entity_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.entity_name}: {self.name}"
@@ -21,6 +29,51 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='guest')
 
 
+# --- QuerySet'ы для табличных выборок (без N+1 по справочникам) ---
+class MachineQuerySet(models.QuerySet):
+    DIRECTORY_FIELDS = (
+        'model', 'engine_model', 'transmission_model',
+        'drive_axle_model', 'steer_axle_model',
+    )
+
+    def for_listing(self):
+        """
+        Машины вместе со всеми справочными моделями за один запрос.
+        Описания справочников в таблицах не выводятся, поэтому не читаются.
+        """
+        return self.select_related(*self.DIRECTORY_FIELDS).defer(
+            *[f'{field}__description' for field in self.DIRECTORY_FIELDS]
+        )
+
+
+class MaintenanceQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        ТО вместе с машиной (и её моделью), видом ТО и сервисной компанией.
+        """
+        return self.select_related(
+            'machine', 'machine__model', 'maintenance_type', 'service_company'
+        ).defer(
+            'machine__equipment', 'machine__model__description',
+            'maintenance_type__description', 'service_company__description',
+        )
+
+
+class ClaimQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Рекламации вместе с машиной (и её моделью), узлом отказа,
+        способом восстановления и сервисной компанией.
+        """
+        return self.select_related(
+            'machine', 'machine__model', 'failed_unit', 'recovery_method', 'service_company'
+        ).defer(
+            'machine__equipment', 'machine__model__description',
+            'failed_unit__description', 'recovery_method__description',
+            'service_company__description',
+        )
+
+
 class Machine(models.Model):
     # --- поля, связанные со справочником ---
     model = models.ForeignKey(
@@ -75,9 +128,50 @@ class Machine(models.Model):
         User, related_name='service_machines', null=True, blank=True, on_delete=models.SET_NULL,
         limit_choices_to={'role': 'service'}, verbose_name='Сервисная компания'
     )
+    # --- сводные поля по ТО и рекламациям (пересчитывает machine_stats) ---
+    last_maintenance_date = models.DateField(null=True, blank=True, editable=False, verbose_name='Дата последнего ТО')
+    operating_time = models.IntegerField(default=0, editable=False, verbose_name='Наработка, м/час')
+    claims_count = models.IntegerField(default=0, editable=False, verbose_name='Рекламаций')
+    total_downtime = models.IntegerField(default=0, editable=False, verbose_name='Простой, дней')
+    last_failure_date = models.DateField(null=True, blank=True, editable=False, verbose_name='Дата последнего отказа')
+    last_recovery_date = models.DateField(
+        null=True, blank=True, editable=False, verbose_name='Дата последнего восстановления')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Изменено')
+
+    STATS_FIELDS = (
+        'last_maintenance_date', 'operating_time', 'claims_count', 'total_downtime',
+        'last_failure_date', 'last_recovery_date',
+    )
+
+    objects = MachineQuerySet.as_manager()
+
+    class Meta:
+        # Выборки по ролям: фильтр по пользователю + сортировка по дате отгрузки (и id)
+        indexes = [
+            models.Index(fields=['client_user', '-shipment_date', '-id'], name='machine_client_shipment_idx'),
+            models.Index(fields=['service_user', '-shipment_date', '-id'], name='machine_service_shipment_idx'),
+            models.Index(fields=['-shipment_date', '-id'], name='machine_shipment_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.model} ({self.serial_number})"
+        return f"{directory_cache.get(self.model_id)} ({self.serial_number})"
+
+    def save(self, *args, **kwargs):
+        # Сводные поля пишет только machine_stats: сохранение машины из формы
+        # или API их не трогает и не затирает пересчитанные параллельно значения
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STATS_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def under_repair(self):
+        """
+        Машина ещё не восстановлена после последнего отказа.
+        """
+        return self.last_recovery_date is not None and self.last_recovery_date > timezone.localdate()
 
 # --- ТО (техническое обслуживание) ---
 class Maintenance(models.Model):
@@ -98,9 +192,17 @@ class Maintenance(models.Model):
         related_name='maintenances_service_company',  # <--- исправлено
         verbose_name='Организация, проводившая ТО'
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Изменено')
+
+    objects = MaintenanceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['machine', '-date', '-id'], name='maintenance_machine_date_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.machine.serial_number} - {self.maintenance_type} ({self.date})"
+        return f"{self.machine.serial_number} - {directory_cache.get(self.maintenance_type_id)} ({self.date})"
 
 # --- Рекламация ---
 class Claim(models.Model):
@@ -129,7 +231,95 @@ class Claim(models.Model):
         related_name='claims_service_company',  # <--- исправлено
         verbose_name='Сервисная компания'
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Изменено')
+
+    objects = ClaimQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['machine', '-failure_date', '-id'], name='claim_machine_failure_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.machine.serial_number} - {self.failed_unit} ({self.failure_date})"
+        return f"{self.machine.serial_number} - {directory_cache.get(self.failed_unit_id)} ({self.failure_date})"
+
+# --- Надгробия удалённых записей для ленты изменений (sync.py) ---
+class DeletedRecord(models.Model):
+    MODEL_CHOICES = [
+        ('machine', 'Машина'),
+        ('maintenance', 'ТО'),
+        ('claim', 'Рекламация'),
+    ]
+    model_name = models.CharField(max_length=20, choices=MODEL_CHOICES, verbose_name='Таблица')
+    object_id = models.IntegerField(verbose_name='id записи')
+    # Машина удалённого ТО/рекламации и владельцы удалённой машины: по ним
+    # надгробие попадает в область видимости роли, когда самой записи уже нет
+    machine_id = models.IntegerField(null=True, blank=True, verbose_name='id машины')
+    client_user_id = models.IntegerField(null=True, blank=True, verbose_name='id клиента')
+    service_user_id = models.IntegerField(null=True, blank=True, verbose_name='id сервисной организации')
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name='Удалено')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_name', 'deleted_at', 'id'], name='deleted_record_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_model_name_display()} #{self.object_id} ({self.deleted_at})"
+
+
+# --- Сводки аналитики надёжности (analytics.py) ---
+class ReliabilitySummary(models.Model):
+    DIMENSION_CHOICES = [
+        ('failed_unit', 'Узел отказа'),
+        ('recovery_method', 'Способ восстановления'),
+        ('service_company', 'Сервисная компания'),
+        ('model', 'Модель техники'),
+        ('machine', 'Машина'),
+    ]
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES, verbose_name='Разрез')
+    # id элемента справочника или машины; 0 — значение не указано
+    key = models.IntegerField(verbose_name='Ключ')
+    # Для строк машин — модель техники, в сводку которой входит машина
+    parent = models.IntegerField(default=0, verbose_name='Модель машины')
+    claims = models.IntegerField(default=0, verbose_name='Рекламаций')
+    downtime = models.BigIntegerField(default=0, verbose_name='Простой, дней')
+    # Наработка на последний отказ (машина) или их сумма по машинам (модель)
+    operating_time = models.BigIntegerField(default=0, verbose_name='Наработка, м/час')
+    machines = models.IntegerField(default=0, verbose_name='Машин с отказами')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='reliability_summary_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_dimension_display()} #{self.key}: {self.claims}"
+
+
+# --- Профили отдельных запросов персонала (profiling.py) ---
+class RequestProfile(models.Model):
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Снят')
+    user = models.ForeignKey(
+        User, related_name='request_profiles', null=True, blank=True, on_delete=models.SET_NULL,
+        verbose_name='Пользователь'
+    )
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    path = models.CharField(max_length=500, verbose_name='Адрес')
+    view_name = models.CharField(max_length=200, blank=True, verbose_name='Представление')
+    status = models.PositiveSmallIntegerField(verbose_name='Код ответа')
+    duration = models.FloatField(verbose_name='Время, сек')
+    queries = models.IntegerField(default=0, verbose_name='SQL-запросов')
+    query_seconds = models.FloatField(default=0, verbose_name='Время SQL, сек')
+    # Самые затратные функции по накопленному времени (вывод pstats)
+    summary = models.TextField(blank=True, verbose_name='Сводка')
+    # Статистика cProfile в формате pstats (файл .prof)
+    data = models.BinaryField(verbose_name='Профиль')
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.created_at})"
@@ -0,0 +1,181 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+from types import SimpleNamespace
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+DASHBOARD_PAGE_SIZE = 50
+
+Cursor = namedtuple('Cursor', ['reverse', 'position'])
+
+
+def paginate(request, queryset, per_page=DASHBOARD_PAGE_SIZE):
+    """
+    Постраничный вывод таблиц dashboard (?page=N).
+    Некорректный или слишком большой номер страницы приводится к допустимому.
+    """
+    return Paginator(queryset, per_page).get_page(request.GET.get('page'))
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация для REST API.
+
+    Порядок берётся из OrderingFilter представления (параметр ?ordering=),
+    к нему всегда добавляется id для однозначности. Курсор хранит значения
+    всех полей сортировки последней записи страницы, поэтому следующая
+    страница выбирается условием WHERE (поле, id) > (значение, id) без OFFSET:
+    глубокие страницы стоят столько же, сколько первая.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-pk'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset() для асинхронных представлений: страница читается асинхронным ORM.
+        """
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([row async for row in queryset])
+
+    def page_queryset(self, queryset, request, view=None):
+        """
+        Выборка страницы (с одной лишней строкой) без обращения к БД; None — без пагинации.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.keyset = self.get_keyset(queryset.model, self.ordering)
+
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+
+        queryset = queryset.order_by(*[
+            self.order_expression(field, descending != reverse)
+            for field, descending in self.keyset
+        ])
+        if self.cursor:
+            queryset = queryset.filter(self.after_position(self.cursor.position, reverse))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.cursor and self.cursor.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_keyset(self, model, ordering):
+        """
+        Список (поле модели, по убыванию) для сортировки; последним идёт первичный ключ
+        с направлением первого поля сортировки.
+        """
+        keyset = []
+        for term in ordering:
+            name = term.lstrip('-')
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            keyset.append((field, term.startswith('-')))
+        if not any(field.primary_key for field, _ in keyset):
+            keyset.append((model._meta.pk, keyset[0][1] if keyset else False))
+        return keyset
+
+    def order_expression(self, field, descending):
+        # NULL всегда считается наименьшим значением, одинаково на всех СУБД,
+        # иначе условие курсора разошлось бы с порядком выдачи.
+        if field.null:
+            expression = F(field.attname)
+            return expression.desc(nulls_last=True) if descending else expression.asc(nulls_first=True)
+        return f'-{field.attname}' if descending else field.attname
+
+    def after_position(self, position, reverse):
+        """
+        Условие «строго после position» в лексикографическом порядке keyset.
+        """
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(self.keyset, position):
+            condition |= equal & self.beyond(field, value, descending != reverse)
+            if value is None:
+                equal &= Q(**{f'{field.attname}__isnull': True})
+            else:
+                equal &= Q(**{field.attname: value})
+        return condition
+
+    def beyond(self, field, value, descending):
+        attname = field.attname
+        if descending:
+            if value is None:
+                return Q(pk__in=[])
+            condition = Q(**{f'{attname}__lt': value})
+            if field.null:
+                condition |= Q(**{f'{attname}__isnull': True})
+            return condition
+        if value is None:
+            return Q(**{f'{attname}__isnull': False})
+        return Q(**{f'{attname}__gt': value})
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            tokens = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            values = tokens['p']
+            if len(values) != len(self.keyset):
+                raise ValueError
+            position = [
+                None if value is None else field.to_python(value)
+                for (field, _), value in zip(self.keyset, values)
+            ]
+            return Cursor(reverse=bool(tokens.get('r')), position=position)
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        tokens = {'p': cursor.position}
+        if cursor.reverse:
+            tokens['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(tokens).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_position(self, instance):
+        if isinstance(instance, dict):
+            # Строка .values() (быстрый путь сериализации списков)
+            instance = SimpleNamespace(**instance)
+        position = []
+        for field, _ in self.keyset:
+            value = getattr(instance, field.attname)
+            position.append(None if value is None else field.value_to_string(instance))
+        return position
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(reverse=False, position=self.get_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(reverse=True, position=self.get_position(self.page[0])))
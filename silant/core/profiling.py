@@ -0,0 +1,121 @@
+"""
+Профиль отдельного запроса для персонала.
+
+Запрос сотрудника (is_staff) с параметром ?profile=1 или заголовком
+X-Silant-Profile: 1 выполняется под cProfile. Профиль сохраняется
+в RequestProfile: статистика в формате pstats (файл .prof открывают
+`python -m pstats`, snakeviz и т. п.) и текстовая сводка самых затратных
+функций. Профили перечислены в админке, файл скачивается оттуда же,
+а адрес скачивания возвращается в заголовке X-Silant-Profile ответа.
+Хранятся PROFILE_KEEP последних профилей; остальных запросов
+middleware не касается, кроме проверки параметра и заголовка.
+
+cProfile видит только свой поток. Под ASGI профилируется код в потоке
+цикла событий (вместе с другими запросами, идущими в это время),
+а синхронные представления, которые Django выполняет в пуле потоков,
+видны лишь как ожидание; их профиль снимайте под WSGI.
+"""
+import cProfile
+import io
+import marshal
+import pstats
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import reverse
+
+from . import metrics
+from .models import RequestProfile
+
+HEADER = 'X-Silant-Profile'
+# Строк в текстовой сводке профиля
+SUMMARY_LINES = 40
+
+
+def requested(request):
+    return request.GET.get('profile') == '1' or request.headers.get(HEADER) == '1'
+
+
+def dump(profiler):
+    """
+    (статистика в формате файла .prof, текстовая сводка).
+    """
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    data = marshal.dumps(stats.stats)
+    stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+    return data, stream.getvalue()
+
+
+def save(request, user, response, profiler, seconds):
+    """
+    Сохраняет профиль запроса и удаляет профили сверх PROFILE_KEEP.
+    """
+    data, text = dump(profiler)
+    match = getattr(request, 'resolver_match', None)
+    # Счётчики SQL запроса ведёт MetricsMiddleware (если включена)
+    stats = metrics.current.get() or metrics.RequestStats()
+    profile = RequestProfile.objects.create(
+        user=user, method=request.method, path=request.get_full_path()[:500],
+        view_name=match.view_name if match else '', status=response.status_code,
+        duration=seconds, queries=stats.queries, query_seconds=stats.query_seconds,
+        summary=text, data=data,
+    )
+    keep = getattr(settings, 'PROFILE_KEEP', 100)
+    stale = list(RequestProfile.objects.values_list('pk', flat=True)[keep:])
+    if stale:
+        RequestProfile.objects.filter(pk__in=stale).delete()
+    return profile
+
+
+def attach(response, profile):
+    response[HEADER] = reverse('admin:core_requestprofile_download', args=[profile.pk])
+    return response
+
+
+class ProfilerMiddleware:
+    """
+    Снимает профиль запроса сотрудника по ?profile=1 (работает и под ASGI).
+    Стоит после AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not requested(request) or not request.user.is_staff:
+            return self.get_response(request)
+        profiler, started = cProfile.Profile(), time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        seconds = time.perf_counter() - started
+        return attach(response, save(request, request.user, response, profiler, seconds))
+
+    async def __acall__(self, request):
+        if not requested(request):
+            return await self.get_response(request)
+        user = await request.auser()
+        if not user.is_staff:
+            return await self.get_response(request)
+        profiler, started = cProfile.Profile(), time.perf_counter()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        seconds = time.perf_counter() - started
+        return attach(response, await sync_to_async(save)(request, user, response, profiler, seconds))
@@ -0,0 +1,137 @@
+"""
+Публичный поиск машины по заводскому номеру.
+
+Десять открытых полей читаются одним запросом (названия моделей берутся
+через JOIN, без загрузки объектов) и кэшируются по заводскому номеру.
+Отрицательный результат («нет в системе») тоже кэшируется, но на меньший срок.
+Запись кэша сбрасывается при сохранении или удалении машины, а в ключ входит
+версия справочника, чтобы переименование модели не оставляло старых названий.
+Сброс доходит до других процессов только через общий кэш (file или redis);
+под locmem запись живёт несколько секунд (PUBLIC_LOOKUP_TIMEOUT).
+Асинхронные представления (ASGI) пользуются alookup/alookup_many: тот же кэш
+и тот же запрос, но через асинхронные кэш и ORM.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from . import directory_cache, metrics
+from .models import Machine
+
+# Порядок полей ответа: модель узла и её заводской номер парами
+PUBLIC_FIELDS = [
+    ('model', 'model__name'),
+    ('serial_number', None),
+    ('engine_model', 'engine_model__name'),
+    ('engine_serial', None),
+    ('transmission_model', 'transmission_model__name'),
+    ('transmission_serial', None),
+    ('drive_axle_model', 'drive_axle_model__name'),
+    ('drive_axle_serial', None),
+    ('steer_axle_model', 'steer_axle_model__name'),
+    ('steer_axle_serial', None),
+]
+
+NOT_FOUND = {}
+
+
+def cache_key(serial_number, version=None):
+    if version is None:
+        version = directory_cache.version()
+    return f'silant:public:{version}:{serial_number}'
+
+
+def queryset(serial_numbers):
+    annotations = {f'{name}_name': F(path) for name, path in PUBLIC_FIELDS if path}
+    plain = [name for name, path in PUBLIC_FIELDS if not path]
+    return Machine.objects.filter(serial_number__in=serial_numbers).values(*plain, **annotations)
+
+
+def public_fields(row):
+    return {
+        name: row[name] if not path else (row[f'{name}_name'] or '')
+        for name, path in PUBLIC_FIELDS
+    }
+
+
+def fetch(serial_numbers):
+    """
+    {заводской номер: открытые поля} одним запросом к БД.
+    """
+    return {row['serial_number']: public_fields(row) for row in queryset(serial_numbers)}
+
+
+async def afetch(serial_numbers):
+    return {row['serial_number']: public_fields(row) async for row in queryset(serial_numbers)}
+
+
+def cache_entries(keys, missing, found):
+    """
+    Записи кэша для дочитанных из БД номеров: (найденные, отсутствующие).
+    """
+    return (
+        {keys[serial]: found[serial] for serial in found},
+        {keys[serial]: NOT_FOUND for serial in missing if serial not in found},
+    )
+
+
+def lookup_many(serial_numbers):
+    """
+    {заводской номер: открытые поля или None} для списка номеров.
+    Номера, которых нет в кэше, дочитываются одним запросом.
+    """
+    serial_numbers = list(dict.fromkeys(serial_numbers))
+    version = directory_cache.version()
+    keys = {serial: cache_key(serial, version) for serial in serial_numbers}
+    cached = cache.get_many(keys.values())
+    result = {serial: cached[key] for serial, key in keys.items() if key in cached}
+
+    missing = [serial for serial in serial_numbers if serial not in result]
+    metrics.record_cache('public_lookup', hits=len(result), misses=len(missing))
+    if missing:
+        found = fetch(missing)
+        hits, misses = cache_entries(keys, missing, found)
+        cache.set_many(hits, timeout=getattr(settings, 'PUBLIC_LOOKUP_TIMEOUT', 3600))
+        if misses:
+            cache.set_many(misses, timeout=getattr(settings, 'PUBLIC_LOOKUP_MISS_TIMEOUT', 60))
+        result.update({serial: found.get(serial, NOT_FOUND) for serial in missing})
+
+    return {serial: result[serial] or None for serial in serial_numbers}
+
+
+async def alookup_many(serial_numbers):
+    """
+    lookup_many() для асинхронных представлений: асинхронный кэш и ORM.
+    """
+    serial_numbers = list(dict.fromkeys(serial_numbers))
+    version = await directory_cache.aversion()
+    keys = {serial: cache_key(serial, version) for serial in serial_numbers}
+    cached = await cache.aget_many(keys.values())
+    result = {serial: cached[key] for serial, key in keys.items() if key in cached}
+
+    missing = [serial for serial in serial_numbers if serial not in result]
+    metrics.record_cache('public_lookup', hits=len(result), misses=len(missing))
+    if missing:
+        found = await afetch(missing)
+        hits, misses = cache_entries(keys, missing, found)
+        await cache.aset_many(hits, timeout=getattr(settings, 'PUBLIC_LOOKUP_TIMEOUT', 3600))
+        if misses:
+            await cache.aset_many(misses, timeout=getattr(settings, 'PUBLIC_LOOKUP_MISS_TIMEOUT', 60))
+        result.update({serial: found.get(serial, NOT_FOUND) for serial in missing})
+
+    return {serial: result[serial] or None for serial in serial_numbers}
+
+
+def lookup(serial_number):
+    """
+    Открытые поля машины по заводскому номеру или None, если её нет в системе.
+    """
+    return lookup_many([serial_number])[serial_number]
+
+
+async def alookup(serial_number):
+    return (await alookup_many([serial_number]))[serial_number]
+
+
+def invalidate(*serial_numbers):
+    cache.delete_many([cache_key(serial) for serial in serial_numbers if serial])
@@ -0,0 +1,279 @@
+"""
+Углублённый анализ надёжности: распределения наработки между отказами
+с подгонкой Вейбулла и соблюдение межсервисных интервалов ТО.
+
+Нужные столбцы рекламаций и ТО читаются одним запросом values_list
+и переводятся в массивы NumPy; интервалы, перцентили и параметры
+Вейбулла считаются векторно сразу для всех групп (сортировка lexsort
+по группе и значению, суммы по группам через bincount). Без NumPy тот же
+отчёт считается циклом по объектам ORM (python_report) — он же служит
+эталоном в bench_silant --suite reliability.
+
+Наработка между отказами: по каждой машине отказы упорядочиваются
+по наработке, интервал — разница с предыдущим отказом (первый — от нуля).
+По моделям берутся все отказы машины, по узлам — только отказы того же
+узла той же машины. Вейбулл — регрессия по медианным рангам Бенарда:
+ln(-ln(1 - F)) = k·ln t - k·ln λ, где F = (i - 0.3) / (n + 0.4).
+
+Результат кэшируется по номеру поколения данных (response_cache),
+который меняется при любой записи машин, ТО, рекламаций и справочника.
+"""
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import directory_cache, metrics, response_cache
+from .models import Maintenance, Claim
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PERCENTILES = (('p10', 0.1), ('median', 0.5), ('p90', 0.9))
+# Доля отказов, до которой считается ресурс B10
+B10_FRACTION = 0.1
+
+
+def intervals_config():
+    hours = getattr(settings, 'MAINTENANCE_INTERVAL_HOURS', 500)
+    days = getattr(settings, 'MAINTENANCE_INTERVAL_DAYS', 365)
+    tolerance = getattr(settings, 'MAINTENANCE_INTERVAL_TOLERANCE', 0.1)
+    return hours * (1 + tolerance), days * (1 + tolerance)
+
+
+def name_of(key):
+    item = directory_cache.get(key) if key else None
+    return item.name if item else 'Не указано'
+
+
+def weibull(count, sx, sy, sxx, sxy):
+    """
+    (форма k, масштаб λ, ресурс B10) по суммам регрессии; None, если подогнать нельзя.
+    """
+    denominator = count * sxx - sx * sx
+    if count < 2 or denominator <= 0:
+        return None, None, None
+    shape = (count * sxy - sx * sy) / denominator
+    if shape <= 0:
+        return None, None, None
+    scale = math.exp(-((sy - shape * sx) / count) / shape)
+    b10 = scale * (-math.log1p(-B10_FRACTION)) ** (1 / shape)
+    return shape, scale, b10
+
+
+def distribution_row(key, count, total, percentiles, fit):
+    shape, scale, b10 = fit
+    row = {'id': key or None, 'name': name_of(key), 'failures': count, 'mean': round(total / count, 1)}
+    row.update((name, float(value)) for name, value in percentiles.items())
+    row.update({
+        'weibull_shape': None if shape is None else round(shape, 3),
+        'weibull_scale': None if scale is None else round(scale, 1),
+        'b10': None if b10 is None else round(b10, 1),
+    })
+    return row
+
+
+def compliance_row(key, intervals, hours, days, compliant):
+    return {
+        'id': key or None, 'name': name_of(key), 'intervals': intervals,
+        'mean_hours': round(hours / intervals, 1), 'mean_days': round(days / intervals, 1),
+        'compliance': round(compliant * 100 / intervals, 1),
+    }
+
+
+def sort_rows(rows, count_field):
+    return sorted(rows, key=lambda row: (-row[count_field], row['id'] or 0))
+
+
+# ---- Векторный расчёт (NumPy) ----
+
+def columns(queryset, *fields, dtype=None):
+    """
+    Столбцы values_list одним запросом: кортеж массивов (None -> 0).
+    """
+    rows = list(queryset.order_by().values_list(*fields))
+    if not rows:
+        return tuple(np.zeros(0, dtype=np.int64) for _ in fields)
+    result = []
+    for field, column in zip(fields, zip(*rows)):
+        if dtype and field in dtype:
+            result.append(np.array(column, dtype=dtype[field]).astype(np.int64))
+        else:
+            result.append(np.nan_to_num(np.array(column, dtype=np.float64)).astype(np.int64))
+    return tuple(result)
+
+
+def group_intervals(groups, times):
+    """
+    Интервалы между соседними значениями times внутри групп (первый — от нуля)
+    и порядок сортировки (группа, значение).
+    """
+    order = np.lexsort((times, groups))
+    groups, times = groups[order], times[order]
+    intervals = np.diff(times, prepend=0)
+    first = np.ones(len(groups), dtype=bool)
+    first[1:] = groups[1:] != groups[:-1]
+    intervals[first] = times[first]
+    return order, intervals, first
+
+
+def distributions(labels, values):
+    """
+    Строки распределения values (> 0) по группам labels: среднее, перцентили, Вейбулл.
+    """
+    mask = values > 0
+    labels, values = labels[mask], values[mask].astype(np.float64)
+    if not len(values):
+        return []
+    order = np.lexsort((values, labels))
+    labels, values = labels[order], values[order]
+    keys, start, counts = np.unique(labels, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(len(keys)), counts)
+    n = counts[group].astype(np.float64)
+    rank = np.arange(len(values)) - start[group] + 1
+    x = np.log(values)
+    y = np.log(-np.log1p(-(rank - 0.3) / (n + 0.4)))
+
+    def per_group(weights):
+        return np.bincount(group, weights=weights, minlength=len(keys))
+
+    totals, sx, sy = per_group(values), per_group(x), per_group(y)
+    sxx, sxy = per_group(x * x), per_group(x * y)
+    percentiles = {
+        name: values[start + np.maximum(np.ceil(fraction * counts).astype(np.int64), 1) - 1]
+        for name, fraction in PERCENTILES
+    }
+    return [
+        distribution_row(
+            int(key), int(counts[i]), float(totals[i]),
+            {name: column[i] for name, column in percentiles.items()},
+            weibull(int(counts[i]), float(sx[i]), float(sy[i]), float(sxx[i]), float(sxy[i])),
+        )
+        for i, key in enumerate(keys)
+    ]
+
+
+def compliance(labels, hours, days, limit_hours, limit_days):
+    if not len(labels):
+        return []
+    keys, group = np.unique(labels, return_inverse=True)
+    counts = np.bincount(group, minlength=len(keys))
+    total_hours = np.bincount(group, weights=hours, minlength=len(keys))
+    total_days = np.bincount(group, weights=days, minlength=len(keys))
+    ok = (hours <= limit_hours) & (days <= limit_days)
+    compliant = np.bincount(group, weights=ok, minlength=len(keys))
+    return [
+        compliance_row(int(key), int(counts[i]), float(total_hours[i]), float(total_days[i]), int(compliant[i]))
+        for i, key in enumerate(keys)
+    ]
+
+
+def numpy_report():
+    machine, model, unit, operating_time = columns(
+        Claim.objects, 'machine_id', 'machine__model_id', 'failed_unit_id', 'operating_time')
+    order, intervals, _ = group_intervals(machine, operating_time)
+    models = distributions(model[order], intervals)
+    # Пара (машина, узел) — одна группа
+    _, pair = np.unique(np.stack([machine, unit]), axis=1, return_inverse=True)
+    order, intervals, _ = group_intervals(pair.ravel(), operating_time)
+    units = distributions(unit[order], intervals)
+
+    machine, model, operating_time, date = columns(
+        Maintenance.objects, 'machine_id', 'machine__model_id', 'operating_time', 'date',
+        dtype={'date': 'datetime64[D]'})
+    # Сортировка по (машина, дата, наработка)
+    order = np.lexsort((operating_time, date, machine))
+    machine, model, operating_time, date = machine[order], model[order], operating_time[order], date[order]
+    later = np.zeros(len(machine), dtype=bool)
+    later[1:] = machine[1:] == machine[:-1]
+    hours = (operating_time - np.roll(operating_time, 1))[later]
+    days = (date - np.roll(date, 1))[later]
+    maintenance = compliance(model[later], hours, days, *intervals_config())
+
+    return {
+        'models': sort_rows(models, 'failures'),
+        'failed_units': sort_rows(units, 'failures'),
+        'maintenance': sort_rows(maintenance, 'intervals'),
+    }
+
+
+# ---- Тот же расчёт циклом по объектам ORM ----
+
+def python_distributions(groups):
+    rows = []
+    for key, values in groups.items():
+        values = sorted(value for value in values if value > 0)
+        if not values:
+            continue
+        count = len(values)
+        sx = sy = sxx = sxy = 0.0
+        for rank, value in enumerate(values, start=1):
+            x = math.log(value)
+            y = math.log(-math.log1p(-(rank - 0.3) / (count + 0.4)))
+            sx, sy, sxx, sxy = sx + x, sy + y, sxx + x * x, sxy + x * y
+        percentiles = {name: values[max(math.ceil(fraction * count), 1) - 1] for name, fraction in PERCENTILES}
+        rows.append(distribution_row(key, count, float(sum(values)), percentiles,
+                                     weibull(count, sx, sy, sxx, sxy)))
+    return rows
+
+
+def python_report():
+    times, model_of, unit_times = defaultdict(list), {}, defaultdict(list)
+    for claim in Claim.objects.select_related('machine'):
+        model_of[claim.machine_id] = claim.machine.model_id or 0
+        times[claim.machine_id].append(claim.operating_time or 0)
+        unit_times[(claim.machine_id, claim.failed_unit_id or 0)].append(claim.operating_time or 0)
+    models, units = defaultdict(list), defaultdict(list)
+    for machine_id, values in times.items():
+        previous = 0
+        for value in sorted(values):
+            models[model_of[machine_id]].append(value - previous)
+            previous = value
+    for (_, unit_id), values in unit_times.items():
+        previous = 0
+        for value in sorted(values):
+            units[unit_id].append(value - previous)
+            previous = value
+
+    limit_hours, limit_days = intervals_config()
+    history, model_of = defaultdict(list), {}
+    for maintenance in Maintenance.objects.select_related('machine'):
+        model_of[maintenance.machine_id] = maintenance.machine.model_id or 0
+        history[maintenance.machine_id].append((maintenance.date, maintenance.operating_time or 0))
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    for machine_id, records in history.items():
+        records.sort()
+        for (previous_date, previous_hours), (date, hours) in zip(records, records[1:]):
+            total = totals[model_of[machine_id]]
+            total[0] += 1
+            total[1] += hours - previous_hours
+            total[2] += (date - previous_date).days
+            total[3] += hours - previous_hours <= limit_hours and (date - previous_date).days <= limit_days
+
+    return {
+        'models': sort_rows(python_distributions(models), 'failures'),
+        'failed_units': sort_rows(python_distributions(units), 'failures'),
+        'maintenance': sort_rows([compliance_row(key, *total) for key, total in totals.items()], 'intervals'),
+    }
+
+
+def compute(engine=None):
+    engine = engine or ('numpy' if np is not None else 'python')
+    return numpy_report() if engine == 'numpy' else python_report()
+
+
+def report():
+    """
+    Отчёт для текущего поколения данных (из кэша, если уже считался).
+    """
+    version = response_cache.generation()
+    key = f'silant:reliability:{version}'
+    result = cache.get(key)
+    metrics.record_cache('reliability', hits=result is not None, misses=result is None)
+    if result is None:
+        result = {'version': version, 'engine': 'numpy' if np is not None else 'python', **compute()}
+        cache.set(key, result, getattr(settings, 'RELIABILITY_CACHE_TIMEOUT', 24 * 60 * 60))
+    return result
@@ -0,0 +1,89 @@
+"""
+Кэширование ответов dashboard и списков REST API по пользователю.
+
+Ключ содержит роль, id пользователя, путь и все GET-параметры (вкладка,
+фильтры, сортировка, страница/курсор), а также номер поколения данных.
+Любая запись в Machine, Maintenance, Claim или Directory увеличивает поколение
+(см. signals.py), поэтому устаревшие страницы больше не выдаются, а старые
+ключи просто вытесняются по времени жизни.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+from . import metrics
+
+GENERATION_KEY = 'silant:generation'
+
+
+def timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def generation():
+    return cache.get_or_set(GENERATION_KEY, 1, timeout=None)
+
+
+def bump_generation():
+    cache.add(GENERATION_KEY, 1, timeout=None)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Ключ успел вытесниться между add и incr
+        cache.set(GENERATION_KEY, 1, timeout=None)
+
+
+def response_key(request, namespace, *extra):
+    user = request.user
+    params = sorted((key, sorted(values)) for key, values in request.GET.lists())
+    digest = hashlib.sha256(
+        repr((request.get_host(), request.path, params, extra)).encode('utf-8')
+    ).hexdigest()
+    return f'silant:response:{namespace}:{generation()}:{user.role}:{user.pk}:{digest}'
+
+
+def cache_per_user(view_func):
+    """
+    Кэширует успешные GET-ответы HTML-страницы для авторизованного пользователя.
+    В ключ входит и сессия: страница содержит CSRF-токен формы выхода,
+    который меняется при каждом входе.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if request.method != 'GET' or not request.user.is_authenticated or not timeout():
+            return view_func(request, *args, **kwargs)
+        key = response_key(request, view_func.__name__, request.session.session_key)
+        cached = cache.get(key)
+        metrics.record_cache('response', hits=cached is not None, misses=cached is None)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, (response.content, response['Content-Type']), timeout())
+        return response
+    return _wrapped_view
+
+
+class CachedListMixin:
+    """
+    Кэширует данные ответа list() вьюсета. Хранятся данные, а не байты,
+    поэтому формат ответа (JSON, browsable API) по-прежнему выбирается по запросу.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not request.user.is_authenticated or not timeout():
+            return super().list(request, *args, **kwargs)
+        key = response_key(request, type(self).__name__)
+        data = cache.get(key)
+        metrics.record_cache('response', hits=data is not None, misses=data is None)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout())
+        return response
@@ -0,0 +1,92 @@
+"""
+Кэш строк таблиц dashboard (машины, ТО, рекламации).
+
+Строка таблицы отрисовывается отдельным шаблоном строки (machine_row.html
+и т. п.) и кэшируется по ключу из id записи, её updated_at и updated_at
+элементов справочника, на которые она ссылается. Сохранение записи или
+элемента справочника меняет ключ, поэтому строка перерисовывается без
+явного сброса, а старые записи кэша истекают сами (ROW_CACHE_TIMEOUT).
+В ключ входят также хэш шаблона строки (правка шаблона при выкладке)
+и текущая дата: строка машины показывает «в ремонте до ...» относительно
+сегодняшнего дня.
+
+Все строки таблицы читаются из кэша одним get_many, отрисовываются
+только промахи и записываются одним set_many, поэтому таблица из кэша —
+это склейка готовых фрагментов. Шаблон строки видит только свою запись
+(и настройки отрисовки вызывающего шаблона), а не весь контекст страницы.
+ROW_CACHE_TIMEOUT = 0 отключает кэш: строки просто отрисовываются.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone, translation
+from django.utils.safestring import mark_safe
+
+from . import directory_cache, metrics
+from .models import Directory
+
+
+def timeout():
+    return getattr(settings, 'ROW_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def directory_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if field.is_relation and field.related_model is Directory
+    ]
+
+
+def stamp(value):
+    return value.timestamp() if value is not None else ''
+
+
+def version(obj, fields):
+    """
+    Версия строки: updated_at записи и отображаемых ею элементов справочника.
+    """
+    parts = [stamp(obj.updated_at)]
+    for field in fields:
+        if field.is_cached(obj):
+            related = field.get_cached_value(obj)
+        else:
+            # Связь не загружена select_related: элемент берётся из кэша справочника
+            related = directory_cache.get(getattr(obj, field.attname))
+        parts.append(stamp(related.updated_at) if related is not None else '')
+    return ':'.join(map(str, parts))
+
+
+def render_rows(context, template_name, objects, name):
+    """
+    HTML строк objects по шаблону template_name (запись в нём — переменная name).
+    """
+    objects = list(objects)
+    if not objects:
+        return ''
+    template = context.template.engine.get_template(template_name)
+    row_context = context.new()
+
+    def render(obj):
+        with row_context.push({name: obj}):
+            return template.render(row_context)
+
+    if not timeout():
+        return mark_safe(''.join(render(obj) for obj in objects))
+
+    fields = directory_fields(type(objects[0]))
+    digest = hashlib.sha256(template.source.encode('utf-8')).hexdigest()[:12]
+    prefix = f'silant:row:{template_name}:{digest}:{translation.get_language()}:{timezone.localdate()}'
+    keys = [f'{prefix}:{obj.pk}:{version(obj, fields)}' for obj in objects]
+    cached = cache.get_many(keys)
+    metrics.record_cache('row', hits=len(cached), misses=len(keys) - len(cached))
+    missing = {}
+    rows = []
+    for key, obj in zip(keys, objects):
+        html = cached.get(key)
+        if html is None:
+            html = missing[key] = render(obj)
+        rows.append(html)
+    if missing:
+        cache.set_many(missing, timeout=timeout())
+    return mark_safe(''.join(rows))
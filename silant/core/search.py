@@ -0,0 +1,296 @@
+"""
+Полнотекстовый поиск по машинам, ТО и рекламациям.
+
+Индекс — отдельная таблица core_search (создаётся миграцией 0006):
+на SQLite виртуальная таблица FTS5, на PostgreSQL tsvector с индексом GIN.
+В документ записи входят заводской номер, названия из справочника,
+текстовые поля (описание отказа, запчасти, адрес и т. д.), а для ТО
+и рекламаций — заводской номер машины. Русская морфология: на PostgreSQL —
+конфигурация 'russian', на SQLite — стеммер Snowball (stemmer.py), которым
+усекаются и документ, и запрос. Каждое слово запроса ищется как префикс,
+слова объединяются по «И». Результаты ранжируются (bm25 / ts_rank).
+
+Индекс обновляется сигналами (signals.py) в той же транзакции, что и запись,
+а массовые операции (импорт, наполнение БД) вызывают reindex() сами.
+Полная перестройка: python manage.py rebuild_search_index.
+На других СУБД индекса нет, и ?search= работает как раньше (LIKE).
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from . import directory_cache
+from .models import Machine, Maintenance, Claim, Directory
+from .stemmer import stem
+
+# Код модели в индексе
+KINDS = {'machine': 1, 'maintenance': 2, 'claim': 3}
+
+# Поля, из которых собирается документ записи; связи со справочником
+# подставляются названиями
+DOCUMENT_FIELDS = {
+    'machine': [
+        'serial_number', 'model', 'engine_model', 'engine_serial', 'transmission_model',
+        'transmission_serial', 'drive_axle_model', 'drive_axle_serial', 'steer_axle_model',
+        'steer_axle_serial', 'contract', 'client', 'consignee', 'delivery_address', 'equipment',
+        'service_company',
+    ],
+    'maintenance': ['machine__serial_number', 'maintenance_type', 'order_number', 'service_company'],
+    'claim': [
+        'machine__serial_number', 'failed_unit', 'failure_description', 'recovery_method',
+        'used_parts', 'service_company',
+    ],
+}
+
+REINDEX_BATCH_SIZE = 1000
+SEARCH_RESULTS_LIMIT = 20
+
+TOKEN_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-яё]+')
+
+
+def tokens(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def stemmed(text):
+    return [stem(token) if CYRILLIC_RE.fullmatch(token) else token for token in tokens(text)]
+
+
+class SQLiteBackend:
+    """
+    FTS5: rowid записи индекса — id записи * 4 + код модели.
+    """
+
+    def create(self, cursor):
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS core_search USING fts5("
+                       "body, tokenize='unicode61 remove_diacritics 2')")
+
+    def drop(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS core_search')
+
+    def write(self, cursor, kind, documents):
+        cursor.executemany(
+            'INSERT OR REPLACE INTO core_search (rowid, body) VALUES (%s, %s)',
+            [(pk * 4 + KINDS[kind], ' '.join(stemmed(text))) for pk, text in documents],
+        )
+
+    def delete(self, cursor, kind, pks):
+        for start in range(0, len(pks), 900):
+            chunk = [pk * 4 + KINDS[kind] for pk in pks[start:start + 900]]
+            cursor.execute(f'DELETE FROM core_search WHERE rowid IN ({", ".join(["%s"] * len(chunk))})', chunk)
+
+    def clear(self, cursor):
+        cursor.execute('DELETE FROM core_search')
+
+    def query(self, text):
+        return ' AND '.join(f'"{token}"*' for token in stemmed(text))
+
+    def matching(self, kind, query):
+        return ('SELECT rowid / 4 FROM core_search WHERE core_search MATCH %s AND (rowid & 3) = %s',
+                [query, KINDS[kind]])
+
+    def ranked(self, kind, query, scope, limit):
+        scope_sql, scope_params = scope
+        # bm25 тем меньше, чем запись релевантнее
+        return ('SELECT rowid / 4 FROM core_search WHERE core_search MATCH %s AND (rowid & 3) = %s '
+                f'AND rowid / 4 IN ({scope_sql}) ORDER BY bm25(core_search), rowid LIMIT %s',
+                [query, KINDS[kind], *scope_params, limit])
+
+
+class PostgresBackend:
+    """
+    tsvector по конфигурации 'russian' с индексом GIN.
+    """
+
+    def create(self, cursor):
+        cursor.execute('CREATE TABLE IF NOT EXISTS core_search ('
+                       'kind smallint NOT NULL, object_id integer NOT NULL, body tsvector NOT NULL, '
+                       'PRIMARY KEY (kind, object_id))')
+        cursor.execute('CREATE INDEX IF NOT EXISTS core_search_body_idx ON core_search USING GIN (body)')
+
+    def drop(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS core_search')
+
+    def write(self, cursor, kind, documents):
+        cursor.executemany(
+            "INSERT INTO core_search (kind, object_id, body) VALUES (%s, %s, to_tsvector('russian', %s)) "
+            'ON CONFLICT (kind, object_id) DO UPDATE SET body = EXCLUDED.body',
+            [(KINDS[kind], pk, text) for pk, text in documents],
+        )
+
+    def delete(self, cursor, kind, pks):
+        cursor.execute('DELETE FROM core_search WHERE kind = %s AND object_id = ANY(%s)', [KINDS[kind], list(pks)])
+
+    def clear(self, cursor):
+        cursor.execute('TRUNCATE core_search')
+
+    def query(self, text):
+        return ' & '.join(f'{token}:*' for token in tokens(text))
+
+    def matching(self, kind, query):
+        return ("SELECT object_id FROM core_search WHERE kind = %s AND body @@ to_tsquery('russian', %s)",
+                [KINDS[kind], query])
+
+    def ranked(self, kind, query, scope, limit):
+        scope_sql, scope_params = scope
+        return ("SELECT object_id FROM core_search, to_tsquery('russian', %s) q "
+                f'WHERE kind = %s AND body @@ q AND object_id IN ({scope_sql}) '
+                'ORDER BY ts_rank(body, q) DESC, object_id LIMIT %s',
+                [query, KINDS[kind], *scope_params, limit])
+
+
+BACKENDS = {'sqlite': SQLiteBackend, 'postgresql': PostgresBackend}
+
+
+def backend(conn=None):
+    """
+    Индекс для СУБД соединения; None, если СУБД не поддерживается.
+    """
+    backend_class = BACKENDS.get((conn or connection).vendor)
+    return backend_class() if backend_class else None
+
+
+def kind_of(model):
+    return model._meta.model_name
+
+
+def documents(queryset):
+    """
+    [(id, текст документа)] для записей queryset. Названия справочника берутся
+    из кэша справочника, а для исторических моделей миграции — одним запросом.
+    """
+    model = queryset.model
+    paths = DOCUMENT_FIELDS[kind_of(model)]
+    directory_fields = {}
+    for index, path in enumerate(paths):
+        if '__' not in path:
+            related = model._meta.get_field(path).related_model
+            if related is not None and related._meta.model_name == 'directory':
+                directory_fields[index] = related
+    rows = list(queryset.order_by().values_list('pk', *paths))
+    if directory_fields and next(iter(directory_fields.values())) is not Directory:
+        related = next(iter(directory_fields.values()))
+        ids = {row[index + 1] for row in rows for index in directory_fields} - {None}
+        names = dict(related._default_manager.filter(pk__in=ids).values_list('pk', 'name')).get
+    else:
+        def names(pk):
+            item = directory_cache.get(pk)
+            return item.name if item else None
+    result = []
+    for pk, *values in rows:
+        for index in directory_fields:
+            values[index] = names(values[index])
+        result.append((pk, ' '.join(str(value) for value in values if value not in (None, ''))))
+    return result
+
+
+def reindex(queryset, batch_size=REINDEX_BATCH_SIZE):
+    """
+    Обновляет в индексе записи queryset; возвращает их число.
+    """
+    if backend() is None:
+        return 0
+    return index(queryset.model, list(queryset.order_by().values_list('pk', flat=True)), batch_size)
+
+
+def index(model, pks, batch_size=REINDEX_BATCH_SIZE):
+    """
+    Обновляет в индексе записи model с id из pks; возвращает их число.
+    """
+    search_index = backend()
+    if search_index is None:
+        return 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), batch_size):
+            chunk = pks[start:start + batch_size]
+            search_index.write(cursor, kind_of(model), documents(model._default_manager.filter(pk__in=chunk)))
+    return len(pks)
+
+
+def remove(model, pks):
+    index = backend()
+    if index is not None and pks:
+        with connection.cursor() as cursor:
+            index.delete(cursor, kind_of(model), list(pks))
+
+
+def directory_references(directory_id):
+    """
+    Записи, в документ которых входит название элемента справочника.
+    """
+    references = []
+    for model in (Machine, Maintenance, Claim):
+        condition = Q()
+        for path in DOCUMENT_FIELDS[kind_of(model)]:
+            if '__' not in path and model._meta.get_field(path).related_model is not None:
+                condition |= Q(**{path: directory_id})
+        references.append((model, list(model.objects.filter(condition).values_list('pk', flat=True))))
+    return references
+
+
+def rebuild(models, stdout=None):
+    """
+    Перестраивает индекс целиком по моделям models; возвращает {модель: записей}.
+    """
+    index = backend()
+    if index is None:
+        return {}
+    with connection.cursor() as cursor:
+        index.clear(cursor)
+    counts = {}
+    for model in models:
+        counts[kind_of(model)] = reindex(model._default_manager.all())
+        if stdout:
+            stdout.write(f'  {model._meta.verbose_name_plural}: {counts[kind_of(model)]}')
+    return counts
+
+
+def matching(model, text):
+    """
+    Подзапрос id записей model, подходящих под text; None — поиск недоступен.
+    """
+    index = backend()
+    if index is None:
+        return None
+    query = index.query(text)
+    if not query:
+        return None
+    sql, params = index.matching(kind_of(model), query)
+    return RawSQL(sql, params)
+
+
+def ranked(queryset, text, limit=SEARCH_RESULTS_LIMIT):
+    """
+    До limit записей queryset, подходящих под text, по убыванию релевантности.
+    """
+    index = backend()
+    query = index.query(text) if index else ''
+    if not query:
+        return []
+    # Область видимости роли — подзапрос id записей queryset; ранжирование
+    # и LIMIT выполняет СУБД, в Python приходят только limit id
+    scope = queryset.order_by().values('pk').query.sql_with_params()
+    sql, params = index.ranked(kind_of(queryset.model), query, scope, limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        found = [pk for pk, in cursor.fetchall()]
+    objects = queryset.in_bulk(found)
+    return [objects[pk] for pk in found if pk in objects]
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    ?search= по полнотекстовому индексу; на СУБД без индекса — штатный LIKE.
+    Порядок выдачи задаёт сортировка списка (курсор пагинации), а не ранг.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        subquery = matching(queryset.model, text) if text.strip() else None
+        if subquery is None:
+            return super().filter_queryset(request, queryset, view)
+        return queryset.filter(pk__in=subquery)
@@ -0,0 +1,204 @@
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from . import analytics, directory_cache, machine_stats, response_cache, search
+from .models import User, Machine, Maintenance, Claim, Directory
+
+# Справочные значения в духе демонстрационных данных «Силант»
+DIRECTORY_VALUES = {
+    'Модель техники': ['ПД1,5', 'ПД2,0', 'ПД3,0', 'ПД5,0', 'ПГ1,5', 'ПГ2,5'],
+    'Модель двигателя': ['Kubota D1803', 'Kubota V3300', 'ММЗ Д-245', 'Deutz TD 2.9', 'Perkins 404D'],
+    'Модель трансмиссии': ['10VB-00106', '10VB-00107', 'HF50-VP010', 'HF30-VP020'],
+    'Модель ведущего моста': ['20VA-00101', '20VA-00102', 'HA50-VP010'],
+    'Модель управляемого моста': ['VS20-00001', 'VS30-00001', 'VS50-00002'],
+    'Вид ТО': ['ТО-0 (50 м/час)', 'ТО-1 (200 м/час)', 'ТО-2 (400 м/час)', 'ТО-3 (1000 м/час)', 'ТО-4 (2000 м/час)'],
+    'Узел отказа': ['Двигатель', 'Трансмиссия', 'Ведущий мост', 'Управляемый мост', 'Гидросистема', 'Электрооборудование'],
+    'Способ восстановления': ['Ремонт узла', 'Замена узла', 'Регулировка'],
+}
+
+FAILURE_DESCRIPTIONS = [
+    'Течь гидравлики в районе распределителя',
+    'Не заводится двигатель, стартер не крутит',
+    'Посторонний шум в ведущем мосту при движении',
+    'Перегрев двигателя под нагрузкой',
+    'Не переключается передача заднего хода',
+    'Люфт рулевого управления, стук управляемого моста',
+    'Гидравлика не держит груз, мачта опускается',
+    'Не работают фары и звуковой сигнал',
+]
+
+USED_PARTS = ['', 'Шланг высокого давления', 'Стартер', 'Подшипник', 'Ремкомплект гидроцилиндра', 'Фильтр масляный']
+
+EQUIPMENT = [
+    'Стандарт',
+    'Защитная крыша, боковое смещение каретки',
+    'Кабина с отопителем, светодиодные фары',
+    'Увеличенная грузоподъёмность, доп. гидролиния',
+]
+
+CITIES = ['г. Чебоксары', 'г. Москва', 'г. Казань', 'г. Нижний Новгород', 'г. Екатеринбург', 'г. Новосибирск']
+
+
+def ensure_directory():
+    """
+    Справочник «Силант» (без сервисных компаний): {entity_name: [Directory, ...]}.
+    Недостающие элементы создаются одним bulk_create.
+    """
+    existing = {(d.entity_name, d.name): d for d in Directory.objects.filter(entity_name__in=DIRECTORY_VALUES)}
+    missing = [
+        Directory(entity_name=entity_name, name=name)
+        for entity_name, names in DIRECTORY_VALUES.items()
+        for name in names
+        if (entity_name, name) not in existing
+    ]
+    if missing:
+        # bulk_create не посылает post_save, поэтому кэш сбрасывается явно
+        Directory.objects.bulk_create(missing)
+        directory_cache.invalidate()
+    directory = {entity_name: [] for entity_name in DIRECTORY_VALUES}
+    for item in Directory.objects.filter(entity_name__in=DIRECTORY_VALUES).order_by('id'):
+        directory[item.entity_name].append(item)
+    return directory
+
+
+def ensure_users(role, count, prefix):
+    """
+    Пользователи seed_<role>_N; для сервисных организаций создаются и одноимённые
+    элементы справочника «Сервисная компания», как ожидают формы ТО и рекламаций.
+    """
+    usernames = [f'{prefix}_{role}_{i:04d}' for i in range(count)]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    password = make_password(None)
+    User.objects.bulk_create([
+        User(username=username, role=role, password=password,
+             first_name=f'ООО «{username}»' if role == 'service' else '')
+        for username in usernames if username not in existing
+    ])
+    users = list(User.objects.filter(username__in=usernames).order_by('id'))
+    companies = []
+    if role == 'service':
+        names = [user.get_full_name() for user in users]
+        known = dict(Directory.objects.filter(entity_name='Сервисная компания', name__in=names)
+                     .values_list('name', 'id'))
+        missing = [Directory(entity_name='Сервисная компания', name=name) for name in names if name not in known]
+        if missing:
+            Directory.objects.bulk_create(missing)
+            directory_cache.invalidate()
+        by_name = {d.name: d for d in Directory.objects.filter(entity_name='Сервисная компания', name__in=names)}
+        companies = [by_name[name] for name in names]
+    return users, companies
+
+
+def seed(machines, maintenances_per_machine=0, claims_per_machine=0, clients=50, services=10,
+         batch_size=1000, prefix='seed', random_seed=0, stdout=None):
+    """
+    Массово создаёт справочники, пользователей, машины, ТО и рекламации.
+
+    Машины создаются пачками по batch_size вместе со своими ТО и рекламациями,
+    поэтому потребление памяти не зависит от общего объёма.
+    Возвращает словарь с количеством созданных записей.
+    """
+    rng = random.Random(random_seed)
+    created = {'machines': 0, 'maintenances': 0, 'claims': 0}
+
+    with transaction.atomic():
+        directory = ensure_directory()
+        client_users, _ = ensure_users('client', clients, prefix)
+        service_users, service_companies = ensure_users('service', services, prefix)
+        company_by_user = {user.pk: company for user, company in zip(service_users, service_companies)}
+        serial_prefix = f'{prefix.upper()}-'
+        offset = Machine.objects.filter(serial_number__startswith=serial_prefix).count()
+
+        for start in range(0, machines, batch_size):
+            chunk = []
+            for i in range(start, min(start + batch_size, machines)):
+                number = offset + i
+                service_index = rng.randrange(len(service_users)) if service_users else None
+                client = rng.choice(client_users) if client_users else None
+                chunk.append(Machine(
+                    serial_number=f'{serial_prefix}{number:07d}',
+                    model=rng.choice(directory['Модель техники']),
+                    engine_model=rng.choice(directory['Модель двигателя']),
+                    engine_serial=f'E{number:07d}',
+                    transmission_model=rng.choice(directory['Модель трансмиссии']),
+                    transmission_serial=f'T{number:07d}',
+                    drive_axle_model=rng.choice(directory['Модель ведущего моста']),
+                    drive_axle_serial=f'D{number:07d}',
+                    steer_axle_model=rng.choice(directory['Модель управляемого моста']),
+                    steer_axle_serial=f'S{number:07d}',
+                    contract=f'№{number} от 01.01.2020',
+                    shipment_date=datetime.date(2018, 1, 1) + datetime.timedelta(days=rng.randrange(2500)),
+                    client=client.username if client else 'ИП Трудников С.В.',
+                    consignee=client.username if client else 'ИП Трудников С.В.',
+                    delivery_address=rng.choice(CITIES),
+                    equipment=rng.choice(EQUIPMENT),
+                    service_company=(service_companies[service_index].name
+                                     if service_index is not None else ''),
+                    client_user=client,
+                    service_user=service_users[service_index] if service_index is not None else None,
+                ))
+            chunk = Machine.objects.bulk_create(chunk)
+            if not chunk[0].pk:
+                # СУБД без RETURNING: получаем id только что созданных машин
+                serials = [m.serial_number for m in chunk]
+                ids = dict(Machine.objects.filter(serial_number__in=serials).values_list('serial_number', 'id'))
+                for machine in chunk:
+                    machine.pk = ids[machine.serial_number]
+
+            maintenances, claims = [], []
+            for machine in chunk:
+                company = company_by_user.get(machine.service_user_id)
+                date, hours = machine.shipment_date, 0
+                for _ in range(maintenances_per_machine):
+                    date += datetime.timedelta(days=rng.randrange(30, 120))
+                    hours += rng.randrange(50, 400)
+                    maintenances.append(Maintenance(
+                        machine=machine,
+                        maintenance_type=rng.choice(directory['Вид ТО']),
+                        date=date,
+                        operating_time=hours,
+                        order_number=f'#{date.year}-{rng.randrange(10000):04d}',
+                        order_date=date - datetime.timedelta(days=rng.randrange(5)),
+                        service_company=company,
+                    ))
+                date, hours = machine.shipment_date, 0
+                for _ in range(claims_per_machine):
+                    date += datetime.timedelta(days=rng.randrange(20, 300))
+                    hours += rng.randrange(100, 900)
+                    downtime = rng.randrange(1, 30)
+                    claims.append(Claim(
+                        machine=machine,
+                        failure_date=date,
+                        operating_time=hours,
+                        failed_unit=rng.choice(directory['Узел отказа']),
+                        failure_description=rng.choice(FAILURE_DESCRIPTIONS),
+                        recovery_method=rng.choice(directory['Способ восстановления']),
+                        used_parts=rng.choice(USED_PARTS),
+                        recovery_date=date + datetime.timedelta(days=downtime),
+                        downtime=downtime,
+                        service_company=company,
+                    ))
+            Maintenance.objects.bulk_create(maintenances, batch_size=batch_size)
+            Claim.objects.bulk_create(claims, batch_size=batch_size)
+            # bulk_create не посылает post_save: индекс поиска и сводные поля машин
+            # обновляются явно
+            search.index(Machine, [machine.pk for machine in chunk])
+            search.reindex(Maintenance.objects.filter(machine__in=chunk))
+            search.reindex(Claim.objects.filter(machine__in=chunk))
+            machine_stats.refresh([machine.pk for machine in chunk])
+
+            created['machines'] += len(chunk)
+            created['maintenances'] += len(maintenances)
+            created['claims'] += len(claims)
+            if stdout:
+                stdout.write(f'  машин: {created["machines"]}/{machines}')
+
+        # bulk_create не посылает сигналов: сводка аналитики пересчитывается целиком
+        analytics.rebuild()
+
+    # bulk_create не посылает post_save: закэшированные страницы сбрасываются явно
+    transaction.on_commit(response_cache.bump_generation)
+    return created
@@ -1,22 +1,197 @@
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
 from .models import Machine, Maintenance, Claim, Directory
+from . import directory_cache, metrics
 
-class MachineSerializer(serializers.ModelSerializer):
+
+def directory_representation(pk):
+    item = directory_cache.get(pk)
+    return {'id': item.pk, 'name': item.name} if item else None
+
+
+# Поля раскрытой машины: только они читаются из БД при ?expand=machine
+MACHINE_FIELDS = ('id', 'serial_number', 'model')
+
+
+def machine_representation(machine):
+    return {
+        'id': machine.pk,
+        'serial_number': machine.serial_number,
+        'model': directory_representation(machine.model_id),
+    }
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Связь по id. При пакетной записи (bulk_write.py) объекты берутся
+    из context['preloaded'][имя поля], подготовленного заранее одним запросом,
+    а не отдельным запросом на каждую запись.
+    """
+
+    def to_internal_value(self, data):
+        preloaded = self.context.get('preloaded', {}).get(self.field_name)
+        if preloaded is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return preloaded[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class SparseModelSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор, который при чтении отдаёт только поля из ?fields=
+    (список передаёт SparseFieldsMixin через context['fields']).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('fields')
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+    def to_representation(self, instance):
+        # Время попадает в Server-Timing (ser) и метрики запроса
+        with metrics.serialization():
+            return super().to_representation(instance)
+
+
+class ExpandableModelSerializer(SparseModelSerializer):
+    """
+    Сериализатор с раскрытием связей по запросу (?expand=model,machine).
+
+    Без expand внешние ключи отдаются как id. Раскрытые связи справочника
+    берутся из кэша справочника, без JOIN; остальные перечислены
+    в Meta.expand_related и подгружаются через select_related (см. ExpandMixin).
+    Запись по-прежнему принимает id.
+    """
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+    def get_expand(self):
+        return self.context.get('expand', ())
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for name in self.get_expand():
+            if name not in data:
+                continue
+            field = instance._meta.get_field(name)
+            if field.related_model is Directory:
+                data[name] = directory_representation(getattr(instance, field.attname))
+            else:
+                related = getattr(instance, name)
+                data[name] = machine_representation(related) if related else None
+        return data
+
+    @classmethod
+    def expandable(cls):
+        return [
+            field.name for field in cls.Meta.model._meta.concrete_fields
+            if field.is_relation and (field.related_model is Directory
+                                      or field.name in getattr(cls.Meta, 'expand_related', ()))
+        ]
+
+
+class MachineSerializer(ExpandableModelSerializer):
     class Meta:
         model = Machine
         fields = '__all__'
 
-class MaintenanceSerializer(serializers.ModelSerializer):
+class MaintenanceSerializer(ExpandableModelSerializer):
     class Meta:
         model = Maintenance
         fields = '__all__'
+        expand_related = ['machine']
 
-class ClaimSerializer(serializers.ModelSerializer):
+class ClaimSerializer(ExpandableModelSerializer):
     class Meta:
         model = Claim
         fields = '__all__'
+        expand_related = ['machine']
 
-class DirectorySerializer(serializers.ModelSerializer):
+class DirectorySerializer(SparseModelSerializer):
     class Meta:
         model = Directory
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class ExpandMixin:
+    """
+    Разбирает ?expand= для ExpandableModelSerializer вьюсета и подгружает
+    раскрываемые связи из Meta.expand_related одним JOIN.
+    """
+
+    def get_expand(self):
+        if not hasattr(self, '_expand'):
+            raw = self.request.query_params.get('expand', '') if self.request else ''
+            names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+            allowed = self.get_serializer_class().expandable()
+            unknown = [name for name in names if name not in allowed]
+            if unknown:
+                raise ValidationError({'expand': f'Нельзя раскрыть: {", ".join(unknown)}. '
+                                                 f'Доступно: {", ".join(allowed)}'})
+            self._expand = names
+        return self._expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        related = getattr(self.get_serializer_class().Meta, 'expand_related', ())
+        joins = [name for name in self.get_expand() if name in related]
+        return queryset.select_related(*joins) if joins else queryset
+
+
+class SparseFieldsMixin:
+    """
+    Параметр ?fields=serial_number,model,shipment_date для чтения: ответ
+    содержит только эти поля, а из БД читаются только их столбцы (.only()),
+    плюс id и поля сортировки, нужные курсору пагинации.
+    """
+
+    def get_sparse_fields(self):
+        if not hasattr(self, '_sparse_fields'):
+            raw = self.request.query_params.get('fields', '') if self.request else ''
+            names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+            if names and self.request.method not in ('GET', 'HEAD', 'OPTIONS'):
+                # При записи сериализатор должен видеть все поля
+                names = []
+            allowed = list(self.get_serializer_class()().fields)
+            unknown = [name for name in names if name not in allowed]
+            if unknown:
+                raise ValidationError({'fields': f'Неизвестные поля: {", ".join(unknown)}. '
+                                                 f'Доступно: {", ".join(allowed)}'})
+            self._sparse_fields = names
+        return self._sparse_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_sparse_fields()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        names = self.get_sparse_fields()
+        if not names:
+            return queryset
+        model = queryset.model
+        columns = {'pk'}
+        columns.update(name for name in names if model._meta.get_field(name).concrete)
+        # Поля сортировки нужны курсору пагинации
+        columns.update(term.lstrip('-') for term in queryset.query.order_by if isinstance(term, str))
+        # Раскрытая связь подгружается select_related (ExpandMixin), поэтому её
+        # внешний ключ нельзя откладывать, даже если в fields= её нет
+        expand = self.get_expand() if hasattr(self, 'get_expand') else ()
+        for name in getattr(self.get_serializer_class().Meta, 'expand_related', ()):
+            if name in expand:
+                columns.add(name)
+                columns.update(f'{name}__{field}' for field in MACHINE_FIELDS)
+        return queryset.only(*columns)
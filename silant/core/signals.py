@@ -0,0 +1,165 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from . import analytics, directory_cache, machine_stats, metrics, public_lookup, response_cache, search, sync
+from .models import Machine, Maintenance, Claim, Directory
+
+
+@receiver([post_save, post_delete], sender=Directory)
+def invalidate_directory_cache(sender, **kwargs):
+    directory_cache.invalidate()
+    # Повторно после фиксации: другие потоки могли успеть собрать снимок
+    # до того, как изменение стало им видно
+    transaction.on_commit(directory_cache.invalidate)
+
+
+@receiver(pre_save, sender=Machine)
+def remember_machine_values(sender, instance, raw=False, **kwargs):
+    # Если заводской номер меняется, кэш нужно сбросить и для прежнего номера;
+    # смена модели переносит отказы машины в сводке аналитики, смена
+    # владельцев убирает машину из ленты синхронизации прежнего владельца
+    if instance.pk and not raw:
+        (instance._previous_serial_number, instance._previous_model_id,
+         instance._previous_client_user_id, instance._previous_service_user_id) = (
+            Machine.objects.filter(pk=instance.pk).values_list(
+                'serial_number', 'model_id', 'client_user_id', 'service_user_id').first()
+            or (None, None, None, None)
+        )
+
+
+@receiver([post_save, post_delete], sender=Machine)
+def invalidate_public_lookup(sender, instance, **kwargs):
+    serials = [instance.serial_number, getattr(instance, '_previous_serial_number', None)]
+    public_lookup.invalidate(*serials)
+    transaction.on_commit(lambda: public_lookup.invalidate(*serials))
+
+
+@receiver([post_save, post_delete], sender=Machine)
+@receiver([post_save, post_delete], sender=Maintenance)
+@receiver([post_save, post_delete], sender=Claim)
+@receiver([post_save, post_delete], sender=Directory)
+def bump_response_generation(sender, **kwargs):
+    response_cache.bump_generation()
+    transaction.on_commit(response_cache.bump_generation)
+
+
+@receiver(post_delete, sender=Machine)
+@receiver(post_delete, sender=Maintenance)
+@receiver(post_delete, sender=Claim)
+def record_deletion(sender, instance, **kwargs):
+    # Срабатывает и для ТО/рекламаций, удалённых каскадом вместе с машиной
+    sync.record_deletion(instance)
+
+
+@receiver(post_save, sender=Machine)
+def record_scope_exit(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    client_user_id = getattr(instance, '_previous_client_user_id', None)
+    service_user_id = getattr(instance, '_previous_service_user_id', None)
+    sync.record_scope_exit(
+        instance,
+        client_user_id=client_user_id if client_user_id != instance.client_user_id else None,
+        service_user_id=service_user_id if service_user_id != instance.service_user_id else None,
+    )
+
+
+@receiver(post_save, sender=Machine)
+@receiver(post_save, sender=Maintenance)
+@receiver(post_save, sender=Claim)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index(sender, [instance.pk])
+    previous = getattr(instance, '_previous_serial_number', None)
+    if sender is Machine and previous is not None and previous != instance.serial_number:
+        # Заводской номер машины входит в документы её ТО и рекламаций
+        search.reindex(Maintenance.objects.filter(machine=instance))
+        search.reindex(Claim.objects.filter(machine=instance))
+
+
+@receiver(post_delete, sender=Machine)
+@receiver(post_delete, sender=Maintenance)
+@receiver(post_delete, sender=Claim)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Directory)
+def reindex_directory_references(sender, instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        for model, pks in search.directory_references(instance.pk):
+            search.index(model, pks)
+
+
+@receiver(pre_delete, sender=Directory)
+def remember_directory_references(sender, instance, **kwargs):
+    # Ссылки обнуляются UPDATE без сигналов, поэтому записи запоминаются заранее
+    instance._search_references = search.directory_references(instance.pk)
+
+
+@receiver(post_delete, sender=Directory)
+def reindex_former_directory_references(sender, instance, **kwargs):
+    for model, pks in getattr(instance, '_search_references', ()):
+        search.index(model, pks)
+
+
+@receiver(pre_save, sender=Claim)
+def remember_claim_values(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._analytics_values = analytics.stored_claim_values(instance.pk)
+
+
+@receiver(post_save, sender=Claim)
+def update_claim_analytics(sender, instance, raw=False, **kwargs):
+    if not raw:
+        analytics.claim_changed(getattr(instance, '_analytics_values', None), analytics.claim_values(instance))
+
+
+@receiver(post_delete, sender=Claim)
+def remove_claim_analytics(sender, instance, **kwargs):
+    analytics.claim_changed(analytics.claim_values(instance), None)
+
+
+@receiver(post_save, sender=Machine)
+def move_machine_analytics(sender, instance, raw=False, **kwargs):
+    if not raw and hasattr(instance, '_previous_model_id') and instance._previous_model_id != instance.model_id:
+        analytics.refresh_machines([instance.pk])
+
+
+@receiver(post_delete, sender=Directory)
+def move_directory_analytics(sender, instance, **kwargs):
+    analytics.directory_deleted(instance.pk)
+
+
+@receiver(pre_save, sender=Maintenance)
+@receiver(pre_save, sender=Claim)
+def remember_machine(sender, instance, raw=False, **kwargs):
+    # При переносе записи на другую машину пересчитываются обе
+    if instance.pk and not raw:
+        instance._previous_machine_id = sender.objects.filter(pk=instance.pk).values_list(
+            'machine_id', flat=True).first()
+
+
+@receiver(post_save, sender=Maintenance)
+@receiver(post_save, sender=Claim)
+def update_machine_stats(sender, instance, raw=False, **kwargs):
+    if not raw:
+        machine_stats.refresh([instance.machine_id, getattr(instance, '_previous_machine_id', None)])
+
+
+@receiver(post_delete, sender=Maintenance)
+@receiver(post_delete, sender=Claim)
+def remove_from_machine_stats(sender, instance, origin=None, **kwargs):
+    # При каскадном удалении вместе с машиной пересчитывать нечего
+    if isinstance(origin, Machine) or getattr(origin, 'model', None) is Machine:
+        return
+    machine_stats.refresh([instance.machine_id])
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    # Число и время SQL-запросов для метрик (metrics.py), на всех соединениях и потоках
+    metrics.install(connection)
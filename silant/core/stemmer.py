@@ -0,0 +1,107 @@
+"""
+Стеммер русского языка (алгоритм Snowball, snowballstem.org/algorithms/russian).
+
+Нужен полнотекстовому поиску на SQLite: токенизатор FTS5 не умеет русскую
+морфологию, поэтому в индекс и в запрос попадают уже усечённые основы,
+и «течь гидравлики» находится по запросу «гидравлика течь».
+На PostgreSQL то же делает конфигурация 'russian'.
+"""
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+     'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий',
+    'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю',
+    'ия', 'ья', 'я',
+)
+SUPERLATIVE = ('ейш', 'ейше')
+DERIVATIONAL = ('ост', 'ость')
+
+
+def regions(word):
+    """
+    Начала областей RV и R2 (см. описание алгоритма).
+    """
+    rv = next((i + 1 for i, char in enumerate(word) if char in VOWELS), len(word))
+
+    def after_consonant(start):
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    return rv, after_consonant(after_consonant(0))
+
+
+def ending(word, start, endings, after_a=()):
+    """
+    Самое длинное окончание из endings (или из after_a с предшествующей «а»/«я»),
+    целиком лежащее в word[start:]; '' — если нет.
+    """
+    found = ''
+    for suffix in endings:
+        if len(suffix) > len(found) and word.endswith(suffix) and len(word) - len(suffix) >= start:
+            found = suffix
+    for suffix in after_a:
+        position = len(word) - len(suffix)
+        if (len(suffix) > len(found) and word.endswith(suffix) and position - 1 >= start
+                and word[position - 1] in 'ая'):
+            found = suffix
+    return found
+
+
+def cut(word, suffix):
+    return word[:len(word) - len(suffix)] if suffix else word
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = regions(word)
+    if rv >= len(word):
+        return word
+
+    # Шаг 1
+    suffix = ending(word, rv, PERFECTIVE_GERUND[1], PERFECTIVE_GERUND[0])
+    if suffix:
+        word = cut(word, suffix)
+    else:
+        word = cut(word, ending(word, rv, REFLEXIVE))
+        suffix = ending(word, rv, ADJECTIVE)
+        if suffix:
+            word = cut(word, suffix)
+            word = cut(word, ending(word, rv, PARTICIPLE[1], PARTICIPLE[0]))
+        else:
+            suffix = ending(word, rv, VERB[1], VERB[0])
+            word = cut(word, suffix or ending(word, rv, NOUN))
+
+    # Шаг 2
+    word = cut(word, ending(word, rv, ('и',)))
+
+    # Шаг 3
+    word = cut(word, ending(word, r2, DERIVATIONAL))
+
+    # Шаг 4
+    if ending(word, rv, ('нн',)):
+        return word[:-1]
+    suffix = ending(word, rv, SUPERLATIVE)
+    if suffix:
+        word = cut(word, suffix)
+        return word[:-1] if ending(word, rv, ('нн',)) else word
+    return cut(word, ending(word, rv, ('ь',)))
@@ -0,0 +1,217 @@
+"""
+Лента изменений для инкрементальной синхронизации (GET /api/<ресурс>/changes/).
+
+Клиент передаёт курсор из прошлого ответа (или метку времени ISO 8601)
+и получает записи, созданные или изменённые после него (по updated_at),
+и id удалённых записей (по надгробиям DeletedRecord). Обе выборки идут
+по индексу в порядке (метка времени, id) и ограничены размером страницы,
+поэтому стоимость синхронизации зависит от числа изменений, а не от
+размера таблицы.
+
+Надгробия пишутся сигналом post_delete, в том числе для ТО и рекламаций,
+удалённых каскадом вместе с машиной. Для ТО и рекламаций запоминается
+машина, для машины — клиент и сервисная организация: по ним надгробие
+попадает в ту же область видимости роли, что и get_queryset вьюсета.
+
+Смена клиента или сервисной организации машины для прежнего владельца
+равносильна удалению: ему пишутся такие же надгробия машины, её ТО
+и рекламаций. ТО и рекламации при этом получают новый updated_at, чтобы
+новый владелец получил их в ленте. Надгробия записей, которые
+пользователь по-прежнему видит (менеджер, новый владелец), лента
+не отдаёт.
+
+updated_at ставится при сохранении, а видна запись становится только
+после фиксации транзакции, поэтому лента отдаёт изменения не новее
+SYNC_CHANGES_LAG секунд: запись долгой транзакции не окажется позади
+уже выданного курсора.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import Machine, Maintenance, Claim, DeletedRecord
+
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 5000
+
+
+def lag():
+    return datetime.timedelta(seconds=getattr(settings, 'SYNC_CHANGES_LAG', 60))
+
+
+def retention():
+    return datetime.timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+
+
+def record_deletion(instance):
+    """
+    Надгробие удалённой машины, ТО или рекламации.
+    """
+    if isinstance(instance, Machine):
+        DeletedRecord.objects.create(
+            model_name='machine', object_id=instance.pk,
+            client_user_id=instance.client_user_id, service_user_id=instance.service_user_id,
+        )
+    else:
+        DeletedRecord.objects.create(
+            model_name=instance._meta.model_name, object_id=instance.pk, machine_id=instance.machine_id,
+        )
+
+
+def record_scope_exit(machine, client_user_id=None, service_user_id=None):
+    """
+    Надгробия машины, её ТО и рекламаций для прежних владельцев машины
+    (клиента и/или сервисной организации), у которых она больше не видна.
+    """
+    if client_user_id is None and service_user_id is None:
+        return
+    records = [DeletedRecord(
+        model_name='machine', object_id=machine.pk,
+        client_user_id=client_user_id, service_user_id=service_user_id,
+    )]
+    now = timezone.now()
+    for model in (Maintenance, Claim):
+        pks = list(model.objects.filter(machine=machine).values_list('pk', flat=True))
+        records.extend(
+            DeletedRecord(model_name=model._meta.model_name, object_id=pk, machine_id=machine.pk)
+            for pk in pks
+        )
+        # update() не трогает auto_now: новый владелец должен увидеть записи в ленте
+        model.objects.filter(pk__in=pks).update(updated_at=now)
+    DeletedRecord.objects.bulk_create(records)
+
+
+def tombstones(model_name, user):
+    """
+    Надгробия model_name в области видимости пользователя.
+    """
+    records = DeletedRecord.objects.filter(model_name=model_name)
+    if not user.is_authenticated or user.role not in ('manager', 'client', 'service'):
+        return records.none()
+    if user.role == 'manager':
+        return records
+    owner = 'client_user' if user.role == 'client' else 'service_user'
+    if model_name == 'machine':
+        return records.filter(**{f'{owner}_id': user.pk})
+    machines = Machine.objects.filter(**{owner: user}).values('pk')
+    deleted_machines = DeletedRecord.objects.filter(
+        model_name='machine', **{f'{owner}_id': user.pk}).values('object_id')
+    return records.filter(Q(machine_id__in=machines) | Q(machine_id__in=deleted_machines))
+
+
+def encode_position(position):
+    stamp, pk = position
+    return [stamp.isoformat(), pk]
+
+
+def decode_position(value):
+    stamp, pk = value
+    stamp = parse_datetime(stamp)
+    if stamp is None or not (pk is None or isinstance(pk, int)):
+        raise ValueError(value)
+    return stamp, pk
+
+
+def encode_cursor(changed, deleted):
+    raw = json.dumps({'u': encode_position(changed), 'd': encode_position(deleted)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """
+    Позиции (изменения, удаления) из курсора или метки времени ISO 8601;
+    None — синхронизация с начала.
+    """
+    if not value:
+        return None, None
+    try:
+        # «+» часового пояса в строке запроса без кодирования превращается в пробел
+        stamp = parse_datetime(value.replace(' ', '+'))
+        if stamp is not None:
+            if timezone.is_naive(stamp):
+                stamp = timezone.make_aware(stamp)
+            return (stamp, None), (stamp, None)
+        raw = json.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+        return decode_position(raw['u']), decode_position(raw['d'])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValidationError({'since': 'Ожидается курсор из поля next или дата и время ISO 8601.'})
+
+
+def after(queryset, field, position):
+    """
+    Строки после позиции (метка, id); id None — после всех строк с этой меткой.
+    Условие «>= метки» позволяет начать просмотр индекса с неё.
+    """
+    if position is None:
+        return queryset
+    stamp, pk = position
+    if pk is None:
+        return queryset.filter(**{f'{field}__gt': stamp})
+    return queryset.filter(**{f'{field}__gte': stamp}).exclude(**{field: stamp, 'pk__lte': pk})
+
+
+def page(queryset, field, position, upper, limit):
+    """
+    (строки, следующая позиция, есть ли ещё) по возрастанию (field, id) до upper.
+    """
+    rows = list(after(queryset, field, position).filter(**{f'{field}__lte': upper})
+                .order_by(field, 'pk')[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if more:
+        return rows, (getattr(rows[-1], field), rows[-1].pk), True
+    if position is not None and position[0] >= upper:
+        return rows, position, False
+    return rows, (upper, None), False
+
+
+class ChangesFeedMixin:
+    """
+    Действие changes вьюсета: GET /api/<ресурс>/changes/?since=<курсор>&limit=500.
+    Область видимости — та же, что у списка (get_queryset); фильтры и сортировка
+    списка не применяются. Поддерживается ?expand= и ?fields=.
+    """
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', SYNC_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'limit': 'Ожидается целое число.'})
+        limit = max(1, min(limit, SYNC_MAX_PAGE_SIZE))
+        changed_position, deleted_position = decode_cursor(request.query_params.get('since'))
+        now = timezone.now()
+        if deleted_position is not None and deleted_position[0] < now - retention():
+            return Response({'error': 'Курсор старше срока хранения удалений, '
+                                      'нужна полная синхронизация (без since).'}, status=410)
+        upper = now - lag()
+
+        queryset = self.get_queryset()
+        expand = self.get_expand() if hasattr(self, 'get_expand') else ()
+        joins = [name for name in expand if name in getattr(self.get_serializer_class().Meta, 'expand_related', ())]
+        if joins:
+            queryset = queryset.select_related(*joins)
+        changed, changed_position, changed_more = page(
+            queryset, 'updated_at', changed_position, upper, limit)
+        deleted, deleted_position, deleted_more = page(
+            tombstones(queryset.model._meta.model_name, request.user), 'deleted_at',
+            deleted_position, upper, limit)
+        # Надгробие смены владельца не касается тех, кому запись по-прежнему видна
+        visible = set(queryset.filter(pk__in=[record.object_id for record in deleted])
+                      .values_list('pk', flat=True))
+        return Response({
+            'results': self.get_serializer(changed, many=True).data,
+            'deleted': [{'id': record.object_id, 'deleted_at': record.deleted_at}
+                        for record in deleted if record.object_id not in visible],
+            'next': encode_cursor(changed_position, deleted_position),
+            'has_more': changed_more or deleted_more,
+        })
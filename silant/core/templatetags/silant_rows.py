@@ -0,0 +1,14 @@
+from django import template
+
+from core import row_cache
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cached_rows(context, template_name, objects, name):
+    """
+    Строки таблицы из кэша строк (core/row_cache.py):
+    {% cached_rows "core/machine/machine_row.html" machines "machine" %}
+    """
+    return row_cache.render_rows(context, template_name, objects, name)
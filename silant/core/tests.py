@@ -1,3 +1,1769 @@
-from django.test import TestCase
+import csv
+import datetime
+import json
+import os
+import pstats
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+import tablib
+from asgiref.sync import sync_to_async
+from rest_framework.renderers import JSONRenderer
+
+from django.contrib.admin import site
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import analytics, api_schema, directory_cache, metrics, profiling, reliability, row_cache, search
+from .admin import DirectoryWidget
+from .bulk_import import BulkImportError, import_file
+from .forms import MachineForm, MaintenanceForm, ClaimForm
+from .stemmer import stem
+from .models import User, Machine, Maintenance, Claim, Directory, DeletedRecord, ReliabilitySummary, RequestProfile
+from .views import MachineViewSet, MaintenanceViewSet
+
+
+def make_directory(entity_name, name):
+    return Directory.objects.create(entity_name=entity_name, name=name)
+
+
+class SilantTestCase(TestCase):
+    """
+    Общие справочники, пользователи и фабрики записей для тестов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.machine_model = make_directory('Модель техники', 'ПД1,5')
+        cls.engine_model = make_directory('Модель двигателя', 'Kubota D1803')
+        cls.transmission_model = make_directory('Модель трансмиссии', '10VB-00106')
+        cls.drive_axle_model = make_directory('Модель ведущего моста', '20VA-00101')
+        cls.steer_axle_model = make_directory('Модель управляемого моста', 'VS20-00001')
+        cls.maintenance_type = make_directory('Вид ТО', 'ТО-1')
+        cls.failed_unit = make_directory('Узел отказа', 'Двигатель')
+        cls.recovery_method = make_directory('Способ восстановления', 'Ремонт узла')
+        cls.service_company = make_directory('Сервисная компания', 'ООО Промышленная техника')
+
+        cls.manager = User.objects.create_user('manager', password='pass', role='manager')
+        cls.client_user = User.objects.create_user('client', password='pass', role='client')
+        cls.service_user = User.objects.create_user('service', password='pass', role='service')
+
+    def setUp(self):
+        # Откат транзакции теста не посылает сигналов, кэши сбрасываются явно
+        cache.clear()
+        directory_cache.invalidate()
+
+    @classmethod
+    def make_machine(cls, serial_number, **kwargs):
+        values = {
+            'serial_number': serial_number,
+            'model': cls.machine_model,
+            'engine_model': cls.engine_model,
+            'engine_serial': f'E-{serial_number}',
+            'transmission_model': cls.transmission_model,
+            'transmission_serial': f'T-{serial_number}',
+            'drive_axle_model': cls.drive_axle_model,
+            'drive_axle_serial': f'D-{serial_number}',
+            'steer_axle_model': cls.steer_axle_model,
+            'steer_axle_serial': f'S-{serial_number}',
+            'shipment_date': datetime.date(2024, 1, 1),
+            'client': 'ИП Трудников С.В.',
+            'consignee': 'ИП Трудников С.В.',
+            'delivery_address': 'г. Чебоксары',
+            'equipment': 'Стандарт',
+            'client_user': cls.client_user,
+            'service_user': cls.service_user,
+        }
+        values.update(kwargs)
+        return Machine.objects.create(**values)
+
+    @classmethod
+    def make_maintenance(cls, machine, **kwargs):
+        values = {
+            'machine': machine,
+            'maintenance_type': cls.maintenance_type,
+            'date': datetime.date(2024, 3, 1),
+            'operating_time': 100,
+            'order_number': '#2024-1',
+            'order_date': datetime.date(2024, 2, 28),
+            'service_company': cls.service_company,
+        }
+        values.update(kwargs)
+        return Maintenance.objects.create(**values)
+
+    @classmethod
+    def make_claim(cls, machine, **kwargs):
+        values = {
+            'machine': machine,
+            'failure_date': datetime.date(2024, 4, 1),
+            'operating_time': 150,
+            'failed_unit': cls.failed_unit,
+            'failure_description': 'Течь гидравлики',
+            'recovery_method': cls.recovery_method,
+            'used_parts': 'Шланг',
+            'recovery_date': datetime.date(2024, 4, 3),
+            'downtime': 2,
+            'service_company': cls.service_company,
+        }
+        values.update(kwargs)
+        return Claim.objects.create(**values)
+
+    def count_queries(self, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+
+class ListingQueryCountTests(SilantTestCase):
+    """
+    Количество запросов на табличных страницах не зависит от числа строк.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.manager)
+        self.machine = self.make_machine('0001')
+        self.make_maintenance(self.machine)
+        self.make_claim(self.machine)
+
+    def add_rows(self, count):
+        for i in range(count):
+            machine = self.make_machine(f'1{i:03d}')
+            self.make_maintenance(self.machine, order_number=f'#M-{i}')
+            self.make_claim(self.machine, operating_time=200 + i)
+            self.make_maintenance(machine)
+
+    def assertConstantQueries(self, url, data=None):
+        few = self.count_queries(url, data)
+        self.add_rows(10)
+        many = self.count_queries(url, data)
+        self.assertEqual(few, many)
+
+    def test_dashboard_machines_tab(self):
+        self.assertConstantQueries(reverse('dashboard'), {'tab': 'info'})
+
+    def test_dashboard_maintenance_tab(self):
+        self.assertConstantQueries(reverse('dashboard'), {'tab': 'to', 'machine_id': self.machine.pk})
+
+    def test_dashboard_claims_tab(self):
+        self.assertConstantQueries(reverse('dashboard'), {'tab': 'claims', 'machine_id': self.machine.pk})
+
+    def test_machine_detail(self):
+        self.assertConstantQueries(reverse('machine_detail', args=[self.machine.pk]))
+
+    def test_api_machines(self):
+        self.assertConstantQueries('/api/machines/')
+
+    def test_api_maintenances(self):
+        self.assertConstantQueries('/api/maintenances/')
+
+    def test_api_claims(self):
+        self.assertConstantQueries('/api/claims/')
+
+
+class PaginationTests(SilantTestCase):
+    """
+    Постраничный вывод dashboard и keyset-пагинация API.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Повторяющиеся даты и пустые модели проверяют дозаполнение порядка по id
+        for i in range(12):
+            cls.make_machine(
+                f'P{i:03d}',
+                shipment_date=datetime.date(2024, 1, 1 + i % 4),
+                model=cls.machine_model if i % 3 else None,
+            )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.manager)
+
+    def walk(self, url, data):
+        ids, response = [], self.client.get(url, data)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def test_dashboard_pages(self):
+        response = self.client.get(reverse('dashboard'), {'tab': 'info', 'page': 1})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 12)
+        self.assertEqual(len(page_obj.object_list), 12)
+
+    def test_dashboard_page_out_of_range(self):
+        response = self.client.get(reverse('dashboard'), {'tab': 'info', 'page': 99})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_api_walks_every_row_once_in_order(self):
+        for ordering in ('-shipment_date', 'shipment_date', 'model', '-model'):
+            with self.subTest(ordering=ordering):
+                ids, _ = self.walk('/api/machines/', {'page_size': 5, 'ordering': ordering})
+                field = ordering.lstrip('-') + ('_id' if 'model' in ordering else '')
+                expected = sorted(
+                    Machine.objects.values_list(field, 'id'),
+                    key=lambda row: (row[0] is not None, row[0] or 0, row[1]),
+                    reverse=ordering.startswith('-'),
+                )
+                self.assertEqual(ids, [pk for _, pk in expected])
+
+    def test_api_previous_link(self):
+        first = self.client.get('/api/machines/', {'page_size': 5})
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [row['id'] for row in back.data['results']],
+            [row['id'] for row in first.data['results']],
+        )
+
+    def test_api_deep_page_uses_no_offset(self):
+        _, response = self.walk('/api/machines/', {'page_size': 5})
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(response.wsgi_request.get_full_path())
+        self.assertFalse(any('OFFSET' in query['sql'] for query in context.captured_queries))
+
+    def test_api_invalid_cursor(self):
+        response = self.client.get('/api/machines/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ExplainCommandTests(TestCase):
+    def test_plans_use_composite_indexes_and_roll_back(self):
+        out = StringIO()
+        call_command('explain_silant', machines=20, stdout=out)
+        output = out.getvalue()
+        self.assertEqual(output.count('-- с индексами:'), 6)
+        if connection.vendor == 'sqlite':
+            # PostgreSQL на 20 строках вправе предпочесть последовательное чтение
+            for index in ('machine_client_shipment_idx', 'maintenance_machine_date_idx', 'directory_entity_name_idx'):
+                self.assertIn(index, output)
+        self.assertFalse(Machine.objects.exists())
+        with connection.cursor() as cursor:
+            names = [index['columns'] for index in connection.introspection.get_constraints(cursor, 'core_machine').values()]
+        self.assertIn(['client_user_id', 'shipment_date', 'id'], names)
+
+
+class SeedAndBenchCommandTests(TestCase):
+    def test_seed_creates_requested_volume(self):
+        call_command('seed_silant', machines=30, maintenances_per_machine=3, claims_per_machine=2,
+                     clients=4, services=2, batch_size=7, stdout=StringIO())
+        self.assertEqual(Machine.objects.count(), 30)
+        self.assertEqual(Maintenance.objects.count(), 90)
+        self.assertEqual(Claim.objects.count(), 60)
+        self.assertEqual(User.objects.filter(role='client').count(), 4)
+        # Сервисная компания ТО совпадает с организацией, обслуживающей машину
+        maintenance = Maintenance.objects.select_related('machine__service_user', 'service_company').first()
+        self.assertEqual(maintenance.service_company.name, maintenance.machine.service_user.get_full_name())
+
+        call_command('seed_silant', machines=5, maintenances_per_machine=0, claims_per_machine=0,
+                     clients=4, services=2, stdout=StringIO())
+        self.assertEqual(Machine.objects.count(), 35)
+        self.assertEqual(User.objects.filter(role='client').count(), 4)
+
+    def test_bench_reports_every_endpoint(self):
+        call_command('seed_silant', machines=5, clients=1, services=1, stdout=StringIO())
+        User.objects.create_user('manager', password='pass', role='manager')
+        out = StringIO()
+        call_command('bench_silant', iterations=2, stdout=out)
+        report = json.loads(out.getvalue())
+        results = report['endpoints']['results']
+        self.assertEqual(report['rows']['machines'], 5)
+        self.assertIn('api_claims_detail', results)
+        for name, result in results.items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(result['status'], 200)
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+                self.assertIsInstance(result['queries'], int)
+                self.assertLessEqual(result['warm']['queries'], result['queries'])
+
+    def test_bench_export_suite(self):
+        call_command('seed_silant', machines=8, maintenances_per_machine=1, claims_per_machine=1,
+                     clients=1, services=1, stdout=StringIO())
+        out = StringIO()
+        call_command('bench_silant', iterations=1, suite=['export'], stdout=out)
+        results = json.loads(out.getvalue())['export']['results']
+        self.assertEqual([run['rows'] for run in results['machines_csv']], [2, 4, 8])
+        self.assertGreater(results['claims_xlsx'][-1]['bytes'], 0)
+
+    def test_bench_serialization_suite(self):
+        call_command('seed_silant', machines=12, clients=1, services=1, stdout=StringIO())
+        out = StringIO()
+        call_command('bench_silant', iterations=1, suite=['serialization'], stdout=out)
+        results = json.loads(out.getvalue())['serialization']['results']
+        self.assertEqual([run['rows'] for run in results], [12])
+        self.assertTrue(results[0]['identical'])
+
+    def test_bench_reliability_suite(self):
+        call_command('seed_silant', machines=12, clients=1, services=1, stdout=StringIO())
+        out = StringIO()
+        call_command('bench_silant', iterations=1, suite=['reliability'], stdout=out)
+        results = json.loads(out.getvalue())['reliability']
+        self.assertTrue(results['identical'])
+        self.assertGreater(results['claims'], 0)
+
+
+class DirectoryCacheTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        directory_cache.snapshot()
+
+    def directory_queries(self, func):
+        with CaptureQueriesContext(connection) as context:
+            func()
+        return [q['sql'] for q in context.captured_queries if 'core_directory' in q['sql']]
+
+    def test_forms_render_without_directory_queries(self):
+        self.service_user.first_name = self.service_company.name
+        machine = self.make_machine('C001')
+        for form in (MachineForm(), MaintenanceForm(user=self.service_user), ClaimForm(user=self.service_user),
+                     ClaimForm(user=self.client_user, initial={'machine': machine})):
+            with self.subTest(form=type(form).__name__):
+                self.assertEqual(self.directory_queries(form.as_p), [])
+        form = MaintenanceForm(user=self.service_user)
+        self.assertEqual(form.fields['service_company'].initial, self.service_company)
+        self.assertTrue(form.fields['service_company'].disabled)
+
+    def test_form_validates_against_cache(self):
+        data = {
+            'machine': self.make_machine('C002').pk, 'maintenance_type': self.maintenance_type.pk,
+            'date': '2024-03-01', 'operating_time': 10, 'order_number': '1', 'order_date': '2024-03-01',
+            'service_company': self.service_company.pk,
+        }
+        self.assertTrue(MaintenanceForm(data).is_valid())
+        # Элемент чужого справочника не принимается
+        form = MaintenanceForm({**data, 'maintenance_type': self.failed_unit.pk})
+        self.assertFalse(form.is_valid())
+        self.assertIn('maintenance_type', form.errors)
+
+    def test_save_and_delete_invalidate(self):
+        version = directory_cache.version()
+        item = make_directory('Вид ТО', 'ТО-2')
+        self.assertNotEqual(directory_cache.version(), version)
+        self.assertEqual(directory_cache.lookup('Вид ТО', 'ТО-2'), item)
+        item.name = 'ТО-3'
+        item.save()
+        self.assertIsNone(directory_cache.lookup('Вид ТО', 'ТО-2'))
+        self.assertEqual(directory_cache.name_to_id('Вид ТО')['ТО-3'], item.pk)
+        item.delete()
+        self.assertNotIn(item, directory_cache.entries('Вид ТО'))
+
+    @override_settings(SHARED_CACHE=False, DIRECTORY_CACHE_CHECK_INTERVAL=0)
+    def test_locmem_sees_writes_of_other_processes(self):
+        # update() не вызывает сигналов — как запись, сделанная другим процессом
+        directory_cache.snapshot()
+        Directory.objects.filter(pk=self.failed_unit.pk).update(name='Мост', updated_at=timezone.now())
+        self.assertEqual(directory_cache.get(self.failed_unit.pk).name, 'Мост')
+        Directory.objects.filter(pk=self.failed_unit.pk).delete()
+        self.assertIsNone(directory_cache.get(self.failed_unit.pk))
+
+    def test_str_and_import_widget_use_cache(self):
+        machine = Machine.objects.get(pk=self.make_machine('C003').pk)
+        self.assertEqual(self.directory_queries(lambda: str(machine)), [])
+        self.assertEqual(str(machine), f'{self.machine_model} (C003)')
+        widget = DirectoryWidget('Узел отказа')
+        self.assertEqual(self.directory_queries(lambda: widget.clean('Двигатель')), [])
+        self.assertEqual(widget.clean('Двигатель'), self.failed_unit)
+        with self.assertRaises(ValueError):
+            widget.clean('ПД1,5')
+
+
+class ConcurrencyBenchTests(TransactionTestCase):
+    # Потоки нагрузочного замера видят только зафиксированные данные
+
+    def test_bench_concurrency_suite(self):
+        call_command('seed_silant', machines=6, maintenances_per_machine=1, claims_per_machine=1,
+                     clients=1, services=1, stdout=StringIO())
+        User.objects.create_user('manager', password='pass', role='manager')
+        out = StringIO()
+        call_command('bench_silant', iterations=2, suite=['concurrency'], concurrency=4, workers=2, stdout=out)
+        results = json.loads(out.getvalue())['concurrency']
+        self.assertIn('api_machines_detail', results['urls'])
+        for deployment in ('wsgi', 'asgi'):
+            with self.subTest(deployment=deployment):
+                self.assertEqual(results[deployment]['statuses'], {'200': results[deployment]['requests']})
+                self.assertGreater(results[deployment]['throughput_rps'], 0)
+
+
+class BulkWriteBenchTests(TestCase):
+    def test_bench_bulk_write_suite(self):
+        call_command('seed_silant', machines=4, clients=1, services=1, stdout=StringIO())
+        User.objects.create_user('manager', password='pass', role='manager')
+        before = Maintenance.objects.count()
+        out = StringIO()
+        with mock.patch('core.benchmarks.BULK_WRITE_SIZES', (3,)):
+            call_command('bench_silant', iterations=1, suite=['bulk_write'], stdout=out)
+        results = json.loads(out.getvalue())['bulk_write']['results']
+        self.assertEqual(results[0]['statuses'], {'single': [201], 'bulk': [201]})
+        self.assertLess(results[0]['bulk']['queries'], results[0]['single']['queries'])
+        # Замер откатывается
+        self.assertEqual(Maintenance.objects.count(), before)
+
+
+class PublicLookupTests(SilantTestCase):
+    url = '/api/public_machine_search/'
+
+    def setUp(self):
+        super().setUp()
+        self.machine = self.make_machine('PUB-1')
+
+    def test_single_query_then_cached(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, {'serial_number': 'PUB-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'model': 'ПД1,5', 'serial_number': 'PUB-1',
+            'engine_model': 'Kubota D1803', 'engine_serial': 'E-PUB-1',
+            'transmission_model': '10VB-00106', 'transmission_serial': 'T-PUB-1',
+            'drive_axle_model': '20VA-00101', 'drive_axle_serial': 'D-PUB-1',
+            'steer_axle_model': 'VS20-00001', 'steer_axle_serial': 'S-PUB-1',
+        })
+        machine_queries = [q for q in context.captured_queries if 'core_machine' in q['sql']]
+        self.assertEqual(len(machine_queries), 1)
+        self.assertEqual(self.count_queries(self.url, {'serial_number': 'PUB-1'}), 0)
+
+    def test_not_found_is_cached_until_machine_created(self):
+        self.assertEqual(self.client.get(self.url, {'serial_number': 'PUB-2'}).status_code, 404)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(self.url, {'serial_number': 'PUB-2'}).status_code, 404)
+        self.assertEqual(len(context.captured_queries), 0)
+        self.make_machine('PUB-2')
+        self.assertEqual(self.client.get(self.url, {'serial_number': 'PUB-2'}).status_code, 200)
+
+    def test_save_and_rename_invalidate(self):
+        self.client.get(self.url, {'serial_number': 'PUB-1'})
+        self.machine.engine_serial = 'E-NEW'
+        self.machine.save()
+        self.assertEqual(self.client.get(self.url, {'serial_number': 'PUB-1'}).json()['engine_serial'], 'E-NEW')
+        self.machine.serial_number = 'PUB-1A'
+        self.machine.save()
+        self.assertEqual(self.client.get(self.url, {'serial_number': 'PUB-1'}).status_code, 404)
+        self.machine.delete()
+        self.assertEqual(self.client.get(self.url, {'serial_number': 'PUB-1A'}).status_code, 404)
+
+    def test_public_page_uses_lookup(self):
+        response = self.client.get(reverse('public_search_page'), {'serial_number': 'PUB-1'})
+        self.assertEqual(response.context['machine_fields']['engine_model'], 'Kubota D1803')
+        response = self.client.get(reverse('public_search_page'), {'serial_number': 'nope'})
+        self.assertIsNone(response.context['machine_fields'])
+        self.assertTrue(response.context['search'])
+
+    def test_batch(self):
+        self.make_machine('PUB-3')
+        self.client.get(self.url, {'serial_number': 'PUB-1'})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.url + 'batch/', {'serial_numbers': ['PUB-1', 'PUB-3', 'nope', 'PUB-3']},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json()['found']), ['PUB-1', 'PUB-3'])
+        self.assertEqual(response.json()['not_found'], ['nope'])
+        self.assertEqual(len(context.captured_queries), 1)
+        response = self.client.post(self.url + 'batch/', {'serial_numbers': 'PUB-1'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncViewTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.machine = self.make_machine('ASY-1')
+        self.maintenance = self.make_maintenance(self.machine)
+        self.client.force_login(self.manager)
+
+    async def test_public_search(self):
+        url = '/api/public_machine_search/'
+        response = await self.async_client.get(url, {'serial_number': 'ASY-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['engine_serial'], 'E-ASY-1')
+        response = await self.async_client.get(url, {'serial_number': 'nope'})
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
+        self.assertEqual((await self.async_client.get(url)).status_code, 400)
+        self.assertEqual((await self.async_client.post(url)).status_code, 405)
+
+        response = await self.async_client.get(reverse('public_search_page'), {'serial_number': 'ASY-1'})
+        self.assertEqual(response.context['machine_fields']['engine_serial'], 'E-ASY-1')
+
+    async def test_public_page_redirects_authenticated(self):
+        await self.async_client.aforce_login(self.manager)
+        response = await self.async_client.get(reverse('public_search_page'))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=300)
+    async def test_reads_match_sync_viewset(self):
+        await self.async_client.aforce_login(self.manager)
+        urls = [
+            f'/api/machines/{self.machine.pk}/',
+            f'/api/machines/{self.machine.pk}/?expand=model&fields=serial_number,model',
+            f'/api/maintenances/{self.maintenance.pk}/?expand=machine',
+            '/api/machines/',
+        ]
+        for url in urls:
+            expected = await sync_to_async(self.client.get)(url)
+            # Карточка и закэшированный список не вызывают методы вьюсета
+            with mock.patch.object(MachineViewSet, 'retrieve', side_effect=AssertionError), \
+                    mock.patch.object(MachineViewSet, 'list', side_effect=AssertionError), \
+                    mock.patch.object(MaintenanceViewSet, 'retrieve', side_effect=AssertionError):
+                response = await self.async_client.get(url)
+            with self.subTest(url=url):
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+        etag = response['ETag']
+        response = await self.async_client.get('/api/machines/', headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    async def test_list_read_by_async_orm_without_cache(self):
+        await sync_to_async(self.make_machine)('ASY-2')
+        await self.async_client.aforce_login(self.manager)
+        first = (await sync_to_async(self.client.get)('/api/machines/', {'page_size': 1})).json()
+        urls = [
+            '/api/machines/?page_size=1',
+            first['next'].replace('http://testserver', ''),
+            '/api/machines/?ordering=-serial_number&expand=model&fields=id,serial_number,model',
+            '/api/maintenances/?expand=machine',
+            '/api/machines/?search=ASY-2',
+        ]
+        for url in urls:
+            expected = await sync_to_async(self.client.get)(url)
+            with mock.patch.object(MachineViewSet, 'list', side_effect=AssertionError), \
+                    mock.patch.object(MaintenanceViewSet, 'list', side_effect=AssertionError):
+                response = await self.async_client.get(url)
+            with self.subTest(url=url):
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response.get('ETag'), expected.get('ETag'))
+        response = await self.async_client.get(urls[0], headers={'if-none-match': expected['ETag']})
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.get(urls[-1], headers={'if-none-match': expected['ETag']})
+        self.assertEqual(response.status_code, 304)
+        # Фильтры django-filter обрабатывает синхронный вьюсет
+        response = await self.async_client.get('/api/machines/', {'serial_number': 'ASY-2'})
+        self.assertEqual([row['serial_number'] for row in response.json()['results']], ['ASY-2'])
+
+    async def test_falls_back_to_sync_viewset(self):
+        response = await self.async_client.get('/api/machines/')
+        self.assertEqual(response.status_code, 403)
+        await self.async_client.aforce_login(self.manager)
+        for url in (f'/api/machines/{self.machine.pk}/?serial_number=nope', '/api/machines/0/',
+                    '/api/machines/abc/'):
+            with self.subTest(url=url):
+                self.assertEqual((await self.async_client.get(url)).status_code, 404)
+        response = await self.async_client.get(f'/api/machines/{self.machine.pk}/?format=api')
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        response = await self.async_client.post('/api/machines/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_client_sees_only_own_machines(self):
+        other = await sync_to_async(self.make_machine)('ASY-2', client_user=None)
+        await self.async_client.aforce_login(self.client_user)
+        self.assertEqual((await self.async_client.get(f'/api/machines/{self.machine.pk}/')).status_code, 200)
+        self.assertEqual((await self.async_client.get(f'/api/machines/{other.pk}/')).status_code, 404)
+
+
+class BulkWriteTests(SilantTestCase):
+    url = '/api/maintenances/bulk/'
+
+    def setUp(self):
+        super().setUp()
+        self.machine = self.make_machine('BLK-1')
+        self.other = self.make_machine('BLK-2', service_user=None, client_user=None)
+
+    def maintenance_item(self, machine, **kwargs):
+        values = {
+            'machine': machine.pk, 'maintenance_type': self.maintenance_type.pk, 'date': '2024-05-01',
+            'operating_time': 300, 'order_number': '#B-1', 'order_date': '2024-04-30',
+            'service_company': self.service_company.pk,
+        }
+        values.update(kwargs)
+        return values
+
+    def post(self, url, items, method='post'):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, items, content_type='application/json')
+        return response, len(context.captured_queries)
+
+    def test_create_in_constant_queries(self):
+        self.client.force_login(self.manager)
+        _, few = self.post(self.url, [self.maintenance_item(self.machine)])
+        items = [self.maintenance_item(machine, operating_time=400 + index)
+                 for index, machine in enumerate([self.machine, self.other] * 10)]
+        response, many = self.post(self.url, items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 20)
+        self.assertEqual(many, few)
+        self.assertEqual(Maintenance.objects.count(), 21)
+        self.machine.refresh_from_db()
+        self.assertEqual(self.machine.operating_time, 418)
+        self.assertEqual(self.machine.last_maintenance_date, datetime.date(2024, 5, 1))
+        self.assertEqual(len(self.client.get('/api/maintenances/', {'search': 'BLK-2'}).json()['results']), 10)
+
+    def test_errors_per_item_write_nothing(self):
+        self.client.force_login(self.manager)
+        items = [
+            self.maintenance_item(self.machine),
+            self.maintenance_item(self.machine, maintenance_type=self.failed_unit.pk),
+            {**self.maintenance_item(self.machine, date=None), 'machine': 0},
+        ]
+        response, _ = self.post(self.url, items)
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertEqual(list(errors[1]), ['maintenance_type'])
+        self.assertEqual(sorted(errors[2]), ['date', 'machine'])
+        self.assertFalse(Maintenance.objects.exists())
+        self.assertEqual(self.post(self.url, [])[0].status_code, 400)
+        self.assertEqual(self.post(self.url, {'machine': self.machine.pk})[0].status_code, 400)
+
+    def test_role_rules(self):
+        own = make_directory('Сервисная компания', 'service')
+        self.client.force_login(self.service_user)
+        response, _ = self.post(self.url, [self.maintenance_item(self.machine)])
+        self.assertEqual(response.status_code, 201)
+        # Организация подставляется по пользователю, как в форме
+        self.assertEqual(response.json()[0]['service_company'], own.pk)
+        response, _ = self.post(self.url, [self.maintenance_item(self.other)])
+        self.assertEqual(list(response.json()[0]), ['machine'])
+
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.post(self.url, [self.maintenance_item(self.machine)])[0].status_code, 201)
+        claim = self.make_claim(self.machine)
+        response, _ = self.post('/api/claims/bulk/', [{'id': claim.pk, 'downtime': 5}], method='patch')
+        self.assertEqual(response.status_code, 403)
+
+    def test_partial_update_keeps_summaries(self):
+        first, second = self.make_claim(self.machine), self.make_claim(self.machine, operating_time=250)
+        before = second.updated_at
+        self.client.force_login(self.manager)
+        response, _ = self.post('/api/claims/bulk/', [
+            {'id': first.pk, 'downtime': 10},
+            {'id': second.pk, 'machine': self.other.pk, 'failed_unit': None},
+        ], method='patch')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['downtime'] for row in response.json()], [10, 2])
+        second.refresh_from_db()
+        self.assertEqual(second.machine_id, self.other.pk)
+        self.assertIsNone(second.failed_unit_id)
+        # Лента изменений увидит запись
+        self.assertGreater(second.updated_at, before)
+        self.machine.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.machine.claims_count, self.machine.total_downtime), (1, 10))
+        self.assertEqual((self.other.claims_count, self.other.operating_time), (1, 250))
+
+        incremental = set(ReliabilitySummary.objects.values_list(
+            'dimension', 'key', 'parent', 'claims', 'downtime', 'operating_time', 'machines'))
+        analytics.rebuild()
+        rebuilt = set(ReliabilitySummary.objects.values_list(
+            'dimension', 'key', 'parent', 'claims', 'downtime', 'operating_time', 'machines'))
+        self.assertEqual({row for row in incremental if row[3]}, rebuilt)
+
+        response, _ = self.post('/api/claims/bulk/', [
+            {'id': first.pk, 'downtime': 1}, {'id': first.pk, 'downtime': 2}, {'id': 0},
+        ], method='patch')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([sorted(errors) for errors in response.json()], [[], ['id'], ['id']])
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=300)
+class ResponseCacheTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.machine = self.make_machine('RC-1')
+        self.other = self.make_machine('RC-2', client_user=None, service_user=None)
+
+    def core_queries(self, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        tables = ('core_machine', 'core_maintenance', 'core_claim')
+        return response, [q for q in context.captured_queries if any(table in q['sql'] for table in tables)]
+
+    def test_dashboard_cached_per_user_until_write(self):
+        self.client.force_login(self.manager)
+        first, _ = self.core_queries(reverse('dashboard'))
+        second, queries = self.core_queries(reverse('dashboard'))
+        self.assertEqual(queries, [])
+        self.assertEqual(first.content, second.content)
+
+        self.machine.consignee = 'ООО Новый грузополучатель'
+        self.machine.save()
+        response, queries = self.core_queries(reverse('dashboard'))
+        self.assertNotEqual(queries, [])
+        self.assertContains(response, 'ООО Новый грузополучатель')
+
+        self.client.force_login(self.client_user)
+        response, _ = self.core_queries(reverse('dashboard'))
+        self.assertContains(response, 'RC-1')
+        self.assertNotContains(response, 'RC-2')
+
+    def test_api_list_key_includes_filters_and_role(self):
+        self.client.force_login(self.manager)
+        self.core_queries('/api/machines/')
+        _, queries = self.core_queries('/api/machines/')
+        self.assertEqual(queries, [])
+        response, queries = self.core_queries('/api/machines/', {'ordering': 'shipment_date'})
+        self.assertNotEqual(queries, [])
+        response, _ = self.core_queries('/api/machines/', {'serial_number': 'RC-2'})
+        self.assertEqual([row['serial_number'] for row in response.data['results']], ['RC-2'])
+
+        self.client.force_login(self.client_user)
+        response, _ = self.core_queries('/api/machines/')
+        self.assertEqual([row['serial_number'] for row in response.data['results']], ['RC-1'])
+
+    def test_child_and_directory_writes_bump_generation(self):
+        self.client.force_login(self.manager)
+        self.core_queries('/api/claims/')
+        self.make_claim(self.machine)
+        response, _ = self.core_queries('/api/claims/')
+        self.assertEqual(len(response.data['results']), 1)
+        self.machine_model.name = 'ПД2,0'
+        self.machine_model.save()
+        _, queries = self.core_queries('/api/claims/')
+        self.assertNotEqual(queries, [])
+
+
+class BulkImportTests(SilantTestCase):
+    MACHINE_HEADERS = [
+        'Зав. № машины', 'Модель техники', 'Модель двигателя', 'Зав. № двигателя',
+        'Модель трансмиссии (производитель, артикул)', 'Зав. № трансмиссии',
+        'Модель ведущего моста', 'Зав. № ведущего моста', 'Модель управляемого моста',
+        'Зав. № управляемого моста', 'Дата отгрузки с завода', 'Покупатель',
+        'Грузополучатель (конечный потребитель)', 'Адрес поставки (эксплуатации)',
+        'Комплектация (доп. опции)', 'Сервисная компания',
+    ]
+
+    def machine_row(self, serial, model='ПД1,5', shipment_date='2024-02-01'):
+        return [serial, model, 'Kubota D1803', f'E-{serial}', '10VB-00106', f'T-{serial}',
+                '20VA-00101', f'D-{serial}', 'VS20-00001', f'S-{serial}', shipment_date,
+                'ИП Трудников С.В.', 'ИП Трудников С.В.', 'г. Чебоксары', 'Стандарт', '']
+
+    def write(self, headers, rows, extension='csv'):
+        dataset = tablib.Dataset(*rows, headers=headers)
+        fd, path = tempfile.mkstemp(suffix=f'.{extension}')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'wb') as f:
+            data = dataset.export(extension)
+            f.write(data.encode('utf-8') if isinstance(data, str) else data)
+        return path
+
+    def run_import(self, path, model, **options):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_silant', path, model=model, stdout=out, **options)
+        return out.getvalue()
+
+    def test_machines_created_then_updated_in_constant_queries(self):
+        rows = [self.machine_row(f'IMP-{i:03d}') for i in range(40)]
+        path = self.write(self.MACHINE_HEADERS, rows)
+        directory_cache.snapshot()
+        with CaptureQueriesContext(connection) as context:
+            output = self.run_import(path, 'machine', batch_size=15)
+        self.assertEqual(Machine.objects.filter(serial_number__startswith='IMP-').count(), 40)
+        self.assertEqual(output.count('пачка'), 3)
+        self.assertLess(len(context.captured_queries), 15)
+        machine = Machine.objects.get(serial_number='IMP-007')
+        self.assertEqual(machine.engine_model, self.engine_model)
+        self.assertEqual(machine.shipment_date, datetime.date(2024, 2, 1))
+
+        rows[7] = self.machine_row('IMP-007', shipment_date='2024-03-05')
+        self.run_import(self.write(self.MACHINE_HEADERS, rows, 'xlsx'), 'machine')
+        self.assertEqual(Machine.objects.filter(serial_number__startswith='IMP-').count(), 40)
+        updated = Machine.objects.get(serial_number='IMP-007')
+        self.assertEqual(updated.shipment_date, datetime.date(2024, 3, 5))
+        self.assertGreater(updated.updated_at, machine.updated_at)
+
+    def test_missing_directory_value_aborts_or_is_created(self):
+        path = self.write(self.MACHINE_HEADERS, [self.machine_row('IMP-A'), self.machine_row('IMP-B', model='ПД9,9')])
+        with self.assertRaises(BulkImportError) as raised:
+            import_file(path, 'machine')
+        self.assertEqual(raised.exception.errors[0][0], 3)
+        self.assertFalse(Machine.objects.filter(serial_number__startswith='IMP-').exists())
+
+        self.run_import(path, 'machine', create_missing=True)
+        self.assertEqual(Machine.objects.get(serial_number='IMP-B').model.name, 'ПД9,9')
+        self.assertEqual(directory_cache.lookup('Модель техники', 'ПД9,9').name, 'ПД9,9')
+
+    def test_maintenance_resolves_machines_and_invalidates_caches(self):
+        machine = self.make_machine('IMP-M')
+        self.assertEqual(self.client.get('/api/public_machine_search/', {'serial_number': 'IMP-X'}).status_code, 404)
+        headers = ['Зав. № машины', 'Вид ТО', 'Дата проведения ТО', 'Наработка, м/час', '№ заказ-наряда',
+                   'дата заказ-наряда', 'Организация, проводившая ТО']
+        rows = [['IMP-M', 'ТО-1', '2024-05-01', '120', '#1', '2024-04-30', 'ООО Промышленная техника'],
+                ['IMP-M', 'ТО-1', '2024-05-01', '150', '#1', '2024-04-30', 'ООО Промышленная техника']]
+        output = self.run_import(self.write(headers, rows), 'maintenance')
+        self.assertIn('создано 1', output)
+        maintenance = machine.maintenances.get()
+        self.assertEqual(maintenance.operating_time, 150)
+        self.assertEqual(maintenance.service_company, self.service_company)
+        # Импорт идёт без сигналов, сводные поля машины пересчитываются явно
+        machine.refresh_from_db()
+        self.assertEqual((machine.operating_time, machine.last_maintenance_date), (150, datetime.date(2024, 5, 1)))
+
+        rows = [['IMP-Z', 'ТО-1', '2024-05-01', '120', '#1', '2024-04-30', '']]
+        with self.assertRaisesMessage(CommandError, 'IMP-Z'):
+            call_command('import_silant', self.write(headers, rows), model='maintenance', stdout=StringIO())
+
+        self.run_import(self.write(self.MACHINE_HEADERS, [self.machine_row('IMP-X')]), 'machine')
+        self.assertEqual(self.client.get('/api/public_machine_search/', {'serial_number': 'IMP-X'}).status_code, 200)
+
+    def test_dry_run_rolls_back(self):
+        path = self.write(self.MACHINE_HEADERS, [self.machine_row('IMP-D', model='ПД7,7')])
+        output = self.run_import(path, 'machine', dry_run=True, create_missing=True)
+        self.assertIn('Проверено строк: 1', output)
+        self.assertFalse(Machine.objects.filter(serial_number='IMP-D').exists())
+        self.assertIsNone(directory_cache.lookup('Модель техники', 'ПД7,7'))
+
+
+    def test_admin_import_uses_bulk_importer(self):
+        admin_user = User.objects.create_superuser('admin', password='pass', role='manager')
+        self.client.force_login(admin_user)
+        url = reverse('admin:core_machine_import')
+        formats = [fmt().get_title() for fmt in site._registry[Machine].get_import_formats()]
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        def upload(rows):
+            with open(self.write(self.MACHINE_HEADERS, rows), 'rb') as f:
+                with self.captureOnCommitCallbacks(execute=True):
+                    return self.client.post(url, {'import_file': f, 'format': formats.index('csv')}, follow=True)
+
+        with mock.patch.object(Machine, 'save', side_effect=AssertionError):
+            response = upload([self.machine_row(f'ADM-{i}') for i in range(5)])
+        self.assertRedirects(response, reverse('admin:core_machine_changelist'))
+        self.assertContains(response, 'Импортировано строк: 5 (создано 5')
+        self.assertEqual(search.ranked(Machine.objects.all(), 'ADM-3')[0].serial_number, 'ADM-3')
+
+        response = upload([self.machine_row('ADM-9'), self.machine_row('ADM-10', model='ПД9,9')])
+        self.assertRedirects(response, url)
+        self.assertContains(response, 'Строка 3: в справочнике «Модель техники» нет значения «ПД9,9»')
+        self.assertFalse(Machine.objects.filter(serial_number='ADM-9').exists())
+
+
+class ExportTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.own = self.make_machine('EXP-1')
+        self.other = self.make_machine('EXP-2', client_user=None, service_user=None)
+        self.make_maintenance(self.own)
+        self.make_maintenance(self.other)
+
+    def export(self, url, data=None):
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_uses_resource_headers_and_role_scope(self):
+        self.client.force_login(self.client_user)
+        rows = list(csv.reader(StringIO(self.export('/api/machines/export/').decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:3], ['id', 'Модель техники', 'Модель двигателя'])
+        self.assertEqual([row[6] for row in rows[1:]], ['EXP-1'])
+        self.assertEqual(rows[1][1], 'ПД1,5')
+
+        self.client.force_login(self.manager)
+        with CaptureQueriesContext(connection) as context:
+            content = self.export('/api/maintenances/export/', {'machine__serial_number': 'EXP-2'})
+        rows = list(csv.reader(StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual(rows[0][1:3], ['Зав. № машины', 'Вид ТО'])
+        self.assertEqual([row[1:3] for row in rows[1:]], [['EXP-2', 'ТО-1']])
+        self.assertEqual(len([q for q in context.captured_queries if 'core_maintenance' in q['sql']]), 1)
+
+    def test_xlsx(self):
+        self.client.force_login(self.service_user)
+        content = self.export('/api/maintenances/export/', {'file_format': 'xlsx'})
+        sheet = openpyxl.load_workbook(BytesIO(content), read_only=True).active
+        rows = list(sheet.values)
+        self.assertEqual(rows[0][1], 'Зав. № машины')
+        self.assertEqual([row[1] for row in rows[1:]], ['EXP-1'])
+        self.assertEqual(self.client.get('/api/maintenances/export/', {'file_format': 'pdf'}).status_code, 400)
+
+
+class ExpandTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.manager)
+        self.machine = self.make_machine('EXD-1')
+        self.make_claim(self.machine)
+
+    def test_default_representation_has_ids(self):
+        response = self.client.get('/api/machines/')
+        row = response.data['results'][0]
+        self.assertEqual(row['model'], self.machine_model.pk)
+        self.assertEqual(row['engine_model'], self.engine_model.pk)
+
+    def test_expanded_names_with_bounded_queries(self):
+        directory_cache.snapshot()
+        url, data = '/api/claims/', {'expand': 'machine,failed_unit,recovery_method'}
+        few = self.count_queries(url, data)
+        for i in range(5):
+            self.make_claim(self.make_machine(f'EXD-{i + 2}'))
+        cache.clear()
+        self.assertEqual(self.count_queries(url, data), few)
+
+        row = self.client.get(url, data).data['results'][0]
+        self.assertEqual(row['machine']['serial_number'], 'EXD-6')
+        self.assertEqual(row['machine']['model'], {'id': self.machine_model.pk, 'name': 'ПД1,5'})
+        self.assertEqual(row['failed_unit'], {'id': self.failed_unit.pk, 'name': 'Двигатель'})
+        self.assertEqual(row['service_company'], self.service_company.pk)
+
+        row = self.client.get(f'/api/machines/{self.machine.pk}/', {'expand': 'model,engine_model'}).data
+        self.assertEqual(row['engine_model']['name'], 'Kubota D1803')
+        self.assertEqual(row['transmission_model'], self.transmission_model.pk)
+
+    def test_unknown_expand_is_rejected(self):
+        response = self.client.get('/api/machines/', {'expand': 'client_user'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('expand', response.json())
+
+
+class SparseFieldsTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.manager)
+        self.machine = self.make_machine('SPF-1', equipment='Кабина с отопителем')
+        self.make_claim(self.machine)
+
+    def select_sql(self, url, data, table):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        queries = [q['sql'] for q in context.captured_queries if q['sql'].startswith('SELECT')
+                   and f'FROM "{table}"' in q['sql'] and 'COUNT(' not in q['sql']]
+        self.assertEqual(len(queries), 1)
+        return response, queries[0].split(' FROM ')[0]
+
+    def test_machine_columns_pruned(self):
+        response, columns = self.select_sql(
+            '/api/machines/', {'fields': 'serial_number,model,shipment_date'}, 'core_machine')
+        self.assertEqual(response.data['results'], [
+            {'serial_number': 'SPF-1', 'model': self.machine_model.pk, 'shipment_date': '2024-01-01'},
+        ])
+        for column in ('serial_number', 'model_id', 'shipment_date'):
+            self.assertIn(f'"core_machine"."{column}"', columns)
+        for column in ('equipment', 'delivery_address', 'engine_serial'):
+            self.assertNotIn(column, columns)
+
+    def test_claim_columns_with_expand_and_detail(self):
+        response, columns = self.select_sql(
+            '/api/claims/', {'fields': 'id,machine,failure_date', 'expand': 'machine'}, 'core_claim')
+        self.assertEqual(response.data['results'][0]['machine']['serial_number'], 'SPF-1')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'machine', 'failure_date'})
+        self.assertNotIn('failure_description', columns)
+        self.assertNotIn('equipment', columns)
+
+        response = self.client.get(f'/api/machines/{self.machine.pk}/', {'fields': 'serial_number'})
+        self.assertEqual(response.data, {'serial_number': 'SPF-1'})
+
+    def test_expand_without_relation_in_fields(self):
+        # select_related раскрытой машины не должен упираться в отложенный внешний ключ
+        maintenance = self.make_maintenance(self.machine)
+        params = {'expand': 'machine', 'fields': 'date'}
+        response = self.client.get(f'/api/maintenances/{maintenance.pk}/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'date': '2024-03-01'})
+        response = self.client.get('/api/maintenances/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{'date': '2024-03-01'}])
+        response = self.client.get('/api/claims/', {'expand': 'machine', 'fields': 'failure_date'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_writes_and_unknown_fields(self):
+        self.assertEqual(self.client.get('/api/machines/', {'fields': 'secret'}).status_code, 400)
+        response = self.client.patch(f'/api/machines/{self.machine.pk}/?fields=serial_number',
+                                     {'equipment': 'Стандарт'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['equipment'], 'Стандарт')
+        response = self.client.get('/api/directories/', {'fields': 'name'})
+        self.assertEqual(set(response.data[0]), {'name'})
+        content = b''.join(self.client.get('/api/machines/export/', {'fields': 'serial_number'}).streaming_content)
+        self.assertIn('г. Чебоксары'.encode(), content)
+
+
+class FastSerializationTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.manager)
+        machine = self.make_machine('FST-1', equipment='Кавычки " и \\ и \u2028 разделитель')
+        self.make_machine('FST-2', model=None, client_user=None)
+        self.make_maintenance(machine, service_company=None)
+        self.make_claim(machine, used_parts='Подшипник')
+
+    def render(self, url, data, fast):
+        cache.clear()
+        with self.settings(FAST_LIST_SERIALIZATION=fast):
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_byte_for_byte_compatible(self):
+        cases = [
+            ('/api/machines/', {}),
+            ('/api/machines/', {'ordering': 'model', 'page_size': 1}),
+            ('/api/machines/', {'expand': 'model,engine_model', 'fields': 'id,model,engine_model,shipment_date'}),
+            ('/api/maintenances/', {'expand': 'machine,service_company'}),
+            ('/api/claims/', {'expand': 'machine,failed_unit'}),
+            ('/api/directories/', {}),
+        ]
+        for url, data in cases:
+            with self.subTest(url=url, data=data):
+                stock = self.render(url, data, fast=False)
+                fast = self.render(url, data, fast=True)
+                self.assertEqual(fast.content, stock.content)
+                self.assertEqual(fast.content, JSONRenderer().render(stock.data))
+
+    def test_cursor_from_values_rows(self):
+        response = self.render('/api/machines/', {'page_size': 1, 'fields': 'serial_number'}, fast=True)
+        second = self.client.get(response.data['next'])
+        self.assertEqual(len(second.data['results']), 1)
+        self.assertNotEqual(second.data['results'], response.data['results'])
+
+
+class ConditionalGetTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.machine = self.make_machine('ETG-1')
+        self.client.force_login(self.manager)
+
+    def get(self, url, etag=None, **extra):
+        if etag:
+            extra['HTTP_IF_NONE_MATCH'] = etag
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **extra)
+        rows = [q for q in context.captured_queries
+                if 'FROM "core_machine"' in q['sql'] and 'COUNT(' not in q['sql']]
+        return response, rows
+
+    def test_not_modified_until_write_or_delete(self):
+        response, _ = self.get('/api/machines/')
+        etag = response['ETag']
+        # Удаление и запись в ту же секунду не меняют Last-Modified, поэтому его нет
+        self.assertFalse(response.has_header('Last-Modified'))
+        response, rows = self.get('/api/machines/', etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(rows, [])
+        self.assertEqual(response['ETag'], etag)
+
+        self.machine.engine_serial = 'E-NEW'
+        self.machine.save()
+        response, _ = self.get('/api/machines/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        other = self.make_machine('ETG-2')
+        etag = self.get('/api/machines/')[0]['ETag']
+        other.delete()
+        self.assertEqual(self.get('/api/machines/', etag)[0].status_code, 200)
+
+    def test_if_modified_since_alone_is_not_trusted(self):
+        response, _ = self.get('/api/machines/')
+        self.make_machine('ETG-2').delete()
+        since = {'HTTP_IF_MODIFIED_SINCE': 'Fri, 01 Jan 2100 00:00:00 GMT'}
+        self.assertEqual(self.get('/api/machines/', **since)[0].status_code, 200)
+        self.assertEqual(self.client.get(reverse('dashboard'), **since).status_code, 200)
+
+    def test_without_response_cache_only_aggregate_runs(self):
+        with self.settings(RESPONSE_CACHE_TIMEOUT=0):
+            etag = self.get('/api/machines/')[0]['ETag']
+            response, rows = self.get('/api/machines/', etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(rows, [])
+
+    def test_etag_scoped_by_role_and_representation(self):
+        manager_etag = self.get('/api/machines/')[0]['ETag']
+        self.assertNotEqual(self.get('/api/machines/?fields=serial_number')[0]['ETag'], manager_etag)
+        self.client.force_login(self.client_user)
+        response, _ = self.get('/api/machines/', manager_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_expanded_list_tracks_directory(self):
+        self.make_claim(self.machine)
+        etag = self.get('/api/claims/?expand=failed_unit')[0]['ETag']
+        self.failed_unit.name = 'Двигатель внутреннего сгорания'
+        self.failed_unit.save()
+        response, _ = self.get('/api/claims/?expand=failed_unit', etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_dashboard(self):
+        response = self.client.get(reverse('dashboard'))
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('dashboard'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.make_maintenance(self.machine)
+        self.assertEqual(self.client.get(reverse('dashboard'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_updated_at_tracked(self):
+        before = self.machine.updated_at
+        self.machine.consignee = 'ООО Новый'
+        self.machine.save()
+        self.assertGreater(self.machine.updated_at, before)
+
+
+@override_settings(SYNC_CHANGES_LAG=0)
+class ChangesFeedTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.machine = self.make_machine('SYNC-1')
+        self.maintenance = self.make_maintenance(self.machine)
+        self.claim = self.make_claim(self.machine)
+        self.client.force_login(self.manager)
+
+    def changes(self, url, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def sync_all(self, url, since=None, **params):
+        ids, deleted = [], []
+        while True:
+            data = self.changes(url, since, **params)
+            ids += [row['id'] for row in data['results']]
+            deleted += [row['id'] for row in data['deleted']]
+            since = data['next']
+            if not data['has_more']:
+                return ids, deleted, since
+
+    def test_only_changes_since_cursor(self):
+        other = self.make_machine('SYNC-2')
+        ids, deleted, cursor = self.sync_all('/api/machines/changes/')
+        self.assertEqual(sorted(ids), [self.machine.pk, other.pk])
+        self.assertEqual(deleted, [])
+        self.assertEqual(self.sync_all('/api/machines/changes/', cursor)[:2], ([], []))
+
+        self.machine.consignee = 'ООО Новый'
+        self.machine.save()
+        other_pk = other.pk
+        other.delete()
+        data = self.changes('/api/machines/changes/', cursor)
+        self.assertEqual([row['consignee'] for row in data['results']], ['ООО Новый'])
+        self.assertEqual([row['id'] for row in data['deleted']], [other_pk])
+
+    def test_pages_follow_cursor(self):
+        for number in range(4):
+            self.make_maintenance(self.machine, order_number=f'#{number}')
+        ids, _, _ = self.sync_all('/api/maintenances/changes/', limit=2)
+        self.assertEqual(sorted(ids), sorted(Maintenance.objects.values_list('pk', flat=True)))
+
+    def test_cascade_tombstones_in_role_scope(self):
+        stranger = User.objects.create_user('stranger', password='pass', role='client')
+        foreign = self.make_machine('SYNC-F', client_user=stranger, service_user=None)
+        self.make_claim(foreign)
+        cursor = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        maintenance_pk, claim_pk = self.maintenance.pk, self.claim.pk
+        self.machine.delete()
+        foreign.delete()
+        self.assertEqual(DeletedRecord.objects.filter(model_name='claim').count(), 2)
+
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.sync_all('/api/maintenances/changes/', cursor)[1], [maintenance_pk])
+        self.assertEqual(self.sync_all('/api/claims/changes/', cursor)[1], [claim_pk])
+        self.client.force_login(self.service_user)
+        self.assertEqual(len(self.sync_all('/api/machines/changes/', cursor)[1]), 1)
+
+    def test_reassigned_machine_leaves_previous_owner_scope(self):
+        other = User.objects.create_user('other-client', password='pass', role='client')
+        cursor = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self.machine.client_user = other
+        self.machine.save()
+
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.sync_all('/api/machines/changes/', cursor)[:2], ([], [self.machine.pk]))
+        self.assertEqual(self.sync_all('/api/maintenances/changes/', cursor)[1], [self.maintenance.pk])
+        self.assertEqual(self.sync_all('/api/claims/changes/', cursor)[1], [self.claim.pk])
+        # Новый владелец получает машину вместе с её прежними ТО и рекламациями
+        self.client.force_login(other)
+        self.assertEqual(self.sync_all('/api/machines/changes/', cursor)[:2], ([self.machine.pk], []))
+        self.assertEqual(self.sync_all('/api/maintenances/changes/', cursor)[:2], ([self.maintenance.pk], []))
+        self.assertEqual(self.sync_all('/api/claims/changes/', cursor)[:2], ([self.claim.pk], []))
+        # Сервисная организация и менеджер машину по-прежнему видят
+        for user in (self.service_user, self.manager):
+            self.client.force_login(user)
+            self.assertEqual(self.sync_all('/api/machines/changes/', cursor)[1], [])
+            self.assertEqual(self.sync_all('/api/claims/changes/', cursor)[1], [])
+
+        self.machine.consignee = 'ООО Новый'
+        self.machine.save()
+        self.assertEqual(DeletedRecord.objects.filter(model_name='machine').count(), 1)
+
+    def test_reassignment_by_import_leaves_previous_owner_scope(self):
+        other = User.objects.create_user('other-client', password='pass', role='client')
+        cursor = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(tablib.Dataset(['SYNC-1', other.pk], headers=['Зав. № машины', 'client_user']).export('csv'))
+        self.assertEqual(import_file(path, 'machine')['updated'], 1)
+
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.sync_all('/api/machines/changes/', cursor)[1], [self.machine.pk])
+        self.assertEqual(self.sync_all('/api/claims/changes/', cursor)[1], [self.claim.pk])
+        self.client.force_login(other)
+        self.assertEqual(self.sync_all('/api/maintenances/changes/', cursor)[:2], ([self.maintenance.pk], []))
+        # Повторный импорт того же файла ничего не меняет
+        import_file(path, 'machine')
+        self.assertEqual(DeletedRecord.objects.filter(model_name='machine').count(), 1)
+
+    def test_recent_changes_held_back_by_lag(self):
+        with self.settings(SYNC_CHANGES_LAG=3600):
+            data = self.changes('/api/claims/changes/')
+        self.assertEqual(data['results'], [])
+        self.assertEqual(self.sync_all('/api/claims/changes/', data['next'])[0], [self.claim.pk])
+
+    def test_expand_and_fields(self):
+        data = self.changes('/api/claims/changes/', expand='machine', fields='id,machine')
+        self.assertEqual(data['results'], [{
+            'id': self.claim.pk,
+            'machine': {'id': self.machine.pk, 'serial_number': 'SYNC-1',
+                        'model': {'id': self.machine_model.pk, 'name': self.machine_model.name}},
+        }])
+
+    def test_bad_and_stale_cursor(self):
+        self.assertEqual(self.client.get('/api/machines/changes/', {'since': 'xyz'}).status_code, 400)
+        response = self.client.get('/api/machines/changes/', {'since': '2000-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, 410)
+
+    def test_prune_tombstones(self):
+        self.claim.delete()
+        DeletedRecord.objects.update(deleted_at=datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc))
+        call_command('prune_tombstones', stdout=StringIO())
+        self.assertFalse(DeletedRecord.objects.exists())
+
+
+class FullTextSearchTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.machine = self.make_machine('FTS-0017')
+        self.claim = self.make_claim(self.machine, failure_description='Течь гидравлики под кабиной')
+        self.other_claim = self.make_claim(self.machine, failure_description='Не запускается двигатель')
+        self.client.force_login(self.manager)
+
+    def ids(self, url, text):
+        response = self.client.get(url, {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_stemmer(self):
+        self.assertEqual(stem('гидравлика'), stem('гидравлики'))
+        self.assertEqual(stem('двигателей'), stem('двигатель'))
+
+    def test_word_forms_in_free_text(self):
+        self.assertEqual(self.ids('/api/claims/', 'гидравлика течь'), [self.claim.pk])
+        self.assertEqual(self.ids('/api/claims/', 'гидравлика насос'), [])
+        self.assertEqual(self.ids('/api/claims/', 'запускаться'), [self.other_claim.pk])
+
+    def test_serial_prefix_and_directory_names(self):
+        self.assertEqual(self.ids('/api/machines/', 'FTS-00'), [self.machine.pk])
+        self.assertEqual(self.ids('/api/machines/', 'Kubota'), [self.machine.pk])
+        maintenance = self.make_maintenance(self.machine)
+        self.assertEqual(self.ids('/api/maintenances/', 'ТО-1 fts-0017'), [maintenance.pk])
+
+    def test_index_follows_changes(self):
+        self.engine_model.name = 'Yanmar 4TNV'
+        self.engine_model.save()
+        self.assertEqual(self.ids('/api/machines/', 'Kubota'), [])
+        self.assertEqual(self.ids('/api/machines/', 'yanmar'), [self.machine.pk])
+
+        maintenance = self.make_maintenance(self.machine)
+        self.machine.serial_number = 'FTS-9999'
+        self.machine.save()
+        self.assertEqual(self.ids('/api/maintenances/', 'FTS-9999'), [maintenance.pk])
+
+        self.claim.delete()
+        self.assertEqual(search.ranked(Claim.objects.all(), 'гидравлика'), [])
+
+    def test_ranked_search_in_role_scope(self):
+        stranger = User.objects.create_user('stranger', password='pass', role='client')
+        foreign = self.make_machine('FTS-F', client_user=stranger)
+        best = self.make_claim(foreign, failure_description='Течь гидравлики, течь гидравлики из насоса')
+        response = self.client.get('/api/search/', {'q': 'течь гидравлика'})
+        self.assertEqual([row['id'] for row in response.json()['claims']], [best.pk, self.claim.pk])
+
+        self.client.force_login(stranger)
+        response = self.client.get('/api/search/', {'q': 'течь гидравлика'})
+        self.assertEqual([row['id'] for row in response.json()['claims']], [best.pk])
+        self.assertEqual([row['id'] for row in response.json()['machines']], [])
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
+
+    def test_ranked_limit_applies_within_scope(self):
+        stranger = User.objects.create_user('stranger', password='pass', role='client')
+        foreign = self.make_machine('FTS-F', client_user=stranger)
+        for _ in range(3):
+            self.make_claim(foreign, failure_description='Течь гидравлики, течь гидравлики из насоса')
+        scope = Claim.objects.filter(machine__client_user=self.client_user)
+        # Ранг, область видимости и LIMIT — один запрос, записи — второй
+        with self.assertNumQueries(2):
+            self.assertEqual(search.ranked(scope, 'течь гидравлика', limit=1), [self.claim])
+        self.assertEqual(len(search.ranked(Claim.objects.all(), 'течь гидравлика', limit=2)), 2)
+
+    def test_dashboard_search_tab(self):
+        response = self.client.get(reverse('dashboard'), {'tab': 'search', 'q': 'гидравлика'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['search_results']['claims'], [self.claim])
+        self.assertContains(response, 'Течь гидравлики под кабиной')
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            search.backend().clear(cursor)
+        self.assertEqual(self.ids('/api/claims/', 'гидравлика'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.ids('/api/claims/', 'гидравлика'), [self.claim.pk])
+
+
+class AnalyticsTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.make_machine('AN-1')
+        self.second = self.make_machine('AN-2')
+        self.make_claim(self.first, operating_time=100, downtime=2)
+        self.make_claim(self.first, operating_time=300, downtime=4)
+        self.make_claim(self.second, operating_time=150, downtime=6)
+        self.client.force_login(self.manager)
+
+    def snapshot(self):
+        return sorted(ReliabilitySummary.objects.filter(claims__gt=0).values_list(
+            'dimension', 'key', 'parent', 'claims', 'downtime', 'operating_time', 'machines'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        analytics.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_reports(self):
+        reports = self.client.get('/api/analytics/').json()
+        self.assertEqual(reports['models'], [{
+            'id': self.machine_model.pk, 'name': self.machine_model.name, 'claims': 3, 'share': 100.0,
+            'mean_downtime': 4.0, 'machines': 2, 'mtbf': 150.0,
+        }])
+        response = self.client.get('/api/analytics/failed-units/')
+        self.assertEqual(response.json()[0]['claims'], 3)
+        self.assertEqual(self.client.get('/api/analytics/service-companies/').status_code, 200)
+
+    def test_reports_read_only_summary(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/analytics/')
+        self.assertFalse([q for q in context.captured_queries if 'core_claim' in q['sql']])
+
+    def test_incremental_updates_match_rebuild(self):
+        other_unit = make_directory('Узел отказа', 'Гидросистема')
+        other_model = make_directory('Модель техники', 'ПД3,0')
+        claim = self.make_claim(self.second, operating_time=900, downtime=1, failed_unit=other_unit)
+        self.assertMatchesRebuild()
+
+        claim.failed_unit = self.failed_unit
+        claim.downtime = 10
+        claim.machine = self.first
+        claim.save()
+        self.assertMatchesRebuild()
+
+        self.first.model = other_model
+        self.first.save()
+        self.assertMatchesRebuild()
+
+        claim.delete()
+        self.assertMatchesRebuild()
+
+        self.first.delete()
+        self.assertMatchesRebuild()
+
+        other_unit.delete()
+        self.failed_unit.delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(analytics.report('failed_unit')[0]['name'], 'Не указано')
+
+    def test_machines_written_without_signals(self):
+        other_model = make_directory('Модель техники', 'ПД3,0')
+        Machine.objects.filter(pk=self.second.pk).update(model=other_model)
+        analytics.machines_changed([self.first.pk, self.second.pk])
+        self.assertMatchesRebuild()
+
+    def test_managers_only(self):
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.client.get('/api/analytics/').status_code, 403)
+        response = self.client.get(reverse('dashboard'), {'tab': 'analytics'})
+        self.assertIsNone(response.context['reports'])
+
+    def test_dashboard_tab(self):
+        response = self.client.get(reverse('dashboard'), {'tab': 'analytics'})
+        self.assertContains(response, 'Наработка на отказ по моделям техники')
+        self.assertEqual(response.context['reports']['models'][0]['mtbf'], 150.0)
+
+    def test_rebuild_command(self):
+        ReliabilitySummary.objects.all().delete()
+        call_command('rebuild_analytics', stdout=StringIO())
+        self.assertEqual(analytics.report('model')[0]['claims'], 3)
+
+
+class ReliabilityTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.make_machine('RL-1')
+        self.second = self.make_machine('RL-2')
+        self.hydraulics = make_directory('Узел отказа', 'Гидросистема')
+        self.make_claim(self.first, operating_time=300)
+        self.make_claim(self.first, operating_time=100, failed_unit=self.hydraulics)
+        self.make_claim(self.second, operating_time=150)
+        self.make_maintenance(self.first, date=datetime.date(2024, 1, 10), operating_time=100)
+        self.make_maintenance(self.first, date=datetime.date(2024, 3, 10), operating_time=400)
+        # Просрочка по наработке: 700 м/час > 500 + 10 %
+        self.make_maintenance(self.first, date=datetime.date(2024, 5, 9), operating_time=1100)
+        self.client.force_login(self.manager)
+
+    def test_time_between_failures(self):
+        result = reliability.compute()
+        model = result['models'][0]
+        self.assertEqual(model['failures'], 3)
+        # Интервалы: 100 и 200 у первой машины, 150 у второй
+        self.assertEqual((model['mean'], model['p10'], model['median'], model['p90']), (150.0, 100.0, 150.0, 200.0))
+        self.assertGreater(model['weibull_shape'], 0)
+        self.assertLess(model['b10'], model['weibull_scale'])
+        # По узлам интервалы считаются только между отказами того же узла
+        units = {row['name']: row for row in result['failed_units']}
+        self.assertEqual(units['Двигатель']['median'], 150.0)
+        self.assertEqual(units['Гидросистема']['failures'], 1)
+        self.assertIsNone(units['Гидросистема']['weibull_shape'])
+
+    def test_maintenance_compliance(self):
+        row = reliability.compute()['maintenance'][0]
+        self.assertEqual((row['intervals'], row['mean_hours'], row['mean_days']), (2, 500.0, 60.0))
+        self.assertEqual(row['compliance'], 50.0)
+
+    def test_numpy_matches_python(self):
+        if reliability.np is None:
+            self.skipTest('NumPy не установлен')
+        call_command('seed_silant', machines=20, clients=1, services=1, stdout=StringIO())
+        self.assertEqual(reliability.compute('numpy'), reliability.compute('python'))
+
+    @override_settings(RELIABILITY_CACHE_TIMEOUT=60)
+    def test_cached_by_data_version(self):
+        first = self.client.get('/api/analytics/reliability/').json()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get('/api/analytics/reliability/').json(), first)
+        self.assertFalse([q for q in context.captured_queries if 'core_claim' in q['sql']])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_claim(self.second, operating_time=400)
+        second = self.client.get('/api/analytics/reliability/').json()
+        self.assertNotEqual(second['version'], first['version'])
+        self.assertEqual(second['models'][0]['failures'], 4)
+
+    def test_managers_only(self):
+        self.client.force_login(self.service_user)
+        self.assertEqual(self.client.get('/api/analytics/reliability/').status_code, 403)
+
+
+class MachineStatsTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.machine = self.make_machine('MS-1')
+        self.other = self.make_machine('MS-2')
+
+    def stats(self, machine):
+        return Machine.objects.filter(pk=machine.pk).values(*Machine.STATS_FIELDS).get()
+
+    def assertMatchesRecompute(self):
+        incremental = [self.stats(machine) for machine in (self.machine, self.other)]
+        Machine.objects.update(operating_time=0, claims_count=0, total_downtime=0, last_maintenance_date=None)
+        call_command('recompute_machine_stats', stdout=StringIO())
+        self.assertEqual(incremental, [self.stats(machine) for machine in (self.machine, self.other)])
+
+    def test_updated_on_write(self):
+        self.make_maintenance(self.machine, date=datetime.date(2024, 3, 1), operating_time=100)
+        maintenance = self.make_maintenance(self.machine, date=datetime.date(2024, 6, 1), operating_time=400)
+        claim = self.make_claim(self.machine, operating_time=450, downtime=3,
+                                failure_date=datetime.date(2024, 7, 1), recovery_date=datetime.date(2024, 7, 4))
+        self.make_claim(self.machine, operating_time=200, downtime=2)
+        self.assertEqual(self.stats(self.machine), {
+            'last_maintenance_date': datetime.date(2024, 6, 1), 'operating_time': 450, 'claims_count': 2,
+            'total_downtime': 5, 'last_failure_date': datetime.date(2024, 7, 1),
+            'last_recovery_date': datetime.date(2024, 7, 4),
+        })
+        self.assertMatchesRecompute()
+
+        claim.machine = self.other
+        claim.save()
+        maintenance.delete()
+        self.assertEqual(self.stats(self.machine)['claims_count'], 1)
+        self.assertEqual(self.stats(self.machine)['last_maintenance_date'], datetime.date(2024, 3, 1))
+        self.assertEqual(self.stats(self.other)['operating_time'], 450)
+        self.assertMatchesRecompute()
+
+    def test_machine_save_keeps_stats(self):
+        stale = Machine.objects.get(pk=self.machine.pk)
+        self.make_claim(self.machine, downtime=4)
+        stale.client = 'ООО «Новый покупатель»'
+        stale.save()
+        self.assertEqual(self.stats(self.machine)['total_downtime'], 4)
+
+    def test_read_only_in_api(self):
+        self.client.force_login(self.manager)
+        self.make_claim(self.machine, downtime=4)
+        response = self.client.patch(f'/api/machines/{self.machine.pk}/', {'claims_count': 100},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['claims_count'], 1)
+        response = self.client.get('/api/machines/', {'ordering': '-total_downtime'})
+        self.assertEqual(response.json()['results'][0]['serial_number'], 'MS-1')
+
+    def test_dashboard_sorts_without_joins(self):
+        self.make_claim(self.other, operating_time=900)
+        self.client.force_login(self.manager)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('dashboard'), {'ordering': '-operating_time'})
+        self.assertEqual(response.context['machines'][0], self.other)
+        self.assertContains(response, '900')
+        listing = [q['sql'] for q in context.captured_queries if '"core_machine"."operating_time" DESC' in q['sql']]
+        self.assertTrue(listing)
+        self.assertFalse([sql for sql in listing if 'core_claim' in sql or 'core_maintenance' in sql])
+
+
+class MetricsTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+        self.machine = self.make_machine('MTR-1')
+        self.staff = User.objects.create_user('staff', password='pass', role='manager', is_staff=True)
+
+    def sample(self, text, name, **labels):
+        prefix = f'{name}{metrics.labels(**labels)} '
+        values = [line[len(prefix):] for line in text.splitlines() if line.startswith(prefix)]
+        self.assertEqual(len(values), 1, prefix)
+        return float(values[0])
+
+    def scrape(self, **extra):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'), **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=300)
+    def test_records_per_view(self):
+        self.client.force_login(self.manager)
+        self.client.get(reverse('dashboard'))
+        self.client.get(reverse('dashboard'))
+        self.client.get(f'/api/machines/{self.machine.pk}/')
+        text = self.scrape()
+        dashboard = {'view': 'dashboard', 'method': 'GET'}
+        self.assertEqual(self.sample(text, 'silant_requests_total', **dashboard, status='200'), 2)
+        self.assertEqual(self.sample(text, 'silant_request_duration_seconds_count', **dashboard), 2)
+        self.assertEqual(self.sample(text, 'silant_request_duration_seconds_bucket', **dashboard, le='+Inf'), 2)
+        self.assertGreater(self.sample(text, 'silant_db_queries_total', **dashboard), 0)
+        self.assertGreater(self.sample(text, 'silant_template_render_seconds_total', **dashboard), 0)
+        self.assertGreater(self.sample(text, 'silant_response_bytes_total', **dashboard), 0)
+        self.assertEqual(self.sample(text, 'silant_cache_requests_total', **dashboard, cache='response', result='hit'), 1)
+        self.assertEqual(self.sample(text, 'silant_cache_requests_total', **dashboard, cache='response', result='miss'), 1)
+        detail = {'view': 'machine-detail', 'method': 'GET'}
+        self.assertEqual(self.sample(text, 'silant_template_render_seconds_total', **detail), 0)
+
+    async def test_async_view_counts_thread_queries(self):
+        await self.async_client.get('/api/public_machine_search/', {'serial_number': 'MTR-1'})
+        await self.async_client.get('/api/public_machine_search/', {'serial_number': 'MTR-1'})
+        row = metrics.collect()['api_public_machine_search', 'GET']
+        self.assertEqual(row['requests'], 2)
+        self.assertEqual(row['cache']['public_lookup'], [1, 1])
+        self.assertGreater(row['queries'], 0)
+
+    def test_access(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(self.manager)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.logout()
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer nope').status_code, 403)
+
+    def test_workers_share_directory(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            self.client.get(reverse('public_search_page'))
+            metrics.registry.flush(force=True)
+            with open(os.path.join(directory, f'{os.getpid()}.json'), encoding='utf-8') as f:
+                other = json.load(f)
+            # Сводка «другого воркера» и недописанный файл
+            with open(os.path.join(directory, '1.json'), 'w', encoding='utf-8') as f:
+                json.dump(other, f)
+            with open(os.path.join(directory, '2.json'), 'w', encoding='utf-8') as f:
+                f.write('[{"view"')
+            text = self.scrape()
+        self.assertEqual(self.sample(text, 'silant_requests_total', view='public_search_page', method='GET',
+                                     status='200'), 2)
+
+
+    def test_server_timing(self):
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse('dashboard'))
+        timing = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, duration = entry.split(';')[:2]
+            timing[name] = float(duration.removeprefix('dur='))
+        self.assertEqual(list(timing), ['db', 'tpl', 'ser', 'app', 'total'])
+        self.assertGreater(timing['db'], 0)
+        self.assertGreater(timing['tpl'], 0)
+        # Составляющие не пересекаются: SQL из шаблона учтён только в db
+        self.assertLessEqual(timing['db'] + timing['tpl'] + timing['ser'], timing['total'] + 0.5)
+        api = self.client.get('/api/machines/')
+        self.assertNotIn('ser;dur=0.0;', api['Server-Timing'])
+        with self.settings(SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('dashboard')))
+
+    def test_serialization_excludes_nested_and_sql(self):
+        stats = metrics.RequestStats()
+        token = metrics.current.set(stats)
+        try:
+            with metrics.serialization():
+                with metrics.serialization():
+                    list(Machine.objects.all())
+        finally:
+            metrics.current.reset(token)
+        self.assertEqual(stats.queries, 1)
+        self.assertGreaterEqual(stats.serialize_seconds, 0)
+        self.assertIsNone(stats.timing)
+
+
+class ProfilerTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_machine('PRF-1')
+        self.staff = User.objects.create_superuser('staff', password='pass', role='manager')
+
+    def test_staff_only(self):
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse('dashboard'), {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(profiling.HEADER, response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_profile_request(self):
+        self.client.force_login(self.staff)
+        self.assertNotIn(profiling.HEADER, self.client.get(reverse('dashboard')))
+        response = self.client.get(reverse('dashboard'), {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response[profiling.HEADER],
+                         reverse('admin:core_requestprofile_download', args=[profile.pk]))
+        self.assertEqual((profile.view_name, profile.method, profile.status, profile.user), ('dashboard', 'GET', 200, self.staff))
+        self.assertGreater(profile.queries, 0)
+        self.assertIn('dashboard', profile.summary)
+
+        download = self.client.get(response[profiling.HEADER])
+        self.assertEqual(download['Content-Disposition'], f'attachment; filename="profile-{profile.pk}.prof"')
+        with tempfile.NamedTemporaryFile(suffix='.prof', delete=False) as f:
+            f.write(download.content)
+        try:
+            stats = pstats.Stats(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertTrue(any(name == 'dashboard' for _, _, name in stats.stats))
+        changelist = self.client.get(reverse('admin:core_requestprofile_changelist'))
+        self.assertContains(changelist, f'profile-{profile.pk}.prof')
+
+    def test_header_and_retention(self):
+        self.client.force_login(self.staff)
+        with self.settings(PROFILE_KEEP=2):
+            for _ in range(3):
+                response = self.client.get('/api/machines/', HTTP_X_SILANT_PROFILE='1')
+                self.assertIn(profiling.HEADER, response)
+        self.assertEqual(RequestProfile.objects.count(), 2)
+        self.assertEqual(RequestProfile.objects.first().view_name, 'machine-list')
+
+    async def test_async_view(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get('/api/public_machine_search/', {'serial_number': 'PRF-1', 'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(profiling.HEADER, response)
+        profile = await RequestProfile.objects.aget()
+        self.assertEqual(profile.view_name, 'api_public_machine_search')
+
+
+class ApiSchemaTests(TestCase):
+    def setUp(self):
+        api_schema.documents.clear()
+        self.addCleanup(api_schema.documents.clear)
+
+    def test_built_once(self):
+        with mock.patch.object(api_schema, 'generate', wraps=api_schema.generate) as generate, \
+                tempfile.TemporaryDirectory() as directory, self.settings(API_SCHEMA_DIR=directory):
+            response = self.client.get('/swagger.json')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('/machines/', json.loads(response.content)['paths'])
+            self.assertNotIn('host', json.loads(response.content))
+            self.assertEqual(self.client.get('/swagger.yaml')['Content-Type'], 'application/yaml; charset=utf-8')
+            cached = self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(generate.call_count, 1)
+
+    def test_served_from_command_output(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(API_SCHEMA_DIR=directory):
+            call_command('build_api_schema', stdout=StringIO())
+            with open(os.path.join(directory, 'openapi.json'), 'rb') as f:
+                content = f.read()
+            with mock.patch.object(api_schema, 'generate', side_effect=AssertionError):
+                response = self.client.get('/swagger.json')
+                ui = self.client.get(reverse('schema-swagger-ui'))
+        self.assertEqual(response.content, content)
+        self.assertEqual(ui.status_code, 200)
+        self.assertContains(ui, '"url": "/swagger.json"')
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class RowCacheTests(SilantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.machine = self.make_machine('ROW-1')
+        self.make_machine('ROW-2')
+        self.client.force_login(self.manager)
+
+    def dashboard(self, **params):
+        return self.client.get(reverse('dashboard'), params).content.decode()
+
+    def tbody(self, html):
+        return html[html.index('<tbody>'):html.index('</tbody>')]
+
+    def test_rows_rendered_once(self):
+        first = self.tbody(self.dashboard())
+        with mock.patch.object(row_cache.cache, 'set_many', wraps=row_cache.cache.set_many) as set_many:
+            self.assertEqual(self.tbody(self.dashboard()), first)
+        set_many.assert_not_called()
+        # Прямой UPDATE не меняет updated_at: строка берётся из кэша
+        Machine.objects.filter(pk=self.machine.pk).update(engine_serial='E-UPDATED')
+        self.assertNotIn('E-UPDATED', self.dashboard())
+        with self.settings(ROW_CACHE_TIMEOUT=0):
+            self.assertIn('E-UPDATED', self.dashboard())
+
+    def test_save_and_directory_change_invalidate(self):
+        self.dashboard()
+        self.machine.engine_serial = 'E-SAVED'
+        self.machine.save()
+        html = self.dashboard()
+        self.assertIn('E-SAVED', html)
+        self.assertIn('E-ROW-2', html)
+        self.engine_model.name = 'Kubota V2403'
+        self.engine_model.save()
+        self.assertEqual(self.dashboard().count('Kubota V2403'), 2)
+
+    def test_maintenance_and_claim_rows(self):
+        self.make_maintenance(self.machine)
+        self.make_claim(self.machine)
+        params = {'machine_id': self.machine.pk}
+        self.assertIn('ТО-1', self.dashboard(tab='to', **params))
+        self.assertIn('Ремонт узла', self.dashboard(tab='claims', **params))
+        self.maintenance_type.name = 'ТО-2'
+        self.maintenance_type.save()
+        self.recovery_method.name = 'Замена узла'
+        self.recovery_method.save()
+        self.assertIn('ТО-2', self.dashboard(tab='to', **params))
+        self.assertIn('Замена узла', self.dashboard(tab='claims', **params))
+        self.assertIn('Нет данных', self.dashboard(tab='to', machine_id=Machine.objects.get(serial_number='ROW-2').pk))
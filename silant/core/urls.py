@@ -1,16 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
+from .async_api import async_read
 
 router = DefaultRouter()
 router.register(r'machines', views.MachineViewSet)
 router.register(r'maintenances', views.MaintenanceViewSet)
 router.register(r'claims', views.ClaimViewSet)
 router.register(r'directories', views.DirectoryViewSet)
+router.register(r'analytics', views.AnalyticsViewSet, basename='analytics')
 
 urlpatterns = [
-    path('api/', include(router.urls)),
+    # Списки и карточки машин, ТО и рекламаций читаются асинхронно (под ASGI)
+    path('api/', include(async_read(router.urls, ['machine', 'maintenance', 'claim']))),
     path('api/public_machine_search/', views.public_machine_search, name='api_public_machine_search'),
+    path('api/public_machine_search/batch/', views.public_machine_search_batch, name='api_public_machine_search_batch'),
+    path('api/search/', views.search_api, name='api_search'),
+    path('metrics/', views.metrics_view, name='metrics'),
     path('machines/<int:pk>/', views.machine_detail, name='machine_detail'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('', views.public_search_page, name='public_search_page'),
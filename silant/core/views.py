@@ -1,18 +1,29 @@
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import render, get_object_or_404, redirect
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
 from rest_framework import viewsets, permissions, filters
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Machine, Maintenance, Claim, Directory
-from .serializers import MachineSerializer, MaintenanceSerializer, ClaimSerializer, DirectorySerializer
+from .serializers import MachineSerializer, MaintenanceSerializer, ClaimSerializer, DirectorySerializer, ExpandMixin, SparseFieldsMixin
 from .forms import MachineForm, MaintenanceForm, ClaimForm
 from .decorators import role_required
+from .pagination import KeysetPagination, paginate
+from . import analytics, api_schema, conditional, metrics, public_lookup, reliability, search
+from .admin import MachineResource, MaintenanceResource, ClaimResource
+from .bulk_write import BulkWriteMixin
+from .conditional import ConditionalListMixin, conditional_dashboard
+from .exporting import ExportMixin
+from .fast_serialization import FastJSONRenderer, FastListMixin
+from .response_cache import CachedListMixin, cache_per_user
+from .sync import ChangesFeedMixin
 
 # ---- REST API ----
 
-class MachineViewSet(viewsets.ModelViewSet):
+class MachineViewSet(ConditionalListMixin, CachedListMixin, FastListMixin, ExportMixin, ChangesFeedMixin, ExpandMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     """
     API endpoint для работы с машинами (таблица «Машина»).
 
@@ -21,8 +32,17 @@ class MachineViewSet(viewsets.ModelViewSet):
     Доступно менеджеру (все машины), сервисной компании (только свои), клиенту (только свои).
     Поддерживаются фильтры: модель техники, модель двигателя, модель трансмиссии, ведущий мост, управляемый мост, заводской номер.
     По умолчанию сортировка по дате отгрузки с завода (shipment_date).
+    Модели узлов по умолчанию отдаются как id; expand подставляет их названия.
     Пример запроса:
         GET /api/machines/?model=3&ordering=-shipment_date
+        GET /api/machines/?expand=model,engine_model
+    Параметр fields оставляет в ответе только перечисленные поля (и читает из БД только их):
+        GET /api/machines/?fields=serial_number,model,shipment_date
+    Полнотекстовый поиск (номера, модели, адрес, комплектация; с учётом словоформ):
+        GET /api/machines/?search=Чебоксары
+    Сводные поля по ТО и рекламациям (дата последнего ТО, наработка, число рекламаций,
+    простой, даты последнего отказа и восстановления) только для чтения; по ним можно сортировать:
+        GET /api/machines/?ordering=-operating_time
 
     retrieve:
     Получить подробную информацию о конкретной машине по id.
@@ -48,17 +68,31 @@ class MachineViewSet(viewsets.ModelViewSet):
 
         destroy:
         Удалить машину (только для менеджера).
+
+    export:
+    Выгрузить машины в CSV или XLSX (с учётом фильтров и сортировки).
+    Пример запроса:
+        GET /api/machines/export/?file_format=xlsx&model=3
+
+    changes:
+    Изменённые и удалённые машины после курсора since (из поля next прошлого ответа
+    или дата и время ISO 8601); без since — все машины.
+    Пример запроса:
+        GET /api/machines/changes/?since=2025-06-01T00:00:00Z
         """
     queryset = Machine.objects.all()
     serializer_class = MachineSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    export_resource = MachineResource
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, search.FullTextSearchFilter]
     filterset_fields = [
         'model', 'engine_model', 'transmission_model',
         'steer_axle_model', 'drive_axle_model', 'serial_number'
     ]
     ordering_fields = [
         'shipment_date', 'model', 'engine_model',
-        'transmission_model', 'steer_axle_model', 'drive_axle_model'
+        'transmission_model', 'steer_axle_model', 'drive_axle_model',
+        'last_maintenance_date', 'operating_time', 'claims_count', 'total_downtime', 'last_failure_date',
     ]
     ordering = ['-shipment_date']
     search_fields = [
@@ -106,7 +140,7 @@ class MachineViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated()]
         return [permissions.IsAdminUser()]
 
-class MaintenanceViewSet(viewsets.ModelViewSet):
+class MaintenanceViewSet(ConditionalListMixin, CachedListMixin, FastListMixin, ExportMixin, ChangesFeedMixin, BulkWriteMixin, ExpandMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     """
     API endpoint для работы с ТО (таблица «ТО»).
 
@@ -114,8 +148,11 @@ class MaintenanceViewSet(viewsets.ModelViewSet):
         Получить список всех ТО, доступных пользователю.
         Поддерживаются фильтры: вид ТО, заводской номер машины, сервисная компания.
         По умолчанию сортировка по дате проведения ТО (date).
+        Связи раскрываются параметром expand (machine, maintenance_type, service_company).
         Пример запроса:
             GET /api/maintenances/?maintenance_type=2&ordering=-date
+            GET /api/maintenances/?expand=machine,maintenance_type
+            GET /api/maintenances/?search=ТО-1 0017
 
         retrieve:
         Получить подробную информацию о конкретном ТО по id.
@@ -133,17 +170,44 @@ class MaintenanceViewSet(viewsets.ModelViewSet):
 
         destroy:
         Удалить запись о ТО.
+
+        export:
+        Выгрузить ТО в CSV или XLSX.
+        Пример запроса:
+            GET /api/maintenances/export/?file_format=csv
+
+        changes:
+        Изменённые и удалённые ТО после курсора since (включая удалённые вместе с машиной).
+        Пример запроса:
+            GET /api/maintenances/changes/?since=<next>
+
+        bulk_create:
+        Добавить список ТО одним запросом (менеджер, сервисная компания, клиент — по своим машинам).
+        Пишется всё или ничего; при ошибках ответ 400 со списком ошибок по позициям.
+        Пример запроса:
+            POST /api/maintenances/bulk/
+                [{"machine": 5, "maintenance_type": 2, "date": "2025-06-01", ...}, ...]
+
+        bulk_partial_update:
+        Частично изменить список ТО одним запросом.
+        Пример запроса:
+            PATCH /api/maintenances/bulk/
+                [{"id": 10, "operating_time": 520}, {"id": 11, "order_number": "#2025-7"}]
         """
     queryset = Maintenance.objects.all()
     serializer_class = MaintenanceSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    export_resource = MaintenanceResource
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, search.FullTextSearchFilter]
     filterset_fields = {
         'maintenance_type': ['exact'],
         'machine__serial_number': ['exact', 'icontains'],
-        'service_company': ['exact', 'icontains'],
+        'service_company': ['exact'],
+        'service_company__name': ['icontains'],
     }
     ordering_fields = ['date', 'maintenance_type', 'service_company']
     ordering = ['-date']
+    bulk_write_roles = ('manager', 'service', 'client')
     search_fields = ['maintenance_type__name', 'machine__serial_number', 'service_company__name']
 
     def get_queryset(self):
@@ -184,7 +248,7 @@ class MaintenanceViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated()]
         return [permissions.IsAdminUser()]
 
-class ClaimViewSet(viewsets.ModelViewSet):
+class ClaimViewSet(ConditionalListMixin, CachedListMixin, FastListMixin, ExportMixin, ChangesFeedMixin, BulkWriteMixin, ExpandMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     """
         API endpoint для работы с рекламациями (таблица «Рекламации»).
 
@@ -192,8 +256,11 @@ class ClaimViewSet(viewsets.ModelViewSet):
         Получить список всех рекламаций, доступных пользователю.
         Поддерживаются фильтры: узел отказа, способ восстановления, заводской номер машины, сервисная компания.
         По умолчанию сортировка по дате отказа (failure_date).
+        Связи раскрываются параметром expand (machine, failed_unit, recovery_method, service_company).
         Пример запроса:
             GET /api/claims/?failed_unit=3&ordering=-failure_date
+            GET /api/claims/?expand=machine,failed_unit
+            GET /api/claims/?search=гидравлика течь
 
         retrieve:
         Получить подробную информацию о конкретной рекламации по id.
@@ -211,18 +278,47 @@ class ClaimViewSet(viewsets.ModelViewSet):
 
         destroy:
         Удалить рекламацию.
+
+        export:
+        Выгрузить рекламации в CSV или XLSX.
+        Пример запроса:
+            GET /api/claims/export/?file_format=csv
+
+        changes:
+        Изменённые и удалённые рекламации после курсора since.
+        Пример запроса:
+            GET /api/claims/changes/?since=<next>
+
+        bulk_create:
+        Добавить список рекламаций одним запросом (менеджер, сервисная компания — по своим машинам).
+        Пишется всё или ничего; при ошибках ответ 400 со списком ошибок по позициям.
+        Пример запроса:
+            POST /api/claims/bulk/
+                [{"machine": 5, "failure_date": "2025-06-01", "failed_unit": 7, ...}, ...]
+
+        bulk_partial_update:
+        Частично изменить список рекламаций одним запросом.
+        Пример запроса:
+            PATCH /api/claims/bulk/
+                [{"id": 7, "recovery_date": "2025-06-04", "downtime": 3}]
         """
     queryset = Claim.objects.all()
     serializer_class = ClaimSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    export_resource = ClaimResource
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, search.FullTextSearchFilter]
     filterset_fields = {
-        'failed_unit': ['exact', 'icontains'],
-        'recovery_method': ['exact', 'icontains'],
+        'failed_unit': ['exact'],
+        'failed_unit__name': ['icontains'],
+        'recovery_method': ['exact'],
+        'recovery_method__name': ['icontains'],
         'machine__serial_number': ['exact', 'icontains'],
-        'service_company': ['exact', 'icontains'],
+        'service_company': ['exact'],
+        'service_company__name': ['icontains'],
     }
     ordering_fields = ['failure_date', 'failed_unit', 'recovery_method']
     ordering = ['-failure_date']
+    bulk_write_roles = ('manager', 'service')
     search_fields = ['failed_unit__name', 'recovery_method__name', 'machine__serial_number', 'service_company__name']
 
     def get_queryset(self):
@@ -263,7 +359,7 @@ class ClaimViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated()]
         return [permissions.IsAdminUser()]
 
-class DirectoryViewSet(viewsets.ModelViewSet):
+class DirectoryViewSet(ConditionalListMixin, CachedListMixin, FastListMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     """
         API endpoint для работы со справочниками (таблица «Справочник»).
 
@@ -317,38 +413,78 @@ class DirectoryViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated()]
         return [permissions.IsAdminUser()]
 
+class AnalyticsViewSet(viewsets.ViewSet):
+    """
+    Аналитика надёжности парка (только для менеджера).
+    Отчёты читаются из сводной таблицы, которая обновляется при записи рекламаций.
+
+    list:
+    Все отчёты сразу.
+    Пример запроса:
+        GET /api/analytics/
+
+    failed_units:
+    Рекламации по узлам отказа: число, доля, средний простой (дни).
+        GET /api/analytics/failed-units/
+
+    recovery_methods:
+    Рекламации и средний простой по способам восстановления.
+        GET /api/analytics/recovery-methods/
+
+    models:
+    Машины с отказами, рекламации, средний простой и MTBF (м/час) по моделям техники.
+        GET /api/analytics/models/
+
+    service_companies:
+    Рекламации и средний простой по сервисным компаниям.
+        GET /api/analytics/service-companies/
+
+    reliability:
+    Наработка между отказами по моделям и узлам (среднее, перцентили,
+    параметры Вейбулла, ресурс B10) и соблюдение интервалов ТО по моделям.
+    Считается по всем рекламациям и ТО, кэшируется до следующей записи данных.
+        GET /api/analytics/reliability/
+    """
+    permission_classes = [analytics.IsManager]
+
+    def list(self, request):
+        return Response(analytics.reports())
+
+    @action(detail=False, url_path='failed-units')
+    def failed_units(self, request):
+        return Response(analytics.report('failed_unit'))
+
+    @action(detail=False, url_path='recovery-methods')
+    def recovery_methods(self, request):
+        return Response(analytics.report('recovery_method'))
+
+    @action(detail=False)
+    def models(self, request):
+        return Response(analytics.report('model'))
+
+    @action(detail=False, url_path='service-companies')
+    def service_companies(self, request):
+        return Response(analytics.report('service_company'))
+
+    @action(detail=False)
+    def reliability(self, request):
+        return Response(reliability.report())
+
 # ---- Публичная страница поиска (гость) ----
 
-def public_search_page(request):
+async def public_search_page(request):
     """
     Публичная страница поиска по заводскому номеру для гостей (анонимных и авторизованных с ролью 'гость').
+    Асинхронная: под ASGI поток занимается только отрисовкой шаблона.
     """
-    if request.user.is_authenticated and getattr(request.user, 'role', None) != 'guest':
+    user = await request.auser()
+    # Шаблон обращается к request.user: пользователь уже загружен асинхронно
+    request.user = user
+    if user.is_authenticated and getattr(user, 'role', None) != 'guest':
         return redirect('dashboard')
     serial_number = request.GET.get('serial_number', '').strip()
-    machine = None
-    search = False
-
-    if serial_number:
-        search = True
-        try:
-            machine = Machine.objects.get(serial_number=serial_number)
-        except Machine.DoesNotExist:
-            machine = None
-    machine_fields = None
-    if machine:
-        machine_fields = {
-            'model': machine.model.name if machine.model else '',
-            'serial_number': machine.serial_number,
-            'engine_model': machine.engine_model.name if machine.engine_model else '',
-            'engine_serial': machine.engine_serial,
-            'transmission_model': machine.transmission_model.name if machine.transmission_model else '',
-            'transmission_serial': machine.transmission_serial,
-            'drive_axle_model': machine.drive_axle_model.name if machine.drive_axle_model else '',
-            'drive_axle_serial': machine.drive_axle_serial,
-            'steer_axle_model': machine.steer_axle_model.name if machine.steer_axle_model else '',
-            'steer_axle_serial': machine.steer_axle_serial,
-        }
+    search = bool(serial_number)
+    machine_fields = await public_lookup.alookup(serial_number) if serial_number else None
     context = {
         'machine_fields': machine_fields,
         'search': search,
@@ -359,6 +495,8 @@ def public_search_page(request):
 # ---- Внутренние страницы для авторизованных пользователей ----
 
 @login_required
+@conditional_dashboard
+@cache_per_user
 def dashboard(request):
     user = request.user
     tab = request.GET.get('tab', 'info')
@@ -380,45 +518,62 @@ def dashboard(request):
         return render(request, 'core/public_search.html')
 
     if user.role == 'manager':
-        machines = Machine.objects.filter(**filters)
+        machines = Machine.objects.for_listing().filter(**filters)
     elif user.role == 'client':
-        machines = Machine.objects.filter(client_user=user, **filters)
+        machines = Machine.objects.for_listing().filter(client_user=user, **filters)
     elif user.role == 'service':
-        machines = Machine.objects.filter(service_user=user, **filters)
+        machines = Machine.objects.for_listing().filter(service_user=user, **filters)
     else:
         machines = Machine.objects.none()
 
     if tab == 'info':
-        machines = machines.order_by(ordering or '-shipment_date')
+        machines = machines.order_by(ordering or '-shipment_date', '-id')
 
     if selected_machine_id:
-        selected_machine = get_object_or_404(Machine, pk=selected_machine_id)
+        selected_machine = get_object_or_404(Machine.objects.for_listing(), pk=selected_machine_id)
     else:
         selected_machine = machines.first() if machines.exists() else None
 
     if tab == 'to' and selected_machine:
-        maintenances = Maintenance.objects.filter(machine=selected_machine).order_by(ordering or '-date')
+        maintenances = Maintenance.objects.for_listing().filter(machine=selected_machine).order_by(ordering or '-date', '-id')
     else:
         maintenances = Maintenance.objects.none()
 
     if tab == 'claims' and selected_machine:
-        claims = Claim.objects.filter(machine=selected_machine).order_by(ordering or '-failure_date')
+        claims = Claim.objects.for_listing().filter(machine=selected_machine).order_by(ordering or '-failure_date', '-id')
     else:
         claims = Claim.objects.none()
 
+    query = request.GET.get('q', '').strip()
+    search_results = search_records(user, query) if tab == 'search' and query else None
+    reports = analytics.reports() if tab == 'analytics' and user.role == 'manager' else None
+
+    # Постраничный вывод только для таблицы активной вкладки
+    page_obj = None
+    if tab == 'info':
+        page_obj = machines = paginate(request, machines)
+    elif tab == 'to' and selected_machine:
+        page_obj = maintenances = paginate(request, maintenances)
+    elif tab == 'claims' and selected_machine:
+        page_obj = claims = paginate(request, claims)
+
     context = {
         'machines': machines,
+        'page_obj': page_obj,
         'tab': tab,
         'selected_machine': selected_machine,
         'maintenances': maintenances,
         'claims': claims,
+        'query': query,
+        'search_results': search_results,
+        'reports': reports,
         'user_role': user.role,
         'request': request,
     }
     return render(request, 'core/dashboard.html', context)
 
 def machine_detail(request, pk):
-    machine = get_object_or_404(Machine, pk=pk)
+    machine = get_object_or_404(Machine.objects.for_listing(), pk=pk)
     user = request.user
     if not user.is_authenticated or (
         user.role == 'client' and machine.client_user != user
@@ -429,37 +584,94 @@ def machine_detail(request, pk):
     return render(request, 'core/machine/machine_detail.html', {'machine': machine, 'user_role': user.role})
 
 def maintenance_detail(request, pk):
-    maintenance = get_object_or_404(Maintenance, pk=pk)
+    maintenance = get_object_or_404(Maintenance.objects.for_listing(), pk=pk)
     return render(request, 'core/maintenance/maintenance_detail.html', {'maintenance': maintenance})
 
 def claim_detail(request, pk):
-    claim = get_object_or_404(Claim, pk=pk)
+    claim = get_object_or_404(Claim.objects.for_listing(), pk=pk)
     return render(request, 'core/claim/claim_detail.html', {'claim': claim})
 
 # ---- API для публичного поиска ----
 
-@api_view(['GET'])
-def public_machine_search(request):
+PUBLIC_SEARCH_BATCH_LIMIT = 500
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
+
+
+@require_safe
+async def public_machine_search(request):
+    """
+    Открытые поля машины по заводскому номеру (асинхронно: кэш и ORM без потока).
+    Пример запроса:
+        GET /api/public_machine_search/?serial_number=0011
+    """
     serial = request.GET.get('serial_number')
     if not serial:
-        return Response({'error': 'Не указан заводской номер'}, status=400)
-    try:
-        machine = Machine.objects.get(serial_number=serial)
-        data = {
-            'model': machine.model.name if machine.model else '',
-            'serial_number': machine.serial_number,
-            'engine_model': machine.engine_model.name if machine.engine_model else '',
-            'engine_serial': machine.engine_serial,
-            'transmission_model': machine.transmission_model.name if machine.transmission_model else '',
-            'transmission_serial': machine.transmission_serial,
-            'drive_axle_model': machine.drive_axle_model.name if machine.drive_axle_model else '',
-            'drive_axle_serial': machine.drive_axle_serial,
-            'steer_axle_model': machine.steer_axle_model.name if machine.steer_axle_model else '',
-            'steer_axle_serial': machine.steer_axle_serial,
-        }
-        return Response(data)
-    except Machine.DoesNotExist:
-        return Response({'error': 'Данных о машине с таким заводским номером нет в системе.'}, status=404)
+        return json_response({'error': 'Не указан заводской номер'}, status=400)
+    data = await public_lookup.alookup(serial)
+    if data is None:
+        return json_response({'error': 'Данных о машине с таким заводским номером нет в системе.'}, status=404)
+    return json_response(data)
+
+@api_view(['POST'])
+def public_machine_search_batch(request):
+    """
+    Проверка списка заводских номеров за один запрос.
+    Пример запроса:
+        POST /api/public_machine_search/batch/
+            {"serial_numbers": ["0011", "0012"]}
+    Ответ: найденные машины по номерам и список номеров, которых нет в системе.
+    """
+    serials = request.data.get('serial_numbers') if hasattr(request.data, 'get') else None
+    if not isinstance(serials, list) or not serials:
+        return Response({'error': 'Передайте непустой список serial_numbers'}, status=400)
+    if len(serials) > PUBLIC_SEARCH_BATCH_LIMIT:
+        return Response({'error': f'Не более {PUBLIC_SEARCH_BATCH_LIMIT} номеров за запрос'}, status=400)
+    serials = [str(serial).strip() for serial in serials]
+    results = public_lookup.lookup_many(serial for serial in serials if serial)
+    return Response({
+        'found': {serial: data for serial, data in results.items() if data},
+        'not_found': [serial for serial, data in results.items() if not data],
+    })
+
+@require_safe
+def metrics_view(request):
+    """
+    Метрики запросов по представлениям в текстовом формате Prometheus
+    (персоналу или по токену METRICS_TOKEN).
+    Пример запроса:
+        GET /metrics/
+        Authorization: Bearer <METRICS_TOKEN>
+    """
+    if not metrics.allowed(request):
+        return HttpResponseForbidden("У вас нет прав для этого действия.")
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@require_safe
+def api_schema_view(request, format):
+    """
+    Схема OpenAPI, построенная один раз на процесс или командой build_api_schema.
+    Пример запроса:
+        GET /swagger.json
+        If-None-Match: "<ETag прошлого ответа>"
+    """
+    name = format.lstrip('.')
+    if name not in api_schema.FORMATS:
+        raise Http404
+    content, etag = api_schema.document(name)
+    response = conditional.respond(request, etag, lambda: HttpResponse(
+        content, content_type=api_schema.FORMATS[name][1]))
+    # Адрес схемы не меняется между выкладками: браузер сверяет ETag при каждой загрузке
+    patch_cache_control(response, no_cache=True)
+    return response
+
+@require_safe
+def swagger_ui_view(request):
+    """
+    Swagger UI; схему страница загружает с /swagger.json.
+    """
+    return HttpResponse(api_schema.render_ui(request), content_type='text/html; charset=utf-8')
 
 # --- для машин, ТО, рекламаций (только для нужных ролей) ---
 
@@ -544,3 +756,54 @@ def claim_update(request, pk):
         form.save()
         return redirect('dashboard')
     return render(request, 'core/claim/claim_form.html', {'form': form})
+
+def search_scope(user):
+    """
+    Машины, ТО и рекламации, доступные пользователю (как в вьюсетах API).
+    """
+    if user.role == 'manager':
+        machines = Machine.objects.all()
+    elif user.role == 'client':
+        machines = Machine.objects.filter(client_user=user)
+    elif user.role == 'service':
+        machines = Machine.objects.filter(service_user=user)
+    else:
+        machines = Machine.objects.none()
+    return {
+        'machines': Machine.objects.for_listing().filter(pk__in=machines.values('pk')),
+        'maintenances': Maintenance.objects.for_listing().filter(machine__in=machines.values('pk')),
+        'claims': Claim.objects.for_listing().filter(machine__in=machines.values('pk')),
+    }
+
+def search_records(user, query, limit=search.SEARCH_RESULTS_LIMIT):
+    return {name: search.ranked(queryset, query, limit) for name, queryset in search_scope(user).items()}
+
+SEARCH_SERIALIZERS = {
+    'machines': MachineSerializer,
+    'maintenances': MaintenanceSerializer,
+    'claims': ClaimSerializer,
+}
+
+@api_view(['GET'])
+def search_api(request):
+    """
+    Полнотекстовый поиск по машинам, ТО и рекламациям, доступным пользователю.
+    Записи каждого вида идут по убыванию релевантности, не более limit (до 100).
+    Пример запроса:
+        GET /api/search/?q=гидравлика течь&limit=10
+    """
+    user = request.user
+    if not user.is_authenticated or user.role == 'guest':
+        return Response({'error': 'Поиск доступен только авторизованным пользователям'}, status=403)
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return Response({'error': 'Не указан поисковый запрос q'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', search.SEARCH_RESULTS_LIMIT)), 1), 100)
+    except ValueError:
+        return Response({'error': 'limit должен быть числом'}, status=400)
+    results = search_records(user, query, limit)
+    return Response({
+        name: SEARCH_SERIALIZERS[name](objects, many=True, context={'request': request}).data
+        for name, objects in results.items()
+    })
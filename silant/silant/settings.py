@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -53,11 +55,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым: время запроса включает все остальные middleware
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Профиль запроса сотрудника по ?profile=1 (нужен request.user)
+    'core.profiling.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
@@ -69,7 +75,8 @@ SITE_ID = 1
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Штатный DjangoTemplates, засекающий время отрисовки для метрик
+        'BACKEND': 'core.metrics.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'core', 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,14 +96,89 @@ WSGI_APPLICATION = 'silant.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# SILANT_DB_ENGINE: sqlite (по умолчанию) или postgres.
+# Для postgres: SILANT_DB_NAME, SILANT_DB_USER, SILANT_DB_PASSWORD, SILANT_DB_HOST, SILANT_DB_PORT;
+# SILANT_DB_POOL=1 включает пул соединений psycopg (pip install -r requirements-postgres.txt),
+# иначе соединения переиспользуются SILANT_DB_CONN_MAX_AGE секунд.
+
+DB_ENGINE = os.environ.get('SILANT_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SILANT_DB_NAME') or BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # WAL: чтение не блокируется записью; NORMAL безопасен в режиме WAL
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+                # Ожидание блокировки записи вместо немедленного «database is locked»
+                'timeout': int(os.environ.get('SILANT_DB_BUSY_TIMEOUT', 20)),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+elif DB_ENGINE == 'postgres':
+    DB_POOL = os.environ.get('SILANT_DB_POOL', '0') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('SILANT_DB_NAME', 'silant'),
+            'USER': os.environ.get('SILANT_DB_USER', 'silant'),
+            'PASSWORD': os.environ.get('SILANT_DB_PASSWORD', ''),
+            'HOST': os.environ.get('SILANT_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('SILANT_DB_PORT', '5432'),
+            # С пулом соединения держит пул, CONN_MAX_AGE должен быть 0
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('SILANT_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('SILANT_DB_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('SILANT_DB_POOL_MAX', 10)),
+                    'timeout': 10,
+                } if DB_POOL else False,
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f'Неизвестный SILANT_DB_ENGINE: {DB_ENGINE}')
+
+AUTH_USER_MODEL = 'core.User'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# SILANT_CACHE_BACKEND: locmem (по умолчанию, в памяти процесса), file или redis.
+# SILANT_CACHE_LOCATION: каталог для file, URL для redis (redis://host:6379/1).
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'silant'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHE_BACKEND = os.environ.get('SILANT_CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f'Неизвестный SILANT_CACHE_BACKEND: {CACHE_BACKEND}')
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.environ.get('SILANT_CACHE_LOCATION') or CACHE_BACKENDS[CACHE_BACKEND][1],
+        'KEY_PREFIX': 'silant',
+        'TIMEOUT': 300,
     }
 }
 
-AUTH_USER_MODEL = 'core.User'
+# Кэш страниц, списков API и отчёта о надёжности сбрасывается счётчиком
+# поколения данных в кэше (core/response_cache.py). В locmem счётчик свой
+# у каждого процесса, и запись через один worker не сбрасывает кэш других,
+# поэтому под locmem эти кэши по умолчанию выключены. При нескольких
+# процессах (gunicorn, uvicorn --workers) нужен file или redis.
+SHARED_CACHE = CACHE_BACKEND != 'locmem'
+# Время жизни закэшированных страниц dashboard и списков API (сек); 0 — без кэша
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('SILANT_RESPONSE_CACHE_TIMEOUT', 300 if SHARED_CACHE else 0))
+# Кэш строк таблиц dashboard (core/row_cache.py): ключ меняется при сохранении
+# записи или элемента справочника, поэтому срок большой; 0 — отключить
+ROW_CACHE_TIMEOUT = int(os.environ.get('SILANT_ROW_CACHE_TIMEOUT', 24 * 60 * 60))
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,8 +204,16 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
         'rest_framework.filters.SearchFilter',
     ],
+    # Тот же JSON, что у JSONRenderer, но через orjson (если установлен)
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.fast_serialization.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# Списки API собираются из .values() без ModelSerializer (core/fast_serialization.py)
+FAST_LIST_SERIALIZATION = os.environ.get('SILANT_FAST_LIST_SERIALIZATION', '1') != '0'
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -179,4 +269,51 @@ SWAGGER_SETTINGS = {
     },
     'DOC_EXPANSION': 'none',
     'SHOW_REQUEST_HEADERS': True,
-}
\ No newline at end of file
+    # Swagger UI загружает готовую схему (core/api_schema.py)
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+
+# Каталог готовой схемы OpenAPI (python manage.py build_api_schema при выкладке)
+API_SCHEMA_DIR = os.environ.get('SILANT_API_SCHEMA_DIR', str(BASE_DIR / 'openapi'))
+
+# Как часто (сек) процесс сверяет версию кэша справочника с общим кэшем
+# (под locmem — с таблицей справочника)
+DIRECTORY_CACHE_CHECK_INTERVAL = 5
+
+# Время жизни кэша публичного поиска по заводскому номеру (сек): найденные / не найденные.
+# Сохранение машины сбрасывает запись кэша, но под locmem — только в своём
+# процессе, поэтому там срок короткий: другие процессы видят правку через несколько секунд
+PUBLIC_LOOKUP_TIMEOUT = 60 * 60 if SHARED_CACHE else 5
+PUBLIC_LOOKUP_MISS_TIMEOUT = 60 if SHARED_CACHE else 5
+
+# Лента изменений (/api/<ресурс>/changes/): изменения моложе SYNC_CHANGES_LAG секунд
+# не отдаются, чтобы не пропустить записи ещё не зафиксированных транзакций
+# (больше самой долгой записывающей транзакции, в том числе импорта);
+# надгробия удалений хранятся SYNC_TOMBSTONE_RETENTION_DAYS дней
+SYNC_CHANGES_LAG = int(os.environ.get('SILANT_SYNC_CHANGES_LAG', 60))
+SYNC_TOMBSTONE_RETENTION_DAYS = 90
+
+# Отчёт о надёжности (/api/analytics/reliability/): регламент ТО — не реже чем
+# раз в MAINTENANCE_INTERVAL_HOURS м/час и MAINTENANCE_INTERVAL_DAYS дней,
+# с допуском MAINTENANCE_INTERVAL_TOLERANCE
+MAINTENANCE_INTERVAL_HOURS = 500
+MAINTENANCE_INTERVAL_DAYS = 365
+MAINTENANCE_INTERVAL_TOLERANCE = 0.1
+RELIABILITY_CACHE_TIMEOUT = 24 * 60 * 60 if SHARED_CACHE else 0
+
+# Метрики запросов по представлениям (GET /metrics/, формат Prometheus):
+# SILANT_METRICS=0 — отключить; SILANT_METRICS_DIR — каталог, через который
+# складываются сводки воркеров (раз в METRICS_FLUSH_INTERVAL секунд);
+# SILANT_METRICS_TOKEN — токен Bearer для Prometheus (иначе только персонал)
+METRICS_ENABLED = os.environ.get('SILANT_METRICS', '1') != '0'
+METRICS_DIR = os.environ.get('SILANT_METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = int(os.environ.get('SILANT_METRICS_FLUSH_INTERVAL', 10))
+METRICS_TOKEN = os.environ.get('SILANT_METRICS_TOKEN', '')
+# Заголовок Server-Timing (db, tpl, ser, app, total) у каждого ответа;
+# SILANT_SERVER_TIMING=0 — не отдавать (например, чтобы не раскрывать тайминги)
+SERVER_TIMING = os.environ.get('SILANT_SERVER_TIMING', '1') != '0'
+
+# Профиль отдельного запроса для персонала (?profile=1 или X-Silant-Profile: 1),
+# профили смотрятся и скачиваются в админке; хранится PROFILE_KEEP последних
+PROFILING_ENABLED = os.environ.get('SILANT_PROFILING', '1') != '0'
+PROFILE_KEEP = 100
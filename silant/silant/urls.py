@@ -16,20 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include, re_path
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Silant API",
-      default_version='v1',
-      description="API для сервиса Мой Силант",
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
+from core import views as core_views
 
 
 urlpatterns = [
@@ -38,11 +25,7 @@ urlpatterns = [
     path('accounts/', include('allauth.urls')),
     path('api/', include('core.api')),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
+    # Схема строится один раз (core/api_schema.py), а не на каждый запрос
+    path('swagger/', core_views.swagger_ui_view, name='schema-swagger-ui'),
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', core_views.api_schema_view, name='schema-json'),
 ]
-
-
-urlpatterns += [
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-]
\ No newline at end of file